@@ -0,0 +1,126 @@
+"""
+Measures how `qpop` shares jobs between queues and what a pop costs as
+the number of queues grows.
+
+Each run fills one "hot" queue with a big backlog and every other queue
+with a smaller one, then pops a number of batches (too few for any queue
+to run dry).  Reported per queue count and mode are the average time
+per `qpop`, the hot queue's share of the jobs handed out, and Jain's
+fairness index over the queues' shares (1.0 being perfectly even).
+
+After that the same pops are timed with only two of the queues holding
+any jobs, the queues subscribed to by name or all by one prefix.  Only
+the length of the subscription list should add to the cost, not how
+many queues there are.
+
+Needs a redis server it's free to flush a database of:
+
+    python benchmarks/dispatch.py [--host localhost] [--db 15]
+"""
+import argparse
+import collections
+import time
+
+import redis
+
+from rotterdam.dispatch import QueueShares
+from rotterdam.redis_extensions import extend_redis
+
+
+HOT_BACKLOG = 5000
+COLD_BACKLOG = 500
+BATCH_SIZE = 20
+ROUNDS = 20
+
+
+def fill(client, queue_names):
+    client.flushdb()
+    now = time.time()
+
+    for index, name in enumerate(queue_names):
+        backlog = HOT_BACKLOG if index == 0 else COLD_BACKLOG
+        client.qadd_many(name, [
+            (now - backlog + job, "%s-%d" % (name, job), "%s:%d" % (name, job))
+            for job in range(backlog)
+        ])
+
+
+def run(client, num_queues, strict):
+    queue_names = ["bench%03d" % index for index in range(num_queues)]
+    fill(client, queue_names)
+
+    shares = QueueShares(queue_names, strict=strict)
+    served = collections.Counter()
+
+    start = time.time()
+    for _ in range(ROUNDS):
+        quotas, fill_start = shares.split(BATCH_SIZE)
+        payloads = client.qpop(
+            queue_names, time.time(), BATCH_SIZE,
+            quotas=quotas, fill_start=fill_start
+        )
+        for payload in payloads:
+            served[payload.split(":")[0]] += 1
+    elapsed = time.time() - start
+
+    counts = [served[name] for name in queue_names]
+    total = float(sum(counts)) or 1.0
+    fairness = sum(counts) ** 2 / (
+        len(counts) * float(sum(count ** 2 for count in counts)) or 1.0
+    )
+
+    return elapsed / ROUNDS * 1000, counts[0] / total, fairness
+
+
+def run_idle(client, num_queues, by_prefix):
+    queue_names = ["idle%04d" % index for index in range(num_queues)]
+    fill(client, queue_names[:2])
+
+    shares = QueueShares(["idle*"] if by_prefix else queue_names)
+
+    start = time.time()
+    for _ in range(ROUNDS):
+        quotas, fill_start = shares.split(BATCH_SIZE)
+        client.qpop(
+            shares.names, time.time(), BATCH_SIZE,
+            quotas=quotas, fill_start=fill_start
+        )
+
+    return (time.time() - start) / ROUNDS * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    args = parser.parse_args()
+
+    client = redis.StrictRedis(host=args.host, port=args.port, db=args.db)
+    extend_redis(client)
+
+    print "%7s  %-8s  %10s  %9s  %8s" % (
+        "queues", "mode", "ms/qpop", "hot share", "fairness"
+    )
+    for num_queues in (2, 20, 200):
+        for strict in (False, True):
+            ms_per_pop, hot_share, fairness = run(client, num_queues, strict)
+            print "%7d  %-8s  %10.3f  %9.2f  %8.2f" % (
+                num_queues, "strict" if strict else "weighted",
+                ms_per_pop, hot_share, fairness
+            )
+
+    print
+    print "%7s  %-8s  %10s" % ("queues", "by", "ms/qpop")
+    for num_queues in (2, 20, 200, 2000):
+        for by_prefix in (False, True):
+            print "%7d  %-8s  %10.3f" % (
+                num_queues, "prefix" if by_prefix else "name",
+                run_idle(client, num_queues, by_prefix)
+            )
+
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compares unique key computation: the old scheme (an md5 update per field,
+str() of each value) against the current one (a single md5 of the
+canonical JSON of the unique fields).
+
+    python benchmarks/unique_keys.py [iterations]
+"""
+import hashlib
+import sys
+import timeit
+
+from rotterdam import job
+from rotterdam.payload import Payload
+
+
+@job("benchmark", unique=True)
+def wide_job(*args, **kwargs):
+    pass
+
+
+WIDE_ARGS = (list(range(200)) + ["arg-%d" % i for i in range(200)], {})
+
+NESTED_KWARGS = ([], {
+    "user": {"id": 1234, "tags": ["a", "b", "c"], "prefs": {"x": 1, "y": 2}},
+    "items": [{"sku": "sku-%d" % i, "qty": i} for i in range(50)],
+    "options": {"level-%d" % i: {"on": bool(i % 2)} for i in range(20)},
+})
+
+
+def legacy_key(payload):
+    uniques = [payload.module, payload.func, payload.queue_name]
+    uniques.extend(payload.args)
+    uniques.extend([
+        name + "=" + str(value)
+        for name, value in payload.kwargs.iteritems()
+    ])
+    uniqueness = hashlib.md5()
+    for unique in uniques:
+        uniqueness.update(str(unique))
+
+    return uniqueness.hexdigest()
+
+
+def current_key(payload):
+    payload.determine_unique_key()
+
+    return payload.unique_key
+
+
+def make_payload(args, kwargs):
+    payload = Payload.import_func(__name__, "wide_job")
+    payload.module = __name__
+    payload.func = "wide_job"
+    payload.queue_name = "benchmark"
+    payload.args = args
+    payload.kwargs = kwargs
+
+    return payload
+
+
+def main(iterations):
+    for label, (args, kwargs) in (
+            ("wide args", WIDE_ARGS), ("nested kwargs", NESTED_KWARGS)
+    ):
+        payload = make_payload(args, kwargs)
+        for scheme, fn in (("legacy", legacy_key), ("current", current_key)):
+            elapsed = timeit.timeit(lambda: fn(payload), number=iterations)
+            print "%-14s %-8s %8.2f us/key" % (
+                label, scheme, elapsed / iterations * 1000000
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -1,3 +1,8 @@
 from .client import Rotterdam  # noqa
-from .exceptions import ConnectionError, NoSuchJob, InvalidPayload  # noqa
+from .pool import ClientPool, configure  # noqa
+from .buffered import BufferedRotterdam  # noqa
+from .cluster import MultiRotterdam  # noqa
+from .exceptions import (  # noqa
+    ConnectionError, NoSuchJob, InvalidPayload, QueueBusy
+)
 from .decorators import job  # noqa
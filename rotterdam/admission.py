@@ -0,0 +1,93 @@
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class Admission(object):
+    """
+    Decides whether queues are taking new jobs based on how deep they are.
+
+    `watermarks` maps queue names (or "*" for any queue not named) to a
+    (high, low) pair.  A queue holding `high` or more unfinished jobs is
+    busy and turns new jobs away until it drains down to `low`.
+
+    Queue depths are looked up in redis at most every `refresh_interval`
+    seconds, in between they're estimated by counting the jobs added since.
+    Queues whose depth hasn't been looked up yet are let through.
+    """
+
+    def __init__(self, redis, watermarks, refresh_interval=1.0):
+        self.redis = redis
+        self.watermarks = watermarks
+        self.refresh_interval = refresh_interval
+
+        self.depths = {}
+        self.busy = set()
+        self.refreshed_at = 0
+
+    @property
+    def retry_after(self):
+        return self.refresh_interval
+
+    def limits_for(self, queue_name):
+        return self.watermarks.get(queue_name, self.watermarks.get("*"))
+
+    def admits(self, queue_name):
+        if self.limits_for(queue_name) is None:
+            return True
+
+        self.depths.setdefault(queue_name, None)
+
+        return queue_name not in self.busy
+
+    def record(self, queue_name, num_added):
+        limits = self.limits_for(queue_name)
+        if limits is None or self.depths.get(queue_name) is None:
+            return
+
+        self.depths[queue_name] += num_added
+        if self.depths[queue_name] >= limits[0]:
+            self.mark_busy(queue_name)
+
+    def refresh_if_due(self):
+        if not self.depths:
+            return
+        if time.time() - self.refreshed_at < self.refresh_interval:
+            return
+
+        self.refresh()
+
+    def refresh(self):
+        self.refreshed_at = time.time()
+
+        try:
+            depths = self.redis.queue_depths(self.depths.keys())
+        except Exception:
+            logger.exception("Error when checking queue depths")
+            return
+
+        for queue_name, depth in depths.iteritems():
+            high, low = self.limits_for(queue_name)
+
+            self.depths[queue_name] = depth
+
+            if depth >= high:
+                self.mark_busy(queue_name)
+            elif depth <= low and queue_name in self.busy:
+                logger.info(
+                    "Queue %s is down to %d jobs, taking jobs again",
+                    queue_name, depth
+                )
+                self.busy.discard(queue_name)
+
+    def mark_busy(self, queue_name):
+        if queue_name in self.busy:
+            return
+
+        logger.warning(
+            "Queue %s is busy (%d jobs), turning jobs away",
+            queue_name, self.depths[queue_name]
+        )
+        self.busy.add(queue_name)
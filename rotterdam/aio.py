@@ -0,0 +1,198 @@
+import collections
+import datetime
+import json
+
+import trollius as asyncio
+from trollius import From, Return
+
+from .client import (
+    build_payload, build_batch, check_response, fire_time,
+    format_endpoint, unix_path
+)
+from .protocol import MAX_FRAME_SIZE
+from .serialization import DateAwareJSONEncoder
+from .exceptions import ConnectionError
+
+
+# Replies to big batches make for long lines, well past the default 64KB.
+READ_LIMIT = MAX_FRAME_SIZE
+
+
+class AsyncRotterdam(object):
+    """
+    Event loop friendly client, enqueues are coroutines.
+
+    Concurrent enqueues are spread over a handful of persistent streams to
+    the master, with many jobs in flight on each one.
+    """
+
+    def __init__(self, host, port=8765, num_streams=2, loop=None):
+        self.host = host
+        self.port = port
+
+        self.loop = loop or asyncio.get_event_loop()
+
+        self.streams = [
+            Stream(host, port, self.loop) for _ in range(num_streams)
+        ]
+
+    @asyncio.coroutine
+    def enqueue_in(self, seconds, func, *args, **kwargs):
+        yield From(self.enqueue_at(
+            datetime.timedelta(seconds=seconds), func, *args, **kwargs
+        ))
+
+    @asyncio.coroutine
+    def enqueue_at(self, time_offset, func, *args, **kwargs):
+        payload = build_payload(func, args, kwargs)
+        payload['when'] = fire_time(time_offset)
+
+        yield From(self.send(payload))
+
+    @asyncio.coroutine
+    def enqueue(self, func, *args, **kwargs):
+        yield From(self.send(build_payload(func, args, kwargs)))
+
+    @asyncio.coroutine
+    def enqueue_many(self, func, iterable_of_args):
+        response = yield From(self.send(build_batch(func, iterable_of_args)))
+
+        raise Return(response["results"])
+
+    @asyncio.coroutine
+    def send(self, payload):
+        stream = min(self.streams, key=lambda s: s.outstanding)
+
+        stream.outstanding += 1
+        try:
+            response = yield From(stream.send(payload))
+        finally:
+            stream.outstanding -= 1
+
+        raise Return(check_response(response))
+
+    def close(self):
+        for stream in self.streams:
+            stream.close()
+
+
+class Stream(object):
+    """
+    A single persistent connection to the master.
+
+    The master replies to jobs in the order they were sent, so each reply
+    read resolves the oldest pending future.
+    """
+
+    def __init__(self, host, port, loop):
+        self.host = host
+        self.port = port
+        self.loop = loop
+
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.pending = collections.deque()
+        self.outstanding = 0
+
+        self.lock = asyncio.Lock(loop=loop)
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    @asyncio.coroutine
+    def connect(self):
+        with (yield From(self.lock)):
+            if self.connected:
+                return
+
+            path = unix_path(self.host)
+            if path:
+                opening = asyncio.open_unix_connection(
+                    path, loop=self.loop, limit=READ_LIMIT
+                )
+            else:
+                opening = asyncio.open_connection(
+                    self.host, self.port, loop=self.loop, limit=READ_LIMIT
+                )
+
+            try:
+                self.reader, self.writer = yield From(opening)
+            except (IOError, OSError) as e:
+                raise ConnectionError(
+                    "Error connecting to %s, %s" % (
+                        format_endpoint(self.host, self.port), e
+                    )
+                )
+
+            self.reader_task = asyncio.ensure_future(
+                self.read_responses(self.reader), loop=self.loop
+            )
+
+    @asyncio.coroutine
+    def send(self, payload):
+        if not self.connected:
+            yield From(self.connect())
+
+        future = asyncio.Future(loop=self.loop)
+        self.pending.append(future)
+
+        self.writer.write(
+            json.dumps(payload, cls=DateAwareJSONEncoder) + "\n"
+        )
+        try:
+            yield From(self.writer.drain())
+        except (IOError, OSError) as e:
+            self.disconnect(e)
+
+        response = yield From(future)
+
+        raise Return(response)
+
+    @asyncio.coroutine
+    def read_responses(self, reader):
+        """
+        Hands each reply to the oldest pending future.  Whatever ends the
+        reading (a closed connection, an error, a reply too long to read)
+        disconnects the stream, failing the futures still pending.
+        """
+        error = None
+        try:
+            while True:
+                line = yield From(reader.readline())
+                if not line or self.reader is not reader:
+                    break
+                if not self.pending:
+                    continue
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(line.rstrip("\n"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+
+        if self.reader is reader:
+            self.disconnect(error)
+
+    def disconnect(self, error=None):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(
+                    "Error talking to %s, %s" % (
+                        format_endpoint(self.host, self.port),
+                        error or "connection closed"
+                    )
+                ))
+
+    def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+            self.reader_task = None
+        self.disconnect()
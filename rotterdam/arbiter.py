@@ -1,13 +1,14 @@
 import Queue
 import time
 
+from .dispatch import QueueShares, Wakeups
 from .worker import Worker
-from .payload import Payload
 
 
 class Arbiter(Worker):
 
     signal_map = {
+        "hup": "clear_job_registry",
         "ttin": "expand_capacity",
         "ttou": "contract_capacity"
     }
@@ -26,16 +27,82 @@ class Arbiter(Worker):
 
         self.capacity = self.config.num_consumers * self.multiplier
 
+        self.retention = {
+            "max_age": self.config.done_max_age,
+            "max_count": self.config.done_max_count,
+            "keep_done": not self.config.done_counters_only
+        }
+
+        self.shares = QueueShares(
+            self.config.queues, strict=self.config.strict_priority
+        )
+
         self.logger.debug(
-            "Arbitrating jobs for: %s", ",".join(self.config.queues)
+            "Arbitrating jobs for: %s", ",".join(self.shares.names)
         )
 
+        try:
+            self.redis.reindex_queues(self.shares.names)
+        except Exception:
+            self.logger.exception("Error when indexing queues")
+
+        self.next_due = None
+        self.wakeups = None
+        if self.config.push_dispatch:
+            self.listen_for_wakeups()
+
+    def listen_for_wakeups(self):
+        """
+        Subscribes to announcements of new jobs, so that the run loop
+        wakes up for them.  If that fails the arbiter falls back to polling
+        every heartbeat until it can subscribe again.
+        """
+        self.sources.pop("wakeups", None)
+
+        try:
+            self.wakeups = Wakeups(self.redis)
+        except Exception:
+            self.logger.exception("Error subscribing to wakeups")
+            return
+
+        self.sources["wakeups"] = self.wakeups
+        self.handlers["wakeups"] = self.handle_wakeups
+
+    def handle_wakeups(self):
+        """
+        Clears out the wakeup announcements, the heartbeat right after does
+        the actual dispatching.
+        """
+        try:
+            self.wakeups.drain()
+        except Exception:
+            self.logger.exception("Error reading wakeups")
+            self.wakeups.close()
+            self.wakeups = None
+
+    def poll_timeout(self):
+        """
+        With push dispatch on, wait no longer than until the next job is
+        due.
+        """
+        timeout = super(Arbiter, self).poll_timeout()
+
+        if self.wakeups is None or self.next_due is None:
+            return timeout
+
+        return max(min(timeout, self.next_due - time.time()), 0)
+
     def heartbeat(self):
         super(Arbiter, self).heartbeat()
 
+        if self.config.push_dispatch and self.wakeups is None:
+            self.listen_for_wakeups()
+
+        now = time.time()
+        quotas, fill_start = self.shares.split(self.capacity)
         payloads = self.redis.qpop(
-            self.config.queues,
-            int(time.time()), self.capacity
+            self.shares.names, now, self.capacity,
+            quotas=quotas, fill_start=fill_start
         )
 
         for payload in payloads:
@@ -46,11 +113,26 @@ class Arbiter(Worker):
             except Queue.Full:
                 break
 
+        if self.wakeups is not None:
+            self.next_due = self.redis.next_due(now)
+
     def handle_finished_job(self, result):
+        """
+        Finishes off the job named by a consumer's completion record.
+        Records of jobs whose queue couldn't be told (garbled, or stored
+        before the queue was recorded) name none, those only give back the
+        capacity.
+        """
         self.capacity += 1
 
-        job = Payload.deserialize(result['payload'])
-        self.redis.qfinish(job.queue_name, job.unique_key)
+        if result['queue'] is None:
+            return
+
+        self.redis.qfinish(result['queue'], result['key'], **self.retention)
+
+    def teardown(self):
+        if self.wakeups is not None:
+            self.wakeups.close()
 
     def expand_capacity(self, *_):
         self.capacity += self.multiplier
@@ -0,0 +1,230 @@
+import collections
+import datetime
+import logging
+import os
+import threading
+import time
+
+from .client import Rotterdam, build_payload, fire_time
+from .exceptions import BufferFull, JobEnqueueError, QueueBusy
+
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "raise")
+
+
+class BufferedRotterdam(object):
+    """
+    Fire-and-forget client, enqueues return as soon as the job is buffered.
+
+    A background thread sends the buffered jobs to the master in batches
+    of up to `batch_size`, either once that many have piled up or once the
+    oldest has waited `flush_interval` seconds.  At most `max_buffered` jobs
+    are held at once, what happens to further enqueues is up to the
+    `overflow` policy:
+
+    * "block" waits for the flusher to make room
+    * "drop_oldest" throws away the oldest buffered job
+    * "raise" raises `BufferFull`
+
+    Batches that can't be sent are handed to `error_handler` along with the
+    exception, by default they're logged and dropped.  So are any jobs the
+    master turns away for their queue being busy, along with a `QueueBusy`.
+    """
+
+    def __init__(
+            self, host, port=8765,
+            max_buffered=10000, batch_size=100, flush_interval=0.1,
+            overflow="block", error_handler=None, client_class=Rotterdam
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: %s" % overflow)
+
+        self.host = host
+        self.port = port
+        self.client_class = client_class
+        self.client = client_class(host, port)
+
+        self.max_buffered = max_buffered
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.error_handler = error_handler or log_failed_batch
+
+        self.condition = threading.Condition()
+        self.buffer = collections.deque()
+        self.in_flight = 0
+        self.draining = 0
+        self.dropped = 0
+        self.closed = False
+
+        self.flusher = None
+        self.pid = None
+
+    def enqueue_in(self, seconds, func, *args, **kwargs):
+        self.enqueue_at(
+            datetime.timedelta(seconds=seconds), func, *args, **kwargs
+        )
+
+    def enqueue_at(self, time_offset, func, *args, **kwargs):
+        payload = build_payload(func, args, kwargs)
+        payload['when'] = fire_time(time_offset)
+
+        self.put(payload)
+
+    def enqueue(self, func, *args, **kwargs):
+        self.put(build_payload(func, args, kwargs))
+
+    def put(self, payload):
+        self.reset_if_forked()
+
+        with self.condition:
+            if self.closed:
+                raise JobEnqueueError("client is closed")
+
+            self.start_flusher()
+
+            while len(self.buffer) >= self.max_buffered:
+                if self.overflow == "raise":
+                    raise BufferFull(
+                        "%d jobs already buffered" % len(self.buffer)
+                    )
+                elif self.overflow == "drop_oldest":
+                    self.buffer.popleft()
+                    self.dropped += 1
+                else:
+                    self.condition.wait()
+
+            self.buffer.append(payload)
+
+            if len(self.buffer) == 1 or len(self.buffer) >= self.batch_size:
+                self.condition.notify_all()
+
+    def reset_if_forked(self):
+        """
+        Gives a forked child its own client, lock and an empty buffer, the
+        jobs buffered before the fork are the parent's to send.
+        """
+        if self.pid is None or self.pid == os.getpid():
+            return
+
+        self.client = self.client_class(self.host, self.port)
+        self.condition = threading.Condition()
+        self.buffer = collections.deque()
+        self.in_flight = 0
+        self.draining = 0
+        self.flusher = None
+        self.pid = None
+
+    def start_flusher(self):
+        if self.pid == os.getpid() and self.flusher.is_alive():
+            return
+
+        self.pid = os.getpid()
+        self.flusher = threading.Thread(
+            target=self.run_flusher, name="rotterdam-flusher"
+        )
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def run_flusher(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+
+            try:
+                self.send_batch(batch)
+            finally:
+                with self.condition:
+                    self.in_flight = 0
+                    self.condition.notify_all()
+
+    def next_batch(self):
+        with self.condition:
+            while not self.buffer and not self.closed:
+                self.condition.wait()
+
+            deadline = time.time() + self.flush_interval
+            while self.should_linger():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            if not self.buffer:
+                return None
+
+            batch = [
+                self.buffer.popleft()
+                for _ in range(min(self.batch_size, len(self.buffer)))
+            ]
+            self.in_flight = len(batch)
+            self.condition.notify_all()
+
+            return batch
+
+    def should_linger(self):
+        return (
+            not self.closed and
+            not self.draining and
+            len(self.buffer) < self.batch_size
+        )
+
+    def send_batch(self, batch):
+        try:
+            results = self.client.send({"batch": batch}).wait()["results"]
+        except Exception as e:
+            self.error_handler(batch, e)
+            return
+
+        busy = []
+        for payload, result in zip(batch, results):
+            if result["status"] == "busy":
+                busy.append((payload, result.get("retry_after")))
+            elif result["status"] == "error":
+                logger.warning(
+                    "Job %s:%s rejected: %s",
+                    payload["module"], payload["func"], result.get("message")
+                )
+
+        if busy:
+            self.error_handler(
+                [payload for payload, _ in busy],
+                QueueBusy(max(retry_after for _, retry_after in busy))
+            )
+
+    def flush(self):
+        """
+        Blocks until every job buffered so far has been sent.
+        """
+        self.reset_if_forked()
+
+        with self.condition:
+            if self.pid != os.getpid():
+                return
+
+            self.draining += 1
+            self.condition.notify_all()
+            try:
+                while self.buffer or self.in_flight:
+                    self.condition.wait()
+            finally:
+                self.draining -= 1
+
+    def close(self):
+        self.flush()
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        if self.flusher is not None and self.pid == os.getpid():
+            self.flusher.join()
+
+        self.client.disconnect()
+
+
+def log_failed_batch(batch, error):
+    logger.error("Dropping batch of %d jobs: %s", len(batch), error)
@@ -1,116 +1,308 @@
+import collections
 import datetime
 import errno
+import itertools
 import json
+import random
 import socket
 import time
 
+from .protocol import (
+    VERSION, FLAG_HELLO, MessageBuffer, hello_frame, pack_frame
+)
 from .serialization import DateAwareJSONEncoder
 from .exceptions import (
-    InvalidPayload, NoSuchJob, ConnectionError, JobEnqueueError
+    InvalidPayload, NoSuchJob, ConnectionError, JobEnqueueError, QueueBusy
 )
 
 SOCKET_BUFFER_SIZE = 4096
 
+UNIX_SCHEME = "unix://"
 
-class Rotterdam(object):
 
-    def __init__(self, host, port=8765):
+class Rotterdam(object):
+    """
+    Client for sending jobs to a rotterdam master.
+
+    If given a `spool`, jobs that can't be sent because the master can't be
+    reached are written to the spool instead of raising a `ConnectionError`,
+    to be sent along later via `drain_spool()`.  A master that takes longer
+    than `timeout` seconds to connect or reply counts as unreachable.
+
+    By default the client asks the master for the framed version 2 protocol
+    when connecting, falling back to version 1 for masters that don't
+    speak it.  Pass `protocol=1` to skip straight to version 1.
+
+    Jobs for a queue the master says is busy raise `QueueBusy`, unless
+    `busy_retries` is set in which case they're resent that many times,
+    backing off exponentially from the master's hint of how long to wait
+    up to `max_backoff` seconds.
+    """
+
+    def __init__(
+            self, host, port=8765, spool=None, timeout=None,
+            protocol=VERSION, busy_retries=0, max_backoff=30
+    ):
         self.host = host
         self.port = port
+        self.spool = spool
+        self.timeout = timeout
+        self.protocol = protocol
+        self.busy_retries = busy_retries
+        self.max_backoff = max_backoff
 
         self.socket = None
-
-        self.time_offset = None
+        self.version = None
+        self.buffer = MessageBuffer()
+        self.pending = collections.OrderedDict()
+        self.request_ids = itertools.count(1)
 
     @property
     def connected(self):
         return self.socket and self.socket.fileno()
 
+    @property
+    def endpoint(self):
+        return format_endpoint(self.host, self.port)
+
     def connect(self):
         if self.connected:
             return
 
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((self.host, self.port))
+        path = unix_path(self.host)
+        if path:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = path
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (self.host, self.port)
+
+        self.socket.settimeout(self.timeout)
+        try:
+            self.socket.connect(address)
+        except socket.error as e:
+            self.disconnect()
+            raise ConnectionError(
+                "Error connecting to %s, %s" % (self.endpoint, e)
+            )
+
+        self.version = 1
+        if self.protocol >= VERSION:
+            self.negotiate()
+
+    def negotiate(self):
+        self.write(hello_frame())
+
+        _, flags, _ = self.read_message()
+
+        if not self.connected:
+            raise ConnectionError(
+                "Connection to %s closed during handshake" % self.endpoint
+            )
+
+        if self.buffer.version == VERSION and flags & FLAG_HELLO:
+            self.version = VERSION
 
     def enqueue_in(self, seconds, func, *args, **kwargs):
-        self.time_offset = datetime.timedelta(seconds=seconds)
-        self.enqueue(func, *args, **kwargs)
+        self.enqueue_at(
+            datetime.timedelta(seconds=seconds), func, *args, **kwargs
+        )
 
     def enqueue_at(self, time_offset, func, *args, **kwargs):
-        self.time_offset = time_offset
-        self.enqueue(func, *args, **kwargs)
+        payload = build_payload(func, args, kwargs)
+        payload['when'] = fire_time(time_offset)
+
+        self.deliver(payload)
 
     def enqueue(self, func, *args, **kwargs):
-        payload = {
-            "args": args,
-            "kwargs": kwargs
-        }
-
-        if self.time_offset:
-            payload['when'] = time.mktime(
-                (datetime.datetime.utcnow() + self.time_offset).timetuple()
+        self.deliver(build_payload(func, args, kwargs))
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Sends a job without waiting for the master's reply.
+
+        Returns a `Receipt` whose `wait()` blocks until the reply for this
+        particular job arrives, so several jobs can be in flight on the
+        same connection at once.
+        """
+        return self.send(build_payload(func, args, kwargs))
+
+    def enqueue_many(self, func, iterable_of_args):
+        """
+        Enqueues one job per item of `iterable_of_args` in a single batch.
+
+        Each item is a tuple of positional args for `func`, anything else
+        is passed along as the lone argument.  Returns a list of responses
+        lined up with the items, each with a "status" of "ok", "duplicate",
+        "busy" (along with a "retry_after") or "error" (along with a
+        "message"), or "spooled" if the master couldn't be reached and the
+        job was spooled instead.
+        """
+        return self.deliver(build_batch(func, iterable_of_args))["results"]
+
+    def deliver(self, payload):
+        """
+        Sends a payload and waits for the reply, spooling the payload if
+        the master is unreachable and a spool is set up.
+
+        Returns the master's response, or None if the payload was spooled.
+        Batches always get a response, see `deliver_batch()`.
+        """
+        if "batch" in payload:
+            return self.deliver_batch(payload)
+
+        try:
+            return self.deliver_job(payload)
+        except ConnectionError:
+            if not self.spool:
+                raise
+
+        self.spool.append(payload)
+
+    def deliver_job(self, payload):
+        for attempt in itertools.count(1):
+            try:
+                return self.send(payload).wait()
+            except QueueBusy as e:
+                if attempt > self.busy_retries:
+                    raise
+                self.back_off(e.retry_after, attempt)
+
+    def deliver_batch(self, payload):
+        """
+        Sends a batch, resending just the jobs that were turned away for
+        their queue being busy, up to `busy_retries` times.
+
+        If the master can't be reached and a spool is set up, the jobs not
+        yet taken by the master are spooled and given a "spooled" result.
+        """
+        jobs = payload["batch"]
+        results = [None] * len(jobs)
+        indexes = range(len(jobs))
+
+        for attempt in itertools.count(1):
+            try:
+                response = self.send(
+                    {"batch": [jobs[index] for index in indexes]}
+                ).wait()
+            except ConnectionError:
+                if not self.spool:
+                    raise
+                self.spool.append_many([jobs[index] for index in indexes])
+                for index in indexes:
+                    results[index] = {"status": "spooled"}
+                return {"status": "ok", "results": results}
+
+            busy = []
+            for index, result in zip(indexes, response["results"]):
+                results[index] = result
+                if result["status"] == "busy":
+                    busy.append(index)
+
+            if not busy or attempt > self.busy_retries:
+                break
+
+            self.back_off(
+                max(results[index]["retry_after"] for index in busy),
+                attempt
             )
-        self.time_offset = None
+            indexes = busy
 
-        module, func = extract_module_and_func(func)
+        response["results"] = results
 
-        payload['module'] = module
-        payload['func'] = func
+        return response
 
+    def back_off(self, retry_after, attempt):
+        delay = min(self.max_backoff, (retry_after or 1) * 2 ** (attempt - 1))
+
+        time.sleep(delay * random.uniform(1, 1.5))
+
+    def drain_spool(self, batch_size=500):
+        return self.spool.drain(self, batch_size=batch_size)
+
+    def send(self, payload):
         self.connect()
 
-        self.send_payload(payload)
+        request_id = next(self.request_ids) % 2 ** 32
+
+        self.send_payload(payload, request_id)
+
+        receipt = Receipt(self)
+        self.pending[request_id] = receipt
 
-        response = self.read_response()
+        return receipt
 
-        if not response:
-            raise JobEnqueueError("empty response")
+    def wait_all(self):
+        while self.pending:
+            next(reversed(self.pending.values())).wait()
 
-        response = json.loads(response)
+    def send_payload(self, payload, request_id=0):
+        message = json.dumps(payload, cls=DateAwareJSONEncoder)
 
-        if response['status'] != "ok":
-            if response["message"] == "no such job":
-                raise NoSuchJob
-            elif response["message"] == "invalid payload":
-                raise InvalidPayload
-            else:
-                raise JobEnqueueError(response["message"])
+        if self.version == VERSION:
+            self.write(pack_frame(message, request_id))
+        else:
+            self.write(message + "\n")
 
-    def send_payload(self, payload):
+    def write(self, data):
         try:
-            self.socket.sendall(
-                json.dumps(payload, cls=DateAwareJSONEncoder) + "\n"
-            )
+            self.socket.sendall(data)
         except IOError, e:
             self.disconnect()
             raise ConnectionError(
-                "Error sending job to %s:%s, %s" % (
-                    self.host,
-                    self.port,
+                "Error sending job to %s, %s" % (
+                    self.endpoint,
                     e.args[1] if len(e.args) > 1 else e.args[0]
                 )
             )
 
     def read_response(self):
-        response = ''
+        """
+        Reads the next reply off of the connection and hands it to the
+        receipt it's meant for.  Version 2 replies carry the id of their
+        request, version 1 replies come back in the order jobs were sent.
+        """
+        request_id, _, response = self.read_message()
+
+        if request_id is None and self.pending:
+            request_id = next(iter(self.pending))
+
+        receipt = self.pending.pop(request_id, None)
+        if receipt:
+            receipt.response = response
+
+        return response
+
+    def read_message(self):
+        for message in self.buffer.messages():
+            return message
+
         while True:
             try:
                 chunk = self.socket.recv(SOCKET_BUFFER_SIZE)
-                if chunk:
-                    response = response + chunk
             except socket.error as e:
-                if e.errno not in [errno.EAGAIN, errno.EINTR]:
-                    raise
+                if e.errno in [errno.EAGAIN, errno.EINTR]:
+                    continue
+                self.disconnect()
+                raise ConnectionError(
+                    "Error reading reply from %s, %s" % (self.endpoint, e)
+                )
 
-            if not response or response.endswith("\n"):
-                break
+            if not chunk:
+                self.disconnect()
+                return None, 0, ''
 
-        self.disconnect()
+            self.buffer.feed(chunk)
 
-        return response
+            for message in self.buffer.messages():
+                return message
 
     def disconnect(self):
+        self.buffer = MessageBuffer()
+        self.version = None
+        while self.pending:
+            self.pending.popitem(last=False)[1].response = ''
+
         if not self.socket:
             return
 
@@ -125,6 +317,115 @@ class Rotterdam(object):
             self.disconnect()
 
 
+class Receipt(object):
+    """
+    Handle on a single job sent down a client connection.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.response = None
+
+    @property
+    def done(self):
+        return self.response is not None
+
+    def wait(self):
+        while self.response is None:
+            self.client.read_response()
+
+        if not self.response:
+            raise ConnectionError(
+                "Connection to %s closed before reply" % (
+                    self.client.endpoint
+                )
+            )
+
+        return check_response(self.response)
+
+
+def check_response(response):
+    if not response:
+        raise JobEnqueueError("empty response")
+
+    response = json.loads(response)
+
+    if response["status"] == "busy":
+        raise QueueBusy(response.get("retry_after"))
+
+    if response['status'] != "ok":
+        if response["message"] == "no such job":
+            raise NoSuchJob
+        elif response["message"] == "invalid payload":
+            raise InvalidPayload
+        else:
+            raise JobEnqueueError(response["message"])
+
+    return response
+
+
+def unix_path(host):
+    """
+    Returns the socket path of a "unix:///path" host, or None for a host
+    that isn't one.
+    """
+    if host.startswith(UNIX_SCHEME):
+        return host[len(UNIX_SCHEME):]
+
+
+def format_endpoint(host, port):
+    if unix_path(host):
+        return host
+
+    return "%s:%s" % (host, port)
+
+
+def parse_endpoint(endpoint, default_port=8765):
+    """
+    Turns a "host:port" string (or just a "host") into a (host, port) tuple,
+    tuples are passed through as-is.  A "unix:///path" endpoint is kept
+    whole as the host.
+    """
+    if not isinstance(endpoint, basestring):
+        return tuple(endpoint)
+
+    if unix_path(endpoint):
+        return endpoint, default_port
+
+    if ":" in endpoint:
+        host, port = endpoint.rsplit(":", 1)
+        return host, int(port)
+
+    return endpoint, default_port
+
+
+def build_payload(func, args, kwargs):
+    module, func = extract_module_and_func(func)
+
+    return {
+        "module": module,
+        "func": func,
+        "args": args,
+        "kwargs": kwargs
+    }
+
+
+def build_batch(func, iterable_of_args):
+    payloads = []
+    for args in iterable_of_args:
+        if not isinstance(args, tuple):
+            args = (args,)
+        payloads.append(build_payload(func, args, {}))
+
+    return {"batch": payloads}
+
+
+def fire_time(time_offset):
+    return time.mktime(
+        (datetime.datetime.utcnow() + time_offset).timetuple()
+    )
+
+
 def extract_module_and_func(func):
     if isinstance(func, basestring):
         module, func = func.split(":")
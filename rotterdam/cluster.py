@@ -0,0 +1,138 @@
+import datetime
+import itertools
+import logging
+import time
+
+from .client import (
+    Rotterdam, build_payload, build_batch, fire_time, parse_endpoint
+)
+from .exceptions import ConnectionError
+
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("round_robin", "least_outstanding")
+
+
+class MultiRotterdam(object):
+    """
+    Client that spreads jobs over several masters sharing the same redis.
+
+    Jobs go to the masters in turn ("round_robin") or to whichever master
+    has the fewest replies outstanding ("least_outstanding").  A master
+    that can't be connected to or takes longer than `timeout` seconds to
+    reply is ejected for `eject_for` seconds and the job is retried on the
+    next one, so a single slow or restarting master doesn't hold up every
+    enqueue.  Only if no master can take the job is it spooled (given a
+    `spool`) or a `ConnectionError` raised.
+
+    Note that a master that timed out may still have stored the job, so a
+    retried job can end up enqueued twice unless it's a unique job.
+    """
+
+    def __init__(
+            self, endpoints,
+            strategy="round_robin", timeout=None, eject_for=30, spool=None
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError("Unknown strategy: %s" % strategy)
+        if not endpoints:
+            raise ValueError("At least one endpoint is required.")
+
+        self.clients = [
+            Rotterdam(host, port, timeout=timeout)
+            for host, port in map(parse_endpoint, endpoints)
+        ]
+        self.strategy = strategy
+        self.eject_for = eject_for
+        self.spool = spool
+
+        self.ejected_until = {}
+        self.turns = itertools.cycle(range(len(self.clients)))
+
+    def enqueue_in(self, seconds, func, *args, **kwargs):
+        self.enqueue_at(
+            datetime.timedelta(seconds=seconds), func, *args, **kwargs
+        )
+
+    def enqueue_at(self, time_offset, func, *args, **kwargs):
+        payload = build_payload(func, args, kwargs)
+        payload['when'] = fire_time(time_offset)
+
+        self.deliver(payload)
+
+    def enqueue(self, func, *args, **kwargs):
+        self.deliver(build_payload(func, args, kwargs))
+
+    def submit(self, func, *args, **kwargs):
+        return self.send(build_payload(func, args, kwargs))
+
+    def enqueue_many(self, func, iterable_of_args):
+        batch = build_batch(func, iterable_of_args)
+
+        response = self.deliver(batch)
+        if response is None:
+            return [{"status": "spooled"} for _ in batch["batch"]]
+
+        return response["results"]
+
+    def deliver(self, payload):
+        try:
+            return self.attempt(lambda client: client.send(payload).wait())
+        except ConnectionError:
+            if not self.spool:
+                raise
+
+        if "batch" in payload:
+            self.spool.append_many(payload["batch"])
+        else:
+            self.spool.append(payload)
+
+    def attempt(self, action):
+        """
+        Calls `action` with each master's client in turn until one doesn't
+        raise a `ConnectionError`, ejecting the ones that do.
+        """
+        error = None
+
+        for client in self.candidates():
+            try:
+                return action(client)
+            except ConnectionError as e:
+                self.eject(client, e)
+                error = e
+
+        raise error
+
+    def candidates(self):
+        now = time.time()
+
+        first = next(self.turns)
+        in_turn = self.clients[first:] + self.clients[:first]
+
+        if self.strategy == "least_outstanding":
+            in_turn.sort(key=lambda client: len(client.pending))
+
+        available = [
+            client for client in in_turn
+            if self.ejected_until.get(client, 0) <= now
+        ]
+
+        return available or in_turn
+
+    def eject(self, client, error):
+        logger.warning(
+            "Ejecting master %s for %ss: %s",
+            client.endpoint, self.eject_for, error
+        )
+        self.ejected_until[client] = time.time() + self.eject_for
+
+    def send(self, payload):
+        return self.attempt(lambda client: client.send(payload))
+
+    def drain_spool(self, batch_size=500):
+        return self.spool.drain(self, batch_size=batch_size)
+
+    def disconnect(self):
+        for client in self.clients:
+            client.disconnect()
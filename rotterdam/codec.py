@@ -0,0 +1,81 @@
+import zlib
+
+from .features import is_available
+from .serialization import date_aware_decoder
+
+
+if is_available("msgpack"):
+    import msgpack
+
+
+MSGPACK_TAG = "m:"
+ZLIB_TAG = "z:"
+
+CODECS = ("json", "msgpack")
+COMPRESSORS = ("zlib",)
+
+
+class Codec(object):
+    """
+    How a job payload is stored in redis.
+
+    Named by a spec of "<codec>[+zlib]", the codec being "json" (the
+    default) or "msgpack".  With "+zlib" payloads that come out at
+    `compress_threshold` bytes or more get compressed.
+
+    Anything but plain JSON is stored with a short tag in front, so that
+    `decode()` can read any payload no matter what codec stored it, and
+    payloads stored before codecs existed read as JSON.
+    """
+
+    def __init__(self, spec="json", compress_threshold=4096):
+        name, _, compressor = spec.partition("+")
+        if name not in CODECS:
+            raise ValueError("Unknown codec: %s" % name)
+        if compressor and compressor not in COMPRESSORS:
+            raise ValueError("Unknown compressor: %s" % compressor)
+        if name == "msgpack" and not is_available("msgpack"):
+            raise ValueError("The msgpack codec needs msgpack installed.")
+
+        self.spec = spec
+        self.name = name
+        self.compress = bool(compressor)
+        self.compress_threshold = compress_threshold
+
+    def encode(self, payload):
+        if self.name == "msgpack":
+            data = MSGPACK_TAG + msgpack.packb(
+                payload.to_dict(), use_bin_type=True
+            )
+        else:
+            data = payload.serialize()
+
+        if self.compress and len(data) >= self.compress_threshold:
+            data = ZLIB_TAG + zlib.compress(data)
+
+        return data
+
+
+def decode(data):
+    """
+    Decodes a stored payload into a dict, datetimes and timedeltas
+    included, whatever codec was used to store it.
+
+    Raises a `ValueError` if the payload is garbled.
+    """
+    if data.startswith(ZLIB_TAG):
+        try:
+            data = zlib.decompress(data[len(ZLIB_TAG):])
+        except zlib.error as e:
+            raise ValueError(str(e))
+
+    if data.startswith(MSGPACK_TAG):
+        if not is_available("msgpack"):
+            raise ValueError("Can't decode a msgpack payload without msgpack.")
+        try:
+            payload = msgpack.unpackb(data[len(MSGPACK_TAG):], raw=False)
+        except Exception as e:
+            raise ValueError(str(e))
+        return date_aware_decoder.convert(payload)
+
+    return date_aware_decoder.decode(data)
@@ -3,92 +3,476 @@ import json
 import logging
 import os
 import socket
+import stat
+import time
 
 from .payload import Payload
-from .exceptions import NoSuchJob, InvalidPayload
+from .protocol import VERSION, FLAG_HELLO, MessageBuffer, pack_frame
+from .poller import Poller
+from .serialization import split_payload
+from .exceptions import NoSuchJob, InvalidPayload, ProtocolError
 
 
-SOCKET_BUFFER_SIZE = 4096
+SOCKET_BUFFER_SIZE = 64 * 1024
+OUTBOX_HIGH_WATER = 1024 * 1024
 
 
 class Connection(object):
 
-    def __init__(self, host='', port=8765):
+    family = socket.AF_INET
+    fd_variable = "ROTTERDAM_SOCKET_FD"
+
+    def __init__(self, host='', port=8765, backlog=128, reuse_port=False):
         self.host = host
         self.port = port
+        self.backlog = backlog
+        self.reuse_port = reuse_port
 
         self.socket = None
 
         self.logger = logging.getLogger(__name__)
 
-    def open(self):
+    @property
+    def name(self):
+        return "%s:%s" % (self.host or "*", self.port)
+
+    def open(self, inherit=True):
+        """
+        Opens the listening socket, or with `inherit` picks up the one whose
+        file descriptor a relaunching master left in the environment.
+        """
         existing_fd = None
-        if "ROTTERDAM_SOCKET_FD" in os.environ:
-            existing_fd = int(os.environ.pop("ROTTERDAM_SOCKET_FD"))
+        if inherit and self.fd_variable in os.environ:
+            existing_fd = int(os.environ.pop(self.fd_variable))
             self.socket = socket.fromfd(
                 existing_fd,
-                socket.AF_INET, socket.SOCK_STREAM
+                self.family, socket.SOCK_STREAM
             )
         else:
             self.socket = socket.socket(
-                socket.AF_INET, socket.SOCK_STREAM
+                self.family, socket.SOCK_STREAM
             )
         self.socket.setblocking(0)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         if existing_fd is None:
-            self.socket.bind((self.host, self.port))
-        self.socket.listen(5)
+            self.bind()
+        self.socket.listen(self.backlog)
+
+    def bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.enable_reuse_port()
+        self.socket.bind((self.host, self.port))
+
+    def enable_reuse_port(self):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT isn't supported here.")
+
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    def shard(self):
+        """
+        Opens a fresh socket listening on the same address via SO_REUSEPORT,
+        for a single injector to accept from.
+        """
+        shard = Connection(
+            self.host, self.port, backlog=self.backlog, reuse_port=True
+        )
+        shard.open(inherit=False)
+
+        return shard
 
     def close(self):
         self.socket.close()
 
+
+class UnixConnection(Connection):
+    """
+    Listening Unix domain socket at `path`, for clients on the same host.
+
+    The socket file is given the permission bits in `mode` if set.  A stale
+    socket file left behind by a master that didn't shut down cleanly is
+    replaced, but one that's still being listened on is not.
+    """
+
+    family = socket.AF_UNIX
+    fd_variable = "ROTTERDAM_UNIX_SOCKET_FD"
+
+    def __init__(self, path, backlog=128, mode=None):
+        super(UnixConnection, self).__init__(backlog=backlog)
+
+        self.path = path
+        self.mode = mode
+
+    @property
+    def name(self):
+        return "unix://" + self.path
+
+    def bind(self):
+        self.remove_stale_socket()
+
+        self.socket.bind(self.path)
+        if self.mode is not None:
+            os.chmod(self.path, self.mode)
+
+    def remove_stale_socket(self):
+        try:
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                return
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return
+            raise
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except socket.error as e:
+            if e.errno != errno.ECONNREFUSED:
+                raise
+            os.unlink(self.path)
+        else:
+            raise RuntimeError("%s is already in use" % self.path)
+        finally:
+            probe.close()
+
+    def shard(self):
+        raise RuntimeError("Unix sockets can't be sharded.")
+
+    def close(self, unlink=True):
+        """
+        Closes the socket and removes the socket file, unless `unlink` is
+        turned off because a relaunched master has taken the socket over.
+        """
+        super(UnixConnection, self).close()
+
+        if not unlink:
+            return
+
+        try:
+            os.unlink(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+class Server(object):
+    """
+    Event-driven server for the clients connected to listening sockets.
+
+    Accepts as many clients as care to connect to any of the `listeners`
+    and keeps a buffer for each so that messages trickling in over several
+    connections at once are each picked up as soon as they're complete.
+    Every socket is non-blocking and watched by a single `Poller`, whose
+    file descriptor is what the owning worker selects on.  Clients that go
+    `idle_timeout` seconds without sending anything and with no replies
+    owed to them are disconnected.
+    """
+
+    def __init__(self, listeners, idle_timeout=300):
+        self.listeners = {
+            listener.socket.fileno(): listener for listener in listeners
+        }
+        self.idle_timeout = idle_timeout
+
+        self.poller = Poller()
+        for fd in self.listeners:
+            self.poller.register(fd)
+
+        self.clients = {}
+
+        self.logger = logging.getLogger(__name__)
+
+    def fileno(self):
+        return self.poller.fileno()
+
     def __iter__(self):
-        accepted = False
+        """
+        Handles whatever socket activity is ready without blocking,
+        yielding a `Request` for each complete message read.
+        """
+        for fd, readable, writable in self.poller.poll(0):
+            if fd in self.listeners:
+                self.accept(self.listeners[fd])
+                continue
+
+            client = self.clients.get(fd)
+            if client is None:
+                continue
+
+            if writable:
+                client.flush()
+            if readable and not client.closed:
+                for request in client.read():
+                    yield request
 
-        while not accepted:
+    def accept(self, listener):
+        while True:
             try:
-                conn, addr = self.socket.accept()
-                accepted = True
+                conn, addr = listener.socket.accept()
             except socket.error as e:
-                if e.errno == errno.EAGAIN:
-                    accepted = False
+                if e.errno in [errno.EAGAIN, errno.EINTR]:
+                    return
+                if e.errno in [errno.ECONNABORTED, errno.EPROTO]:
+                    continue
+                if e.errno in [errno.EMFILE, errno.ENFILE]:
+                    self.logger.error("Can't accept client: %s", e)
+                    return
+                raise
 
-        self.logger.debug("connection from %s:%s", addr[0], addr[1])
+            conn.setblocking(0)
 
-        message = ''
+            client = Client(self, conn, addr or listener.name)
+            self.clients[client.fd] = client
+            self.poller.register(client.fd)
 
-        while True:
+            self.logger.debug("connection from %s", client.address)
+
+    def expire_idle(self):
+        cutoff = time.time() - self.idle_timeout
+
+        for client in self.clients.values():
+            if client.outstanding or client.last_active >= cutoff:
+                continue
+
+            self.logger.debug("closing idle connection %s", client.address)
+            client.close()
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+
+        self.poller.close()
+
+    def load_request(self, responder, message):
+        try:
+            split = split_payload(message)
+        except ValueError:
+            split = None
+
+        if split is not None and "batch" in split[0]:
+            request = Request(responder, batch=True)
+            items = split[0]["batch"]
+        else:
+            request = Request(responder)
+            items = [split]
+
+        if not isinstance(items, list):
+            items = [None]
+
+        for item in items:
+            request.add(*self.load_job(item))
+
+        return request
+
+    def load_job(self, item):
+        job = None
+        try:
+            job = Payload.load_split(item)
+        except InvalidPayload:
+            response = {"status": "error", "message": "invalid payload"}
+        except NoSuchJob:
+            response = {"status": "error", "message": "no such job"}
+        except Exception as e:
+            self.logger.exception("Unhandled exception when loading job")
+            response = {"status": "error", "message": str(e)}
+        else:
+            response = None
+
+        return job, response
+
+
+class Client(object):
+    """
+    One client connection: the bytes read off of it that don't make up a
+    whole message yet, and the reply bytes the socket couldn't take yet.
+
+    A client that stops reading its replies stops being read from once
+    `OUTBOX_HIGH_WATER` bytes of them have piled up.  A client that hangs up
+    its end is closed as soon as every reply owed to it has been sent.
+    """
+
+    def __init__(self, server, conn, addr):
+        self.server = server
+        self.conn = conn
+        self.fd = conn.fileno()
+        self.address = format_address(addr)
+
+        self.buffer = MessageBuffer()
+        self.outbox = bytearray()
+        self.outstanding = 0
+        self.interest = (True, False)
+
+        self.last_active = time.time()
+        self.hung_up = False
+        self.closed = False
+
+    def read(self):
+        try:
+            chunk = self.conn.recv(SOCKET_BUFFER_SIZE)
+        except socket.error as e:
+            if e.errno in [errno.EAGAIN, errno.EINTR]:
+                return
+            self.server.logger.debug(
+                "error reading from %s: %s", self.address, e
+            )
+            self.close()
+            return
+
+        if not chunk:
+            self.hung_up = True
+            self.close_if_finished()
+            self.update_interest()
+            return
+
+        self.last_active = time.time()
+        self.buffer.feed(chunk)
+
+        try:
+            for request_id, flags, message in self.buffer.messages():
+                if flags & FLAG_HELLO:
+                    self.send(
+                        pack_frame(json.dumps({"version": VERSION}),
+                                   flags=FLAG_HELLO)
+                    )
+                    continue
+
+                self.outstanding += 1
+                yield self.server.load_request(
+                    Responder(self, self.buffer.version, request_id), message
+                )
+        except ProtocolError as e:
+            self.server.logger.warning(
+                "Dropping client connection %s: %s", self.address, e
+            )
+            self.close()
+
+    def reply(self, data):
+        self.outstanding -= 1
+        self.send(data)
+
+    def send(self, data):
+        if self.closed:
+            return
+
+        self.outbox.extend(data)
+        self.flush()
+
+    def flush(self):
+        if self.closed:
+            return
+
+        if self.outbox:
             try:
-                chunk = conn.recv(SOCKET_BUFFER_SIZE)
-                if chunk:
-                    message = message + chunk
+                sent = self.conn.send(self.outbox)
             except socket.error as e:
                 if e.errno not in [errno.EAGAIN, errno.EINTR]:
-                    raise
+                    self.server.logger.debug(
+                        "error writing to %s: %s", self.address, e
+                    )
+                    self.close()
+                    return
+                sent = 0
 
-            if not message:
-                break
+            del self.outbox[:sent]
+            self.last_active = time.time()
 
-            if "\n" in message:
-                message, extra = message.split("\n", 1)
+        self.close_if_finished()
+        self.update_interest()
 
-            try:
-                job = Payload.deserialize(message)
-            except InvalidPayload:
-                response = {"status": "error", "message": "invalid payload"}
-            except NoSuchJob:
-                response = {"status": "error", "message": "no such job"}
-            except Exception as e:
-                self.logger.exception("Unhandled exception when loading job")
-                response = {"status": "error", "message": str(e)}
-            else:
-                response = {"status": "ok"}
+    def close_if_finished(self):
+        if self.hung_up and not self.outstanding and not self.outbox:
+            self.close()
+
+    def update_interest(self):
+        if self.closed:
+            return
+
+        interest = (
+            not self.hung_up and len(self.outbox) < OUTBOX_HIGH_WATER,
+            bool(self.outbox)
+        )
+        if interest == self.interest:
+            return
+
+        self.server.poller.modify(self.fd, *interest)
+        self.interest = interest
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.server.poller.unregister(self.fd)
+        self.server.clients.pop(self.fd, None)
+        self.conn.close()
+
+
+def format_address(addr):
+    if isinstance(addr, tuple):
+        return "%s:%s" % addr[:2]
+
+    return addr
+
+
+class Request(object):
+    """
+    A single message read off of a client connection.
 
-            conn.sendall(json.dumps(response) + "\n")
+    Holds the jobs the message carried (a lone job, or several for a batch
+    frame) along with a response for each.  Jobs that failed to load get
+    their error response right away, the rest are filled in by whoever
+    stores the jobs before `reply()` is called.
+    """
 
-            if response['status'] == "ok":
-                yield job
+    def __init__(self, responder, batch=False):
+        self.responder = responder
+        self.batch = batch
 
-            message = extra
+        self.jobs = []
+        self.responses = []
 
-        conn.close()
+    def add(self, job, response=None):
+        self.jobs.append(job)
+        self.responses.append(response)
+
+    def pending(self):
+        return [
+            (index, job) for index, job in enumerate(self.jobs)
+            if self.responses[index] is None
+        ]
+
+    def set_status(self, index, status, message=None, **extra):
+        response = {"status": status}
+        if message:
+            response["message"] = message
+        response.update(extra)
+
+        self.responses[index] = response
+
+    def reply(self):
+        if self.batch:
+            response = {"status": "ok", "results": self.responses}
+        else:
+            response = self.responses[0]
+            if response["status"] == "duplicate":
+                response = {"status": "ok", "duplicate": True}
+
+        self.responder.send(json.dumps(response))
+
+
+class Responder(object):
+    """
+    Sends the reply for a request back in whichever protocol version the
+    client is speaking.
+    """
+
+    def __init__(self, client, version, request_id):
+        self.client = client
+        self.version = version
+        self.request_id = request_id
+
+    def send(self, message):
+        if self.version == VERSION:
+            self.client.reply(pack_frame(message, self.request_id))
+        else:
+            self.client.reply(message + "\n")
@@ -1,5 +1,7 @@
 import time
 
+import redis
+
 from .payload import Payload
 from .worker import Worker
 from .features import is_available
@@ -35,13 +37,32 @@ class Consumer(Worker):
             self.run_job(payload)
 
     def run_job(self, payload):
+        """
+        Runs the job and reports back to the arbiter with just the queue
+        and unique key of the job, all it needs to finish the job off.
+
+        Offloaded jobs have their full payload fetched from redis first.
+        Jobs that can't be loaded (say their module is gone) are reported
+        by the queue and key stored with them, so they get finished too.
+        Offloaded jobs whose body can't be fetched for redis being down are
+        reported with no queue, which leaves them unfinished.
+        """
         self.logger.debug("Job started", extra={"payload": payload})
         start_time = time.time()
 
+        queue, key = None, None
         try:
             job = Payload.deserialize(payload)
+            queue, key = job.queue_name, job.unique_key
+            if job.offloaded:
+                job.load_body(self.redis.qbody(queue, key))
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.logger.exception("Error fetching job body, not finishing it")
+            queue, key = None, None
         except Exception:
             self.logger.exception("Exception when loading job!")
+            if queue is None:
+                queue, key = Payload.identify(payload)
         else:
             try:
                 job.run()
@@ -53,6 +74,8 @@ class Consumer(Worker):
         self.logger.debug(
             "Job completed in %0.2fs seconds", end_time - start_time
         )
-        self.outputs['results'].put(
-            {"payload": payload, "time": end_time - start_time}
-        )
+        self.outputs['results'].put({
+            "queue": queue,
+            "key": key,
+            "time": end_time - start_time
+        })
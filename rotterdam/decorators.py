@@ -1,19 +1,50 @@
 import functools
+import inspect
 
+from .pool import get_default_pool
 
-def job(queue_name, unique=False, delay=None):
+
+def job(queue_name, unique=False, delay=None, codec=None):
+    """
+    Marks a function as a job to be run off of the named queue.
+
+    A `unique` job isn't enqueued again while an identical one is still
+    pending.  Identical means the same arguments, or with `unique` set to a
+    list of argument names, the same values for just those arguments.
+
+    The `codec` is how the job is stored, see `rotterdam.codec.Codec`,
+    overriding the `queue_codecs` setting.
+    """
 
     def inner(fn):
         fn.job_metadata = {
             "queue_name": queue_name,
             "unique": unique,
-            "delay": delay
+            "delay": delay,
+            "codec": codec,
+            "arg_names": argument_names(fn)
         }
 
         @functools.wraps(fn)
         def wrapper(*wrapped_args, **wrapped_kwargs):
             return fn(*wrapped_args, **wrapped_kwargs)
 
+        def enqueue(*args, **kwargs):
+            get_default_pool().enqueue(wrapper, *args, **kwargs)
+
+        def enqueue_in(seconds, *args, **kwargs):
+            get_default_pool().enqueue_in(seconds, wrapper, *args, **kwargs)
+
+        wrapper.delay = enqueue
+        wrapper.delay_in = enqueue_in
+
         return wrapper
 
     return inner
+
+
+def argument_names(fn):
+    try:
+        return inspect.getargspec(fn).args
+    except TypeError:
+        return []
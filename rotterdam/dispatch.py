@@ -0,0 +1,91 @@
+import collections
+
+from .redis_extensions import WAKEUP_CHANNEL
+
+
+class QueueShares(object):
+    """
+    Splits each batch of jobs handed out between the queues.
+
+    Queues are given by name, or as a dict of name to weight where each
+    queue's share of a batch is in proportion to its weight.  Shares are
+    whole jobs, the fractions go to the queues owed the most so far and
+    the difference is carried into later batches (kept in units of
+    1/total weight), so that a weight of 1 out of 200 still gets its turn
+    with batches of 5.  Whatever a queue can't use of its share goes to the
+    others, starting from a different queue each time.
+
+    With `strict` set the queues are in priority order instead: a queue
+    only gets jobs once every queue before it has run out of ready ones.
+    """
+
+    def __init__(self, queues, strict=False):
+        if not isinstance(queues, dict):
+            queues = collections.OrderedDict((name, 1) for name in queues)
+
+        self.names = list(queues)
+        self.weights = [queues[name] for name in self.names]
+        self.total_weight = sum(self.weights)
+        self.strict = strict
+
+        self.credits = [0] * len(self.names)
+        self.rotation = 0
+
+    def split(self, maxitems):
+        """
+        Returns a list of each queue's share of a batch of `maxitems`, and
+        the index of the queue to start from when handing out leftovers.
+        """
+        maxitems = max(maxitems, 0)
+
+        if self.strict:
+            return [maxitems] * len(self.names), 0
+
+        count = len(self.names)
+
+        quotas = []
+        for index, weight in enumerate(self.weights):
+            owed = self.credits[index] + maxitems * weight
+            quota = max(owed // self.total_weight, 0)
+            self.credits[index] = owed - quota * self.total_weight
+            quotas.append(quota)
+
+        most_owed = sorted(
+            range(count),
+            key=lambda i: (-self.credits[i], (i - self.rotation) % count)
+        )
+        for index in most_owed[:maxitems - sum(quotas)]:
+            quotas[index] += 1
+            self.credits[index] -= self.total_weight
+
+        fill_start = self.rotation
+        self.rotation = (self.rotation + 1) % len(self.names)
+
+        return quotas, fill_start
+
+
+class Wakeups(object):
+    """
+    Subscription to the channel `qadd` announces jobs coming due on.
+
+    Each announcement is the time a queue's earliest job is due, now or
+    later.  Selectable, so it can sit among a worker's sources.
+    """
+
+    def __init__(self, redis):
+        self.pubsub = redis.pubsub()
+        self.pubsub.subscribe(WAKEUP_CHANNEL)
+
+    def fileno(self):
+        return self.pubsub.connection._sock.fileno()
+
+    def drain(self):
+        """
+        Reads every announcement waiting.  What they announce doesn't
+        matter much, the arbiter looks up the next due time itself.
+        """
+        while self.pubsub.get_message() is not None:
+            pass
+
+    def close(self):
+        self.pubsub.close()
@@ -16,3 +16,28 @@ class InvalidPayload(RotterdamError):
 
 class JobEnqueueError(RotterdamError):
     pass
+
+
+class PoolTimeout(RotterdamError):
+    pass
+
+
+class BufferFull(RotterdamError):
+    pass
+
+
+class SpoolBusy(RotterdamError):
+    pass
+
+
+class ProtocolError(RotterdamError):
+    pass
+
+
+class QueueBusy(JobEnqueueError):
+
+    def __init__(self, retry_after=None):
+        super(QueueBusy, self).__init__(
+            "queue is busy, retry after %ss" % retry_after
+        )
+        self.retry_after = retry_after
@@ -7,6 +7,18 @@ try:
 except ImportError:
     pass
 
+try:
+    import trollius
+    available.add("asyncio")
+except ImportError:
+    pass
+
+try:
+    import msgpack
+    available.add("msgpack")
+except ImportError:
+    pass
+
 
 def is_available(feature):
     return bool(feature in available)
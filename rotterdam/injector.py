@@ -1,19 +1,227 @@
+import collections
+import socket
+import time
+
+from .admission import Admission
+from .codec import Codec
+from .connection import Server
 from .worker import Worker
 
 
 class Injector(Worker):
+    """
+    Reads jobs off of client connections and stores them in redis.
+
+    Jobs are stored in batches: requests pile up until they hold
+    `injector_batch_size` jobs or the first has waited `injector_linger`
+    seconds, then every job in them goes to redis in one round trip.  Only
+    once that's done are the clients sent their replies.
+
+    Jobs for queues over their high watermark get a "busy" reply instead
+    of being stored, see `Admission`.  The rest are stored with the codec
+    of their job or queue, see `Codec`.  Payloads of `offload_threshold`
+    bytes or more are stored apart from the job pool, leaving a stub with
+    just the job's header in it.
+    """
 
     source_handlers = {
         "connection": "handle_incoming_jobs"
     }
 
+    def __init__(self, master):
+        super(Injector, self).__init__(master)
+
+        self.unix_conn = master.unix_conn
+
+    def setup(self):
+        super(Injector, self).setup()
+
+        self.server = Server(
+            self.open_listeners(),
+            idle_timeout=self.config.client_idle_timeout
+        )
+        self.sources['connection'] = self.server
+
+        self.batch = []
+        self.batch_jobs = 0
+        self.batch_started = None
+
+        self.last_idle_check = time.time()
+
+        self.admission = Admission(
+            self.redis,
+            self.config.queue_watermarks or {},
+            refresh_interval=self.config.watermark_refresh_interval
+        )
+
+        self.queue_codecs = self.config.queue_codecs or {}
+        self.codecs = {}
+
+    def open_listeners(self):
+        """
+        Returns the sockets to accept clients from: the master's shared
+        socket, plus one of this injector's own if the shared socket is in
+        `reuse_port` mode and the master's Unix socket if there is one.
+
+        The shared socket is still served in `reuse_port` mode since it's
+        the one handed over on relaunch and thus never misses a connection.
+        """
+        listeners = [self.sources['connection']]
+
+        if self.sources['connection'].reuse_port:
+            try:
+                listeners.append(self.sources['connection'].shard())
+            except (socket.error, RuntimeError) as e:
+                self.logger.warning(
+                    "Can't open own socket, sharing the master's: %s", e
+                )
+
+        if self.unix_conn:
+            listeners.append(self.unix_conn)
+
+        return listeners
+
+    def heartbeat(self):
+        super(Injector, self).heartbeat()
+        self.flush_batch_if_due()
+        self.admission.refresh_if_due()
+
+        now = time.time()
+        if now - self.last_idle_check >= 1:
+            self.server.expire_idle()
+            self.last_idle_check = now
+
+    def poll_timeout(self):
+        timeout = super(Injector, self).poll_timeout()
+        if not self.batch:
+            return timeout
+
+        return max(0, min(timeout, self.batch_deadline() - time.time()))
+
+    def teardown(self):
+        self.flush_batch()
+        self.server.close()
+
     def handle_incoming_jobs(self):
-        for job in self.sources['connection']:
-            self.logger.debug("job recieved: %s", job)
-
-            self.redis.qadd(
-                job.queue_name,
-                job.when,
-                job.unique_key,
-                job.serialize()
-            )
+        for request in self.server:
+            self.add_to_batch(request)
+
+            if self.batch_jobs >= self.config.injector_batch_size:
+                self.flush_batch()
+
+    def add_to_batch(self, request):
+        if not self.batch:
+            self.batch_started = time.time()
+
+        self.batch.append(request)
+        self.batch_jobs += len(request.jobs)
+
+    def batch_deadline(self):
+        return self.batch_started + self.config.injector_linger
+
+    def flush_batch_if_due(self):
+        if self.batch and time.time() >= self.batch_deadline():
+            self.flush_batch()
+
+    def flush_batch(self):
+        """
+        Stores the jobs of every batched request and only then replies to
+        them, in the order they came in.
+        """
+        requests = self.batch
+        self.batch = []
+        self.batch_jobs = 0
+
+        self.store_jobs(requests)
+
+        for request in requests:
+            request.reply()
+
+    def store_jobs(self, requests):
+        jobs_by_queue = collections.defaultdict(list)
+        for request in requests:
+            for index, job in request.pending():
+                self.logger.debug("job recieved: %s", job)
+                jobs_by_queue[job.queue_name].append((request, index, job))
+
+        self.turn_away_busy(jobs_by_queue)
+
+        if not jobs_by_queue:
+            return
+
+        try:
+            results = self.redis.qadd_batch({
+                queue_name: [
+                    (job.when, job.unique_key) + self.encode(job)
+                    for _, _, job in jobs
+                ]
+                for queue_name, jobs in jobs_by_queue.iteritems()
+            })
+        except Exception as e:
+            self.logger.exception("Error when storing jobs")
+            results = dict.fromkeys(jobs_by_queue, e)
+
+        for queue_name, jobs in jobs_by_queue.iteritems():
+            added = results[queue_name]
+            if isinstance(added, Exception):
+                self.logger.error(
+                    "Error when storing jobs for %s: %s", queue_name, added
+                )
+                for request, index, _ in jobs:
+                    request.set_status(index, "error", str(added))
+                continue
+
+            for (request, index, _), was_added in zip(jobs, added):
+                request.set_status(index, "ok" if was_added else "duplicate")
+
+            self.admission.record(queue_name, sum(added))
+
+    def encode(self, job):
+        """
+        Returns a (payload, body) tuple for the job, the body being None
+        unless the job is big enough to offload.
+        """
+        data = self.codec_for(job).encode(job)
+
+        threshold = self.config.offload_threshold
+        if threshold and len(data) >= threshold:
+            return job.serialize_stub(), data
+
+        return data, None
+
+    def codec_for(self, job):
+        """
+        Returns the codec to store the job with: its own, its queue's, the
+        "*" queue's, or plain JSON.  Codecs that can't be used (msgpack not
+        being installed, say) are warned about and JSON used instead.
+        """
+        spec = (
+            job.metadata.get("codec") or
+            self.queue_codecs.get(job.queue_name) or
+            self.queue_codecs.get("*") or
+            "json"
+        )
+
+        if spec not in self.codecs:
+            try:
+                self.codecs[spec] = Codec(
+                    spec, compress_threshold=self.config.compress_threshold
+                )
+            except ValueError as e:
+                self.logger.warning("Storing %s jobs as json: %s", spec, e)
+                self.codecs[spec] = Codec("json")
+
+        return self.codecs[spec]
+
+    def turn_away_busy(self, jobs_by_queue):
+        for queue_name in list(jobs_by_queue):
+            if self.admission.admits(queue_name):
+                continue
+
+            # The message is for clients from before "busy" existed, which
+            # expect one with any status that isn't "ok".
+            for request, index, _ in jobs_by_queue.pop(queue_name):
+                request.set_status(
+                    index, "busy", message="queue is busy",
+                    retry_after=self.admission.retry_after
+                )
@@ -1,17 +1,44 @@
-local scheduled_set, ready_set, working_set, job_pool = unpack(KEYS)
-local timestamp, when_to_fire, unique_key, payload = unpack(ARGV)
+local scheduled_set, ready_list, job_pool, job_bodies, active_index = unpack(KEYS)
+local queue_name, wakeup_channel = ARGV[1], ARGV[3]
+local timestamp = tonumber(ARGV[2])
 
-if redis.call("ZSCORE", scheduled_set, unique_key) ~= false then
-    return nil
-end
-if redis.call("ZSCORE", ready_set, unique_key) ~= false then
-    return nil
-end
-if redis.call("ZSCORE", working_set, unique_key) ~= false then
-    return nil
+local added = {}
+local next_due = nil
+
+for i = 4, #ARGV, 4 do
+    local when_to_fire, unique_key = tonumber(ARGV[i]), ARGV[i+1]
+    local payload, body = ARGV[i+2], ARGV[i+3]
+
+    if redis.call("HEXISTS", job_pool, unique_key) == 1 then
+        added[#added+1] = 0
+    else
+        if when_to_fire <= timestamp then
+            redis.call("RPUSH", ready_list, unique_key)
+            when_to_fire = timestamp
+        else
+            redis.call("ZADD", scheduled_set, ARGV[i], unique_key)
+        end
+        redis.call("HSET", job_pool, unique_key, payload)
+        if body ~= "" then
+            redis.call("HSET", job_bodies, unique_key, body)
+        end
+        added[#added+1] = 1
+
+        if next_due == nil or when_to_fire < next_due then
+            next_due = when_to_fire
+        end
+    end
 end
 
-redis.call("ZADD", scheduled_set, when_to_fire, unique_key)
-redis.call("HSET", job_pool, unique_key, payload)
+-- The queue is due in the active index as soon as its earliest job is,
+-- and if that's sooner than it was arbiters waiting on the wakeup channel
+-- are told when.
+if next_due ~= nil then
+    local current = redis.call("ZSCORE", active_index, queue_name)
+    if current == false or next_due < tonumber(current) then
+        redis.call("ZADD", active_index, next_due, queue_name)
+        redis.call("PUBLISH", wakeup_channel, string.format("%.6f", next_due))
+    end
+end
 
-return 1
+return added
@@ -1,10 +1,31 @@
-local working_set, done_set, job_pool = unpack(KEYS)
-local timestamp = ARGV[1]
-table.remove(ARGV, 1)
-local unique_keys = ARGV
+local working_set, done_set, job_pool, job_bodies, stats = unpack(KEYS)
+local timestamp, max_age, max_count, keep_done, trim_slice = unpack(ARGV, 1, 5)
+max_age = tonumber(max_age)
+max_count = tonumber(max_count)
+trim_slice = tonumber(trim_slice)
 
-if next(unique_keys) == nil then
-    return {}
+local unique_keys = {}
+for i = 6, #ARGV do
+    unique_keys[#unique_keys+1] = ARGV[i]
+end
+
+if #unique_keys == 0 then
+    return 0
+end
+
+local finished = redis.call("ZREM", working_set, unpack(unique_keys))
+redis.call("HDEL", job_pool, unpack(unique_keys))
+redis.call("HDEL", job_bodies, unpack(unique_keys))
+
+redis.call("HINCRBY", stats, "finished", finished)
+redis.call("HSET", stats, "last_finished", timestamp)
+
+-- The done set is trimmed by at most `trim_slice` jobs per call, which is
+-- still more than each call adds, so it gets within its limits without
+-- any one call taking long.
+if keep_done ~= "1" then
+    redis.call("ZREMRANGEBYRANK", done_set, 0, trim_slice - 1)
+    return finished
 end
 
 local zadd_args = {}
@@ -12,9 +33,26 @@ for i, unique_key in ipairs(unique_keys) do
     zadd_args[2 * i - 1] = timestamp
     zadd_args[2 * i] = unique_key
 end
+redis.call("ZADD", done_set, unpack(zadd_args))
 
-redis.call("ZREM", working_set, unpack(unique_keys))
-redis.call("ZADD", done_set, zadd_args)
-redis.call("HDEL", job_pool, unpack(unique_keys))
+if max_age > 0 then
+    local expired = redis.call(
+        "ZRANGEBYSCORE", done_set, "-inf", tonumber(timestamp) - max_age,
+        "LIMIT", 0, trim_slice
+    )
+    if #expired > 0 then
+        redis.call("ZREM", done_set, unpack(expired))
+        trim_slice = trim_slice - #expired
+    end
+end
+
+if max_count > 0 and trim_slice > 0 then
+    local excess = redis.call("ZCARD", done_set) - max_count
+    if excess > 0 then
+        redis.call(
+            "ZREMRANGEBYRANK", done_set, 0, math.min(excess, trim_slice) - 1
+        )
+    end
+end
 
-return 1
+return finished
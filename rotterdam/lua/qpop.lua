@@ -1,86 +1,154 @@
-local function log(msg)
-    redis.log(redis.LOG_DEBUG, msg)
+local active_index = KEYS[1]
+local timestamp, cutoff, maxitems, promote_limit, fill_start = unpack(ARGV, 1, 5)
+maxitems = tonumber(maxitems)
+fill_start = tonumber(fill_start)
+
+local subscriptions, quotas = {}, {}
+for i = 6, #ARGV, 2 do
+    subscriptions[#subscriptions+1] = ARGV[i]
+    quotas[#quotas+1] = tonumber(ARGV[i+1])
 end
 
-local function sortbyvalue(t)
-    local keys = {}
-    for key in pairs(t) do keys[#keys+1] = key end
+local function key(queue, kind)
+    return "rotterdam:" .. queue .. ":" .. kind
+end
 
-    table.sort(keys, function(a, b) return t[a] < t[b] end)
+-- Only queues with jobs due are looked at, the ones served longest ago
+-- first.  Each goes with the first subscription it matches: its own name
+-- if it's subscribed to by name, otherwise the first matching prefix.
+local exact, prefixes = {}, {}
+for s, subscription in ipairs(subscriptions) do
+    if string.sub(subscription, -1) == "*" then
+        prefixes[#prefixes+1] = {s, string.sub(subscription, 1, -2)}
+    elseif exact[subscription] == nil then
+        exact[subscription] = s
+    end
+end
 
-    local i = 0
-    return function()
-        i = i + 1
-        if keys[i] then
-            return keys[i], t[keys[i]]
+local function subscription_of(queue)
+    if exact[queue] ~= nil then
+        return exact[queue]
+    end
+    for _, prefix in ipairs(prefixes) do
+        if string.sub(queue, 1, #prefix[2]) == prefix[2] then
+            return prefix[1]
         end
     end
 end
 
-local function getkeysandscores(schedule_set, cutoff_time, item_limit)
-    return redis.call(
-        "ZRANGEBYSCORE", schedule_set, 0, cutoff_time,
-        "WITHSCORES", "LIMIT", 0, item_limit
-    )
+local members = {}
+for s = 1, #subscriptions do
+    members[s] = {}
 end
-
-local function getjobs(sched_set, work_set, pool, unique_keys, tstamp)
-    if #unique_keys == 0 then
-        return {}
+local due_queues = redis.call("ZRANGEBYSCORE", active_index, "-inf", cutoff)
+for _, queue in ipairs(due_queues) do
+    local s = subscription_of(queue)
+    if s ~= nil then
+        members[s][#members[s]+1] = queue
     end
+end
 
-    local zadd_args = {}
-    for i, unique_key in ipairs(unique_keys) do
-        zadd_args[2 * i - 1] = tstamp
-        zadd_args[2 * i] = unique_key
+local visited = {}
+local taken = {}
+
+local function take(queue, count)
+    if not taken[queue] then
+        taken[queue] = {}
+        visited[#visited+1] = queue
+
+        local due = redis.call(
+            "ZRANGEBYSCORE", key(queue, "scheduled"), "-inf", cutoff,
+            "LIMIT", 0, promote_limit
+        )
+        if #due > 0 then
+            redis.call("ZREM", key(queue, "scheduled"), unpack(due))
+            redis.call("RPUSH", key(queue, "ready"), unpack(due))
+        end
     end
 
-    local num_removed = redis.call("ZREM", sched_set, unpack(unique_keys))
+    if count <= 0 then
+        return 0
+    end
 
-    if num_removed == 0 then
-        return {}
+    local ready_list = key(queue, "ready")
+    local unique_keys = redis.call("LRANGE", ready_list, 0, count - 1)
+    if #unique_keys > 0 then
+        redis.call("LTRIM", ready_list, #unique_keys, -1)
     end
 
-    redis.call("ZADD", work_set, zadd_args)
+    for _, unique_key in ipairs(unique_keys) do
+        taken[queue][#taken[queue]+1] = unique_key
+    end
 
-    return redis.call("HMGET", pool, unpack(unique_keys))
+    return #unique_keys
 end
 
-local timestamp, cutoff, maxitems = unpack(ARGV)
-
-local keys_by_queue = {}
-local uniques = {}
-for i = 1, #KEYS, 3 do
-    local scheduled_set = KEYS[i]
+local function take_from(s, count)
+    local queues = members[s]
+    local got = 0
+    for i, queue in ipairs(queues) do
+        local left = count - got
+        if left <= 0 then
+            break
+        end
+        got = got + take(queue, math.ceil(left / (#queues - i + 1)))
+    end
+    return got
+end
 
-    local keys_and_scores = getkeysandscores(scheduled_set, cutoff, maxitems)
+local remaining = maxitems
 
-    for i = 1, #keys_and_scores, 2 do
-        uniques[keys_and_scores[i]] = keys_and_scores[i+1]
-    end
+for s = 1, #subscriptions do
+    remaining = remaining - take_from(s, math.min(quotas[s], remaining))
 end
 
-local keys = {}
-local count = 0
-for key, score in sortbyvalue(uniques) do
-    if count < tonumber(maxitems) then
-        keys[#keys+1] = key
-        count = count + 1
+for i = 0, #subscriptions - 1 do
+    if remaining <= 0 then
+        break
     end
+    local s = (fill_start + i) % #subscriptions + 1
+    remaining = remaining - take_from(s, remaining)
 end
 
+local served_at = math.min(tonumber(timestamp), tonumber(cutoff)) - 0.001
 local payloads = {}
 
-for i = 1, #KEYS, 3 do
-    local scheduled_set = KEYS[i]
-    local working_set = KEYS[i+1]
-    local job_pool = KEYS[i+2]
+for v, queue in ipairs(visited) do
+    local unique_keys = taken[queue]
+
+    if #unique_keys > 0 then
+        local jobs = redis.call(
+            "HMGET", key(queue, "jobs:pool"), unpack(unique_keys)
+        )
+
+        local zadd_args = {}
+        for i = 1, #unique_keys do
+            local payload = jobs[i]
+            if payload then
+                zadd_args[#zadd_args+1] = timestamp
+                zadd_args[#zadd_args+1] = unique_keys[i]
+                payloads[#payloads+1] = payload
+            end
+        end
 
-    local jobs = getjobs(scheduled_set, working_set, job_pool, keys, timestamp)
+        if #zadd_args > 0 then
+            redis.call("ZADD", key(queue, "working"), unpack(zadd_args))
+        end
+    end
 
-    for index, payload in pairs(jobs) do
-        if payload ~= false then
-            payloads[#payloads+1] = payload
+    -- Queues with jobs still ready go to the back of the line (in the
+    -- order they were served in, and still under the cutoff), the rest
+    -- are due again when their next scheduled job is, if they have one.
+    if redis.call("LLEN", key(queue, "ready")) > 0 then
+        redis.call("ZADD", active_index, served_at + v * 0.000001, queue)
+    else
+        local next_job = redis.call(
+            "ZRANGE", key(queue, "scheduled"), 0, 0, "WITHSCORES"
+        )
+        if #next_job > 0 then
+            redis.call("ZADD", active_index, next_job[2], queue)
+        else
+            redis.call("ZREM", active_index, queue)
         end
     end
 end
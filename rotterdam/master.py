@@ -8,17 +8,16 @@ from multiprocessing import queues
 import redis
 import setproctitle
 
-from .connection import Connection
+from .connection import Connection, UnixConnection
 from .proc import Proc
 from .arbiter import Arbiter
 from .injector import Injector
 from .consumer import Consumer
 from .team import Team
 from .redis_extensions import extend_redis
+from .registry import registry
 
 
-NUM_INJECTORS = 2
-
 NUM_ARBITERS = 1
 
 
@@ -48,6 +47,7 @@ class Master(Proc):
         self.consumers = Team(self, Consumer)
 
         self.conn = None
+        self.unix_conn = None
         self.redis = None
 
         self.ready_queue = None
@@ -92,10 +92,34 @@ class Master(Proc):
             fd.close()
 
     def setup_connection(self):
-        self.conn = Connection(port=self.config.listen_port)
+        self.conn = Connection(
+            port=self.config.listen_port,
+            backlog=self.config.listen_backlog,
+            reuse_port=self.config.reuse_port
+        )
         self.conn.open()
         self.logger.info("Listening on port %s", self.config.listen_port)
 
+    def setup_unix_connection(self):
+        if not self.config.listen_unix:
+            return
+
+        self.unix_conn = UnixConnection(
+            self.config.listen_unix,
+            backlog=self.config.listen_backlog,
+            mode=self.config.listen_unix_mode
+        )
+        self.unix_conn.open()
+        self.logger.info("Listening on %s", self.unix_conn.name)
+
+    def setup_job_registry(self):
+        registry.clear()
+        registry.missing_ttl = self.config.missing_job_ttl
+
+        if self.config.job_modules:
+            registry.preload(self.config.job_modules)
+            self.logger.info("Loaded %d job functions", len(registry.jobs))
+
     def setup_redis(self):
         if ":" in self.config.redis_host:
             host, port = self.config.redis_host.split(":")
@@ -115,11 +139,13 @@ class Master(Proc):
         self.setup_pid_file()
         self.setup_ipc_queues()
         self.setup_connection()
+        self.setup_unix_connection()
+        self.setup_job_registry()
         self.setup_redis()
 
     def run(self):
         super(Master, self).run()
-        self.injectors.set_size(NUM_INJECTORS)
+        self.injectors.set_size(self.config.num_injectors)
         self.arbiters.set_size(NUM_ARBITERS)
         self.consumers.set_size(self.config.num_consumers)
 
@@ -163,8 +189,27 @@ class Master(Proc):
         if self.config.listen_port != old_port:
             self.conn.close()
             self.setup_connection()
+        elif self.config.reuse_port != self.conn.reuse_port:
+            # The injectors are still listening on the port, a socket
+            # rebound with the flag flipped would clash with theirs.
+            self.logger.warning(
+                "Changing reuse_port takes a restart, staying with %s",
+                self.conn.reuse_port
+            )
+
+        unix_path = self.unix_conn and self.unix_conn.path
+        if (self.config.listen_unix or None) != unix_path:
+            # The injectors only serve the Unix socket they were started
+            # with, so swapping it out would leave nothing to accept on it.
+            self.logger.warning(
+                "Changing listen_unix takes a restart, staying with %s",
+                unix_path
+            )
+
+        self.setup_job_registry()
+        self.broadcast(signal.SIGHUP)
 
-        self.injectors.set_size(NUM_INJECTORS)
+        self.injectors.set_size(self.config.num_injectors)
         self.arbiters.set_size(NUM_ARBITERS)
         self.consumers.set_size(self.config.num_consumers)
 
@@ -183,6 +228,10 @@ class Master(Proc):
             return
 
         os.environ["ROTTERDAM_SOCKET_FD"] = str(self.conn.socket.fileno())
+        if self.unix_conn:
+            os.environ["ROTTERDAM_UNIX_SOCKET_FD"] = str(
+                self.unix_conn.socket.fileno()
+            )
 
         os.chdir(self.launch_context["cwd"])
 
@@ -239,5 +288,7 @@ class Master(Proc):
         else:
             self.logger.info("Winding down IMMEDIATELY.")
         self.conn.close()
+        if self.unix_conn:
+            self.unix_conn.close(unlink=not self.reexec_pid)
         self.wind_down_time = (time.time() + self.config.shutdown_grace_period)
         self.broadcast(signal.SIGTERM if graceful else signal.SIGQUIT)
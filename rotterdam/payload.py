@@ -5,91 +5,310 @@ import os
 import random
 import time
 
-from .serialization import DateAwareJSONDecoder, DateAwareJSONEncoder
-from .exceptions import NoSuchJob, InvalidPayload
+from . import codec
+from .serialization import DateAwareJSONEncoder, date_aware_decoder
+from .exceptions import InvalidPayload
+from .registry import registry
 
 
 logger = logging.getLogger(__name__)
 
 
+def hash_key(data):
+    """
+    Hashes a job's whole canonical identity in one go, rather than a hash
+    update per field.
+    """
+    return hashlib.md5(data).hexdigest()
+
+
+CONTAINERS = (dict, list, tuple)
+
+
+def canonical_json(value):
+    """
+    Encodes the value as JSON that's always the same for equal values, no
+    matter what order its dicts were built in.
+
+    Values without any dicts (no "{" in their plain encoding) are left as
+    they are, otherwise every dict is swapped for a `{"": [[key, value],
+    ...]}` one sorted by key.  Python 2's json module can only sort keys
+    with its pure-python encoder, this keeps the C one.
+    """
+    encoded = json.dumps(
+        value, separators=(",", ":"), cls=DateAwareJSONEncoder
+    )
+    if "{" not in encoded:
+        return encoded
+
+    return json.dumps(
+        sorted_dicts(value), separators=(",", ":"), cls=DateAwareJSONEncoder
+    )
+
+
+def sorted_dicts(value):
+    if isinstance(value, dict):
+        return {"": [
+            [key, sorted_dicts(item) if isinstance(item, CONTAINERS) else item]
+            for key, item in sorted(value.iteritems())
+        ]}
+
+    return [
+        sorted_dicts(item) if isinstance(item, CONTAINERS) else item
+        for item in value
+    ]
+
+
 class Payload(object):
+    """
+    A job: which function to call, with what arguments, and when.
+
+    Jobs coming in from clients are loaded from a split payload (see
+    `split_payload()`), whose args and kwargs are kept as the raw JSON text
+    they arrived as.  They're only decoded if something asks for them, and
+    are stored as-is when the job is serialized.
+
+    Jobs too big to keep in the job pool are stored as a stub holding just
+    the header (see `serialize_stub()`), with the full payload kept apart.
+    A job loaded from a stub is `offloaded` until `load_body()` is given
+    that full payload.
+    """
 
     def __init__(self):
+        self.queue_name = None
         self.module = None
         self.func = None
-        self.args = None
-        self.kwargs = None
+        self.raw_args = None
+        self.raw_kwargs = None
+        self._args = None
+        self._kwargs = None
         self.call = None
+        self.metadata = None
 
         self.when = None
 
         self.unique_key = None
 
+        self.offloaded = False
+
     @classmethod
     def deserialize(cls, message):
+        """
+        Loads a job from its stored form, whichever codec stored it (see
+        `rotterdam.codec`).
+        """
         try:
-            payload = json.loads(message, cls=DateAwareJSONDecoder)
+            payload = codec.decode(message)
         except ValueError:
             logger.exception("Error when loading json")
             raise InvalidPayload
 
-        instance = cls.import_func(payload['module'], payload['func'])
-        instance.module = payload['module']
-        instance.func = payload['func']
+        return cls.load(payload)
+
+    @classmethod
+    def identify(cls, message):
+        """
+        Returns the (queue, unique key) a job was stored under, read
+        straight from its stored form so it works even if the job itself
+        can't be loaded.  Either is None if it can't be told, as with jobs
+        stored before the queue was recorded.
+        """
+        try:
+            header = codec.decode(message)
+        except ValueError:
+            return None, None
+        if not isinstance(header, dict):
+            return None, None
+
+        return header.get("queue"), header.get("unique_key")
+
+    @classmethod
+    def load(cls, payload):
+        instance = cls.load_header(payload)
+        if payload.get("offloaded"):
+            instance.offloaded = True
+            return instance
+
         instance.args = payload.get('args', [])
         instance.kwargs = payload.get('kwargs', {})
-        instance.unique_key = payload.get("unique_key")
-        instance.when = payload.get("when", time.time())
 
-        metadata = instance.call.job_metadata
-        instance.queue_name = metadata['queue_name']
-        if metadata['delay']:
-            instance.when += metadata['delay'].total_seconds()
+        if not instance.unique_key:
+            instance.determine_unique_key()
+
+        return instance
+
+    @classmethod
+    def load_split(cls, split):
+        """
+        Loads a job from a (header, body) pair as returned by
+        `split_payload()`, leaving the args and kwargs undecoded.
+        """
+        if split is None:
+            raise InvalidPayload
+        header, body = split
+
+        raw_args = body.get("args", "[]")
+        raw_kwargs = body.get("kwargs", "{}")
+        if not raw_args.startswith("[") or not raw_kwargs.startswith("{"):
+            raise InvalidPayload
+
+        instance = cls.load_header(header)
+        instance.raw_args = raw_args
+        instance.raw_kwargs = raw_kwargs
 
         if not instance.unique_key:
             instance.determine_unique_key()
 
         return instance
 
+    @classmethod
+    def load_header(cls, header):
+        if not isinstance(header, dict):
+            raise InvalidPayload
+        if "module" not in header or "func" not in header:
+            raise InvalidPayload
+
+        instance = cls.import_func(header['module'], header['func'])
+        instance.module = header['module']
+        instance.func = header['func']
+        instance.unique_key = header.get("unique_key")
+        instance.when = header.get("when", time.time())
+
+        metadata = instance.metadata
+        instance.queue_name = metadata['queue_name']
+        if metadata['delay']:
+            instance.when += metadata['delay'].total_seconds()
+
+        return instance
+
+    def load_body(self, stored):
+        """
+        Fills in the args and kwargs of an offloaded job from its full
+        stored payload.
+        """
+        if stored is None:
+            raise InvalidPayload
+
+        full = self.deserialize(stored)
+        self.args = full.args
+        self.kwargs = full.kwargs
+        self.offloaded = False
+
+    @property
+    def args(self):
+        if self._args is None and self.raw_args is not None:
+            self._args = date_aware_decoder.decode(self.raw_args)
+
+        return self._args
+
+    @args.setter
+    def args(self, args):
+        self._args = args
+        self.raw_args = None
+
+    @property
+    def kwargs(self):
+        if self._kwargs is None and self.raw_kwargs is not None:
+            self._kwargs = date_aware_decoder.decode(self.raw_kwargs)
+
+        return self._kwargs
+
+    @kwargs.setter
+    def kwargs(self, kwargs):
+        self._kwargs = kwargs
+        self.raw_kwargs = None
+
     @classmethod
     def import_func(cls, module, func):
         instance = cls()
-        try:
-            module = __import__(module, fromlist=func)
-            instance.call = getattr(module, func)
-        except (KeyError, ImportError, AttributeError):
-            raise NoSuchJob
+        instance.call, instance.metadata = registry.lookup(module, func)
 
         return instance
 
     def determine_unique_key(self):
-        uniques = [self.module, self.func, self.queue_name]
-        if self.args:
-            uniques.extend(self.args)
-        if self.kwargs:
-            uniques.extend([
-                name + "=" + str(value)
-                for name, value in self.kwargs.iteritems()
-            ])
-        if not self.call.job_metadata['unique']:
-            uniques += [time.time(), os.getpid(), random.random()]
-
-        uniqueness = hashlib.md5()
-        for unique in uniques:
-            uniqueness.update(str(unique))
-
-        self.unique_key = uniqueness.hexdigest()
+        """
+        Sets the key jobs are deduplicated by.  Unique jobs are keyed by
+        their function and the canonical JSON of their unique fields, every
+        other job gets a one-off key (which doesn't need the arguments
+        decoded).
+        """
+        identity = [self.module, self.func, self.queue_name]
+        if self.metadata['unique']:
+            identity.append(self.unique_fields())
+        else:
+            identity.extend([time.time(), os.getpid(), random.random()])
+
+        self.unique_key = hash_key(canonical_json(identity))
+
+    def unique_fields(self):
+        """
+        Returns the arguments that make a unique job unique: all of them,
+        or if the job's `unique` is a list of argument names just those,
+        whether they were passed by position or by keyword.
+        """
+        unique = self.metadata['unique']
+        if not isinstance(unique, (list, tuple)):
+            return [self.args or [], sorted((self.kwargs or {}).items())]
+
+        named = dict(zip(self.metadata.get("arg_names", []), self.args or []))
+        named.update(self.kwargs or {})
+
+        return [[name, named.get(name)] for name in sorted(unique)]
 
     def serialize(self):
+        header = json.dumps({
+            'when': self.when,
+            'unique_key': self.unique_key,
+            'queue': self.queue_name,
+            'module': self.module,
+            'func': self.func
+        }, cls=DateAwareJSONEncoder)
+
+        return '%s, "args": %s, "kwargs": %s}' % (
+            header[:-1],
+            self.encoded_body_field(self.raw_args, self._args),
+            self.encoded_body_field(self.raw_kwargs, self._kwargs)
+        )
+
+    def serialize_stub(self):
+        """
+        Serializes just the header of the job, marked as offloaded.
+        """
         return json.dumps({
             'when': self.when,
             'unique_key': self.unique_key,
+            'queue': self.queue_name,
             'module': self.module,
             'func': self.func,
-            'args': self.args,
-            'kwargs': self.kwargs
+            'offloaded': True
         }, cls=DateAwareJSONEncoder)
 
+    def to_dict(self):
+        """
+        Returns the job as a dict of plain JSON-compatible values, with any
+        datetimes and timedeltas in the args and kwargs given as the same
+        marker strings they'd have in the JSON form.
+        """
+        return {
+            'when': self.when,
+            'unique_key': self.unique_key,
+            'queue': self.queue_name,
+            'module': self.module,
+            'func': self.func,
+            'args': json.loads(
+                self.encoded_body_field(self.raw_args, self._args)
+            ),
+            'kwargs': json.loads(
+                self.encoded_body_field(self.raw_kwargs, self._kwargs)
+            ),
+        }
+
+    def encoded_body_field(self, raw, value):
+        if raw is not None:
+            return raw
+
+        return json.dumps(value, cls=DateAwareJSONEncoder)
+
     def run(self):
         return self.call(*self.args, **self.kwargs)
 
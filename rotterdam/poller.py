@@ -0,0 +1,141 @@
+import select
+
+
+class Poller(object):
+    """
+    Readiness notifications for many sockets at once.
+
+    Wraps epoll, or kqueue where there's no epoll (BSDs, OS X).  Either
+    way the poller has a file descriptor of its own that turns readable
+    whenever any of the registered sockets is ready, so it can sit in a
+    worker's `select()` alongside the worker's other sources.
+    """
+
+    def __init__(self):
+        if hasattr(select, "epoll"):
+            self.impl = EPoll()
+        elif hasattr(select, "kqueue"):
+            self.impl = KQueue()
+        else:
+            raise RuntimeError("Neither epoll nor kqueue is available.")
+
+    def fileno(self):
+        return self.impl.fileno()
+
+    def register(self, fd, readable=True, writable=False):
+        self.impl.register(fd, readable, writable)
+
+    def modify(self, fd, readable=True, writable=False):
+        self.impl.modify(fd, readable, writable)
+
+    def unregister(self, fd):
+        self.impl.unregister(fd)
+
+    def poll(self, timeout=0):
+        """
+        Returns a list of (fd, readable, writable) tuples for the sockets
+        that are ready.  Hang-ups and errors count as readable so that the
+        read that follows finds out what happened.
+        """
+        return self.impl.poll(timeout)
+
+    def close(self):
+        self.impl.close()
+
+
+class EPoll(object):
+
+    def __init__(self):
+        self.epoll = select.epoll()
+
+    def fileno(self):
+        return self.epoll.fileno()
+
+    def events_for(self, readable, writable):
+        events = 0
+        if readable:
+            events |= select.EPOLLIN
+        if writable:
+            events |= select.EPOLLOUT
+
+        return events
+
+    def register(self, fd, readable, writable):
+        self.epoll.register(fd, self.events_for(readable, writable))
+
+    def modify(self, fd, readable, writable):
+        self.epoll.modify(fd, self.events_for(readable, writable))
+
+    def unregister(self, fd):
+        self.epoll.unregister(fd)
+
+    def poll(self, timeout):
+        return [
+            (
+                fd,
+                bool(event & (select.EPOLLIN | select.EPOLLHUP |
+                              select.EPOLLERR)),
+                bool(event & select.EPOLLOUT)
+            )
+            for fd, event in self.epoll.poll(timeout)
+        ]
+
+    def close(self):
+        self.epoll.close()
+
+
+class KQueue(object):
+
+    def __init__(self):
+        self.kqueue = select.kqueue()
+        self.filters = {}
+
+    def fileno(self):
+        return self.kqueue.fileno()
+
+    def register(self, fd, readable, writable):
+        self.filters[fd] = set()
+        self.modify(fd, readable, writable)
+
+    def modify(self, fd, readable, writable):
+        wanted = set()
+        if readable:
+            wanted.add(select.KQ_FILTER_READ)
+        if writable:
+            wanted.add(select.KQ_FILTER_WRITE)
+
+        current = self.filters[fd]
+        changes = [
+            select.kevent(fd, kq_filter, select.KQ_EV_ADD)
+            for kq_filter in wanted - current
+        ] + [
+            select.kevent(fd, kq_filter, select.KQ_EV_DELETE)
+            for kq_filter in current - wanted
+        ]
+        if changes:
+            self.kqueue.control(changes, 0)
+
+        self.filters[fd] = wanted
+
+    def unregister(self, fd):
+        self.modify(fd, False, False)
+        del self.filters[fd]
+
+    def poll(self, timeout):
+        ready = {}
+        for event in self.kqueue.control(None, 1000, timeout):
+            readable, writable = ready.get(event.ident, (False, False))
+            if event.filter == select.KQ_FILTER_WRITE:
+                writable = True
+            if event.filter == select.KQ_FILTER_READ:
+                readable = True
+            if event.flags & (select.KQ_EV_EOF | select.KQ_EV_ERROR):
+                readable = True
+            ready[event.ident] = (readable, writable)
+
+        return [
+            (fd,) + flags for fd, flags in ready.iteritems()
+        ]
+
+    def close(self):
+        self.kqueue.close()
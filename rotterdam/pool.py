@@ -0,0 +1,166 @@
+import collections
+import contextlib
+import os
+import threading
+import time
+
+from .client import Rotterdam
+from .exceptions import ConnectionError, PoolTimeout
+
+
+class ClientPool(object):
+    """
+    Thread-safe pool of client connections to a single master.
+
+    At most `max_size` clients are ever open at once, threads wanting a
+    client when they're all checked out wait up to `timeout` seconds for
+    one to be checked back in.  Clients that sit idle for longer than
+    `idle_timeout` seconds are disconnected and dropped.
+    """
+
+    def __init__(
+            self, host, port=8765,
+            max_size=10, timeout=None, idle_timeout=60,
+            client_class=Rotterdam
+    ):
+        self.host = host
+        self.port = port
+
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.client_class = client_class
+
+        self.condition = threading.Condition()
+        self.idle = collections.deque()
+        self.size = 0
+
+        self.pid = os.getpid()
+
+    def checkout(self):
+        with self.condition:
+            self.reset_if_forked()
+            self.evict_idle()
+
+            deadline = None
+            if self.timeout is not None:
+                deadline = time.time() + self.timeout
+
+            while not self.idle and self.size >= self.max_size:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            "No free client after %ss" % self.timeout
+                        )
+                self.condition.wait(remaining)
+
+            if self.idle:
+                client, _ = self.idle.pop()
+                return client
+
+            self.size += 1
+
+        try:
+            return self.client_class(self.host, self.port)
+        except Exception:
+            self.discard(None)
+            raise
+
+    def checkin(self, client):
+        if client.pending:
+            client.disconnect()
+
+        with self.condition:
+            if os.getpid() != self.pid:
+                return
+            self.idle.append((client, time.time()))
+            self.condition.notify()
+
+    def discard(self, client):
+        if client is not None:
+            client.disconnect()
+
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        client = self.checkout()
+        try:
+            yield client
+        except ConnectionError:
+            self.discard(client)
+            raise
+        except Exception:
+            self.checkin(client)
+            raise
+        else:
+            self.checkin(client)
+
+    def evict_idle(self):
+        cutoff = time.time() - self.idle_timeout
+        while self.idle and self.idle[0][1] < cutoff:
+            client, _ = self.idle.popleft()
+            client.disconnect()
+            self.size -= 1
+
+    def reset_if_forked(self):
+        if os.getpid() == self.pid:
+            return
+
+        self.pid = os.getpid()
+        self.idle.clear()
+        self.size = 0
+
+    def close(self):
+        with self.condition:
+            while self.idle:
+                client, _ = self.idle.popleft()
+                client.disconnect()
+                self.size -= 1
+
+    def enqueue(self, func, *args, **kwargs):
+        with self.connection() as client:
+            client.enqueue(func, *args, **kwargs)
+
+    def enqueue_in(self, seconds, func, *args, **kwargs):
+        with self.connection() as client:
+            client.enqueue_in(seconds, func, *args, **kwargs)
+
+    def enqueue_at(self, time_offset, func, *args, **kwargs):
+        with self.connection() as client:
+            client.enqueue_at(time_offset, func, *args, **kwargs)
+
+    def enqueue_many(self, func, iterable_of_args):
+        with self.connection() as client:
+            return client.enqueue_many(func, iterable_of_args)
+
+
+default_pool = None
+
+
+def configure(host, port=8765, **pool_options):
+    """
+    Sets up the process-wide pool used by `get_default_pool()`, and in turn
+    the `delay()` methods of `@job`-decorated functions.
+    """
+    global default_pool
+
+    if default_pool is not None:
+        default_pool.close()
+
+    default_pool = ClientPool(host, port, **pool_options)
+
+    return default_pool
+
+
+def get_default_pool():
+    if default_pool is None:
+        raise RuntimeError(
+            "No default client pool, call rotterdam.configure() first."
+        )
+
+    return default_pool
@@ -0,0 +1,160 @@
+"""
+Wire formats spoken between clients and the master.
+
+Version 1 is newline-delimited JSON, one message per line with replies
+sent back in the same order.
+
+Version 2 is length-prefixed frames, each a fixed-size header followed by
+the message itself:
+
+    +-------+---------+-------+------------+--------+
+    | "RD"  | version | flags | request id | length |
+    | 2     | 1       | 1     | 4          | 4      |
+    +-------+---------+-------+------------+--------+
+
+Replies carry the request id of the message they're for, so they can be
+matched up no matter what order they arrive in.  A client asks for version
+2 by opening with a HELLO frame, a master that speaks it answers with one,
+whereas older masters answer with a version 1 error.  The HELLO frame ends
+in a newline so that older masters see a complete (if bogus) message.
+"""
+import struct
+
+from .exceptions import ProtocolError
+
+
+MAGIC = "RD"
+VERSION = 2
+
+HEADER = struct.Struct("!2sBBII")
+
+FLAG_HELLO = 0x01
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+COMPACT_THRESHOLD = 64 * 1024
+
+
+def pack_frame(message, request_id=0, flags=0):
+    return HEADER.pack(
+        MAGIC, VERSION, flags, request_id, len(message)
+    ) + message
+
+
+def hello_frame():
+    return pack_frame("\n", flags=FLAG_HELLO)
+
+
+class MessageBuffer(object):
+    """
+    Accumulates bytes read off of a socket and splits them into messages.
+
+    Whether the bytes are version 1 lines or version 2 frames is detected
+    from the start of the stream.  Data is kept in a single bytearray and
+    newline scans pick up where the last one left off, so a message that
+    arrives in many small chunks costs linear rather than quadratic time.
+    Messages are read from an offset into the data rather than cut off the
+    front of it, the bytes read are only dropped once everything's been
+    read or they make up most of the buffer, so draining a chunk of many
+    messages is linear too.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.version = None
+        self.offset = 0
+        self.scanned = 0
+
+    def feed(self, chunk):
+        self.data.extend(chunk)
+
+    def __len__(self):
+        return len(self.data) - self.offset
+
+    def consume(self, end):
+        self.offset = end
+
+        if self.offset == len(self.data):
+            del self.data[:]
+        elif (
+                self.offset >= COMPACT_THRESHOLD and
+                self.offset * 2 >= len(self.data)
+        ):
+            del self.data[:self.offset]
+        else:
+            return
+
+        self.scanned = max(self.scanned - self.offset, 0)
+        self.offset = 0
+
+    def detect_version(self):
+        if self.version is not None:
+            return self.version
+
+        if not self:
+            return None
+
+        start = self.offset
+        if self.data[start:start + 1] == MAGIC[:1]:
+            if len(self) < len(MAGIC):
+                return None
+            if self.data[start:start + len(MAGIC)] == MAGIC:
+                self.version = VERSION
+                return self.version
+
+        self.version = 1
+        return self.version
+
+    def messages(self):
+        """
+        Yields a (request id, flags, message) tuple for each complete
+        message in the buffer.  Version 1 messages have no request id and
+        no flags.
+        """
+        while True:
+            version = self.detect_version()
+            if version is None:
+                return
+
+            if version == 1:
+                message = self.next_line()
+            else:
+                message = self.next_frame()
+
+            if message is None:
+                return
+
+            yield message
+
+    def next_line(self):
+        index = self.data.find("\n", max(self.scanned, self.offset))
+        if index == -1:
+            self.scanned = len(self.data)
+            return None
+
+        line = str(self.data[self.offset:index])
+        self.consume(index + 1)
+
+        return None, 0, line
+
+    def next_frame(self):
+        if len(self) < HEADER.size:
+            return None
+
+        magic, version, flags, request_id, length = HEADER.unpack_from(
+            buffer(self.data), self.offset
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ProtocolError("Bad frame header")
+        if length > MAX_FRAME_SIZE:
+            raise ProtocolError("Frame too large: %d bytes" % length)
+
+        start = self.offset + HEADER.size
+        end = start + length
+        if len(self.data) < end:
+            return None
+
+        message = str(self.data[start:end])
+        self.consume(end)
+
+        return request_id, flags, message
@@ -1,9 +1,17 @@
-import itertools
+import math
 import os
 import time
 import types
 
 
+PROMOTE_LIMIT = 1000
+
+ACTIVE_INDEX = "rotterdam:active"
+WAKEUP_CHANNEL = "rotterdam:wakeups"
+
+DONE_TRIM_SLICE = 100
+
+
 def get_script_content(command):
     current_path = os.path.dirname(__file__)
 
@@ -19,18 +27,53 @@ def add_qadd(client):
 
     method = client.register_script(content)
 
+    def qadd_arguments(queue, jobs):
+        """
+        Jobs are (when, key, payload) tuples, or (when, key, payload, body)
+        ones for jobs whose body is stored apart from the payload.
+        """
+        args = [queue, time.time(), WAKEUP_CHANNEL]
+        for job in jobs:
+            when, job_key, job_payload = job[:3]
+            job_body = job[3] if len(job) > 3 else None
+            args.extend([when, job_key, job_payload, job_body or ""])
+
+        keys = [
+            "rotterdam:" + queue + ":scheduled",
+            "rotterdam:" + queue + ":ready",
+            "rotterdam:" + queue + ":jobs:pool",
+            "rotterdam:" + queue + ":jobs:bodies",
+            ACTIVE_INDEX
+        ]
+
+        return keys, args
+
+    def qadd_batch(self, jobs_by_queue):
+        """
+        Adds jobs to any number of queues in a single round trip.
+
+        Returns a dict of the per-job results for each queue, or of the
+        exception raised if adding to that queue failed.
+        """
+        pipeline = self.pipeline(transaction=False)
+
+        queues = list(jobs_by_queue)
+        for queue in queues:
+            keys, args = qadd_arguments(queue, jobs_by_queue[queue])
+            method(keys=keys, args=args, client=pipeline)
+
+        return dict(zip(queues, pipeline.execute(raise_on_error=False)))
+
+    def qadd_many(self, queue, jobs):
+        keys, args = qadd_arguments(queue, jobs)
+
+        return method(keys=keys, args=args, client=self)
+
     def qadd(self, queue, when, job_key, job_payload):
-        return method(
-            keys=[
-                "rotterdam:" + queue + ":scheduled",
-                "rotterdam:" + queue + ":ready",
-                "rotterdam:" + queue + ":working",
-                "rotterdam:" + queue + ":jobs:pool"
-            ],
-            args=[time.time(), when, job_key, job_payload],
-            client=self
-        )
+        return self.qadd_many(queue, [(when, job_key, job_payload)])[0]
 
+    client.qadd_batch = types.MethodType(qadd_batch, client)
+    client.qadd_many = types.MethodType(qadd_many, client)
     client.qadd = types.MethodType(qadd, client)
 
 
@@ -39,22 +82,84 @@ def add_qpop(client):
 
     method = client.register_script(content)
 
-    def qpop(self, queues, cutoff, maxitems):
+    def qpop(self, queues, cutoff, maxitems, quotas=None, fill_start=0):
+        """
+        Hands out up to `maxitems` jobs due by `cutoff` from the queues,
+        given as names or as prefixes ending in "*".
 
-        return method(
-            keys=list(itertools.chain.from_iterable(
-                [
-                    "rotterdam:" + queue + ":scheduled",
-                    "rotterdam:" + queue + ":working",
-                    "rotterdam:" + queue + ":jobs:pool"
-                ]
-                for queue in queues
-            )),
-            args=[time.time(), cutoff, maxitems],
-            client=self
+        Each entry of `queues` first gets up to its entry in `quotas` (an
+        even share if not given), then any room left is filled from the
+        entries in turn, starting with the one at index `fill_start`.  See
+        `QueueShares`.  Queues matching a prefix share that prefix's jobs
+        evenly, whichever was served longest ago first.
+
+        Only queues with jobs due are looked at, as found in the active
+        queue index, a sorted set of queue names by when they next have a
+        job due.  `qadd` puts queues in it and `qpop` updates them as it
+        goes, so a pop costs the same however many idle queues there are.
+
+        Jobs that aren't due yet wait in each queue's "scheduled" sorted
+        set.  Due ones are promoted (up to `PROMOTE_LIMIT` per queue each
+        time) onto the queue's "ready" list, and jobs are handed out from
+        the front of that.  Neither step touches the jobs scheduled for
+        later, so a queue holding a great many of them costs no more to
+        pop from than an empty one.
+        """
+        queues = list(queues)
+        if quotas is None:
+            quotas = [int(math.ceil(maxitems / float(len(queues))))] * len(
+                queues
+            )
+
+        args = [time.time(), cutoff, maxitems, PROMOTE_LIMIT, fill_start]
+        for queue, quota in zip(queues, quotas):
+            args.extend([queue, quota])
+
+        return method(keys=[ACTIVE_INDEX], args=args, client=self)
+
+    def reindex_queues(self, queues):
+        """
+        Adds any of the queues holding jobs to the active queue index,
+        for queues with jobs from before there was an index.  Prefixes
+        ending in "*" are looked up with SCAN.
+        """
+        names = set()
+        for queue in queues:
+            if not queue.endswith("*"):
+                names.add(queue)
+                continue
+            for kind in ("scheduled", "ready"):
+                pattern = "rotterdam:" + queue + ":" + kind
+                for key in self.scan_iter(match=pattern, count=1000):
+                    names.add(key[len("rotterdam:"):-len(":" + kind)])
+
+        for name in names:
+            if self.llen("rotterdam:" + name + ":ready"):
+                self.zadd(ACTIVE_INDEX, {name: 0})
+                continue
+            next_job = self.zrange(
+                "rotterdam:" + name + ":scheduled", 0, 0, withscores=True
+            )
+            if next_job and self.zscore(ACTIVE_INDEX, name) is None:
+                self.zadd(ACTIVE_INDEX, {name: next_job[0][1]})
+
+    def next_due(self, after):
+        """
+        Returns when the next job after `after` is due on any queue, None
+        if there's none scheduled.
+        """
+        upcoming = self.zrangebyscore(
+            ACTIVE_INDEX, "(%r" % after, "+inf",
+            start=0, num=1, withscores=True
         )
+        if not upcoming:
+            return None
+
+        return upcoming[0][1]
 
     client.qpop = types.MethodType(qpop, client)
+    client.next_due = types.MethodType(next_due, client)
+    client.reindex_queues = types.MethodType(reindex_queues, client)
 
 
 def add_qfinish(client):
@@ -62,14 +167,30 @@ def add_qfinish(client):
 
     method = client.register_script(content)
 
-    def qfinish(self, queue, *job_keys):
-        args = [time.time()]
+    def qfinish(self, queue, *job_keys, **retention):
+        """
+        Marks jobs as finished, counting them in the queue's stats hash.
+
+        Finished jobs are kept in the queue's "done" sorted set, trimmed
+        `DONE_TRIM_SLICE` jobs at a time down to the `max_age` (seconds)
+        and `max_count` retention limits given, 0 meaning no limit.  With
+        `keep_done` false only the counts are kept.
+        """
+        args = [
+            time.time(),
+            retention.get("max_age") or 0,
+            retention.get("max_count") or 0,
+            1 if retention.get("keep_done", True) else 0,
+            DONE_TRIM_SLICE
+        ]
         args.extend(job_keys)
         return method(
             keys=[
                 "rotterdam:" + queue + ":working",
                 "rotterdam:" + queue + ":done",
-                "rotterdam:" + queue + ":jobs:pool"
+                "rotterdam:" + queue + ":jobs:pool",
+                "rotterdam:" + queue + ":jobs:bodies",
+                "rotterdam:" + queue + ":stats"
             ],
             args=args,
             client=self
@@ -78,7 +199,62 @@ def add_qfinish(client):
     client.qfinish = types.MethodType(qfinish, client)
 
 
+def add_qbody(client):
+
+    def qbody(self, queue, job_key):
+        """
+        Returns the stored body of an offloaded job, None if it's gone.
+        """
+        return self.hget("rotterdam:" + queue + ":jobs:bodies", job_key)
+
+    client.qbody = types.MethodType(qbody, client)
+
+
+def add_queue_depths(client):
+
+    def queue_depths(self, queues):
+        """
+        Returns the number of unfinished jobs held for each of `queues`.
+        """
+        queues = list(queues)
+
+        pipeline = self.pipeline(transaction=False)
+        for queue in queues:
+            pipeline.hlen("rotterdam:" + queue + ":jobs:pool")
+
+        return dict(zip(queues, pipeline.execute()))
+
+    client.queue_depths = types.MethodType(queue_depths, client)
+
+
+def add_queue_stats(client):
+
+    def queue_stats(self, queues):
+        """
+        Returns a dict of each of `queues`' stats: the number of jobs
+        finished and when the last one was.
+        """
+        queues = list(queues)
+
+        pipeline = self.pipeline(transaction=False)
+        for queue in queues:
+            pipeline.hgetall("rotterdam:" + queue + ":stats")
+
+        return {
+            queue: {
+                "finished": int(stats.get("finished", 0)),
+                "last_finished": float(stats.get("last_finished", 0))
+            }
+            for queue, stats in zip(queues, pipeline.execute())
+        }
+
+    client.queue_stats = types.MethodType(queue_stats, client)
+
+
 def extend_redis(client):
     add_qadd(client)
     add_qpop(client)
     add_qfinish(client)
+    add_qbody(client)
+    add_queue_depths(client)
+    add_queue_stats(client)
@@ -0,0 +1,107 @@
+import collections
+import importlib
+import logging
+import time
+
+from .exceptions import NoSuchJob
+
+
+logger = logging.getLogger(__name__)
+
+MAX_MISSING = 10000
+
+
+class JobRegistry(object):
+    """
+    Cache of job functions, keyed by (module, func) name.
+
+    Looking up a job imports its module and finds the function the first
+    time around, every lookup after that is a dict hit.  Names that don't
+    resolve to a `@job`-decorated function are remembered as missing for
+    `missing_ttl` seconds so that a flood of jobs with a bad name doesn't
+    mean a flood of failed imports.  Expired names are forgotten as new
+    ones come in, and no more than `MAX_MISSING` are remembered at once.
+    """
+
+    def __init__(self, missing_ttl=30):
+        self.missing_ttl = missing_ttl
+
+        self.jobs = {}
+        self.missing = collections.OrderedDict()
+
+    def lookup(self, module, func):
+        """
+        Returns a (callable, job metadata) tuple for the named job, raising
+        `NoSuchJob` if there isn't one.
+        """
+        key = (module, func)
+
+        entry = self.jobs.get(key)
+        if entry is not None:
+            return entry
+
+        if self.missing.get(key, 0) > time.time():
+            raise NoSuchJob
+
+        try:
+            entry = self.resolve(module, func)
+        except NoSuchJob:
+            self.remember_missing(key)
+            raise
+
+        self.jobs[key] = entry
+        self.missing.pop(key, None)
+
+        return entry
+
+    def remember_missing(self, key):
+        """
+        Entries are kept in the order they expire in, so the expired ones
+        (and the oldest, past the limit) are all at the front.
+        """
+        now = time.time()
+
+        self.missing.pop(key, None)
+        self.missing[key] = now + self.missing_ttl
+
+        while self.missing:
+            oldest, expiry = next(self.missing.iteritems())
+            if expiry > now and len(self.missing) <= MAX_MISSING:
+                break
+            del self.missing[oldest]
+
+    def resolve(self, module, func):
+        try:
+            call = getattr(importlib.import_module(module), func)
+        except (ImportError, AttributeError, TypeError, ValueError):
+            raise NoSuchJob
+
+        metadata = getattr(call, "job_metadata", None)
+        if metadata is None:
+            raise NoSuchJob
+
+        return call, metadata
+
+    def preload(self, module_names):
+        """
+        Imports each of the named modules and registers every job function
+        found in them.
+        """
+        for module_name in module_names:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                logger.exception("Error importing job module %s", module_name)
+                continue
+
+            for name, value in vars(module).items():
+                metadata = getattr(value, "job_metadata", None)
+                if callable(value) and isinstance(metadata, dict):
+                    self.jobs[(module_name, name)] = (value, metadata)
+
+    def clear(self):
+        self.jobs.clear()
+        self.missing.clear()
+
+
+registry = JobRegistry()
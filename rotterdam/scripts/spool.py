@@ -0,0 +1,46 @@
+import logging
+import sys
+
+from rotterdam.client import Rotterdam
+from rotterdam.config import Config
+from rotterdam.spool import Spool
+
+
+def inspect(config, spool):
+    summary = spool.inspect()
+
+    print "%s: %d jobs, %d bytes" % (
+        config.spool_path, summary["payloads"], summary["bytes"]
+    )
+    for job_name, count in summary["jobs"].most_common():
+        print "  %8d  %s" % (count, job_name)
+
+
+def drain(config, spool):
+    client = Rotterdam(config.master_host, config.master_port)
+
+    sent = spool.drain(client, batch_size=config.batch_size)
+
+    client.disconnect()
+
+    print "%s: sent %d jobs to %s:%s" % (
+        config.spool_path, sent, config.master_host, config.master_port
+    )
+
+
+def run():
+    config = Config.create("spool")
+    args = config.load()
+
+    if config.debug:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.INFO)
+
+    spool = Spool(config.spool_path)
+
+    try:
+        {"inspect": inspect, "drain": drain}[args.command](config, spool)
+    except Exception as e:
+        logging.getLogger(__name__).error("%s", e)
+        sys.exit(1)
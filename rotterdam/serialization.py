@@ -1,13 +1,25 @@
 import datetime
 import json
+import re
 
 import dateutil.parser
+import dateutil.tz
 import pytz
 
 
 TIMESTAMP_PREFIX = "@T-"
 INTERVAL_PREFIX = "@I-"
 
+BODY_FIELDS = ("args", "kwargs")
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+ISO_TIMESTAMP = re.compile(
+    r"(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?"
+    r"(?:(Z)|([+-])(\d\d):(\d\d))?$"
+)
+
+plain_decoder = json.JSONDecoder()
+
 
 class DateAwareJSONEncoder(json.JSONEncoder):
 
@@ -21,19 +33,46 @@ class DateAwareJSONEncoder(json.JSONEncoder):
 
 
 class DateAwareJSONDecoder(json.JSONDecoder):
+    """
+    Decodes JSON, turning "@T-" and "@I-" marker strings back into the
+    datetimes and timedeltas `DateAwareJSONEncoder` made them from.
+
+    Text without any markers in it is decoded as plain JSON, otherwise
+    string values are converted as they're scanned rather than walking
+    the decoded result a second time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(DateAwareJSONDecoder, self).__init__(*args, **kwargs)
+
+        self.parse_string = self.parse_marked_string
+        self.scan_marked = json.scanner.py_make_scanner(self)
+
+    def decode(self, value, _w=None):
+        if TIMESTAMP_PREFIX not in value and INTERVAL_PREFIX not in value:
+            return super(DateAwareJSONDecoder, self).decode(value)
+
+        try:
+            result, index = self.scan_marked(value, skip_whitespace(value, 0))
+        except StopIteration:
+            raise ValueError("No JSON object could be decoded")
+
+        if skip_whitespace(value, index) != len(value):
+            raise ValueError("Extra data after JSON at %d" % index)
+
+        return result
+
+    def parse_marked_string(self, *args):
+        value, index = json.decoder.scanstring(*args)
 
-    def decode(self, value):
-        return self.convert(json.loads(value))
+        return convert_marker(value), index
 
     def convert(self, val):
-        if isinstance(val, basestring) and val.startswith(TIMESTAMP_PREFIX):
-            return dateutil.parser.parse(
-                val[len(TIMESTAMP_PREFIX):], tzinfos={"UTC": pytz.utc}
-            )
-        elif isinstance(val, basestring) and val.startswith(INTERVAL_PREFIX):
-            return datetime.timedelta(
-                seconds=float(val[len(INTERVAL_PREFIX):])
-            )
+        """
+        Converts the markers in an already decoded value.
+        """
+        if isinstance(val, basestring):
+            return convert_marker(val)
         elif isinstance(val, dict):
             val = {
                 key: self.convert(value)
@@ -43,3 +82,135 @@ class DateAwareJSONDecoder(json.JSONDecoder):
             val = map(self.convert, val)
 
         return val
+
+
+date_aware_decoder = DateAwareJSONDecoder()
+
+
+def convert_marker(value):
+    if value.startswith(TIMESTAMP_PREFIX):
+        return parse_timestamp(value[len(TIMESTAMP_PREFIX):])
+    if value.startswith(INTERVAL_PREFIX):
+        return datetime.timedelta(seconds=float(value[len(INTERVAL_PREFIX):]))
+
+    return value
+
+
+def parse_timestamp(value):
+    """
+    Parses the ISO-8601 timestamps `datetime.isoformat()` gives directly,
+    anything else goes through dateutil's parser.
+    """
+    match = ISO_TIMESTAMP.match(value)
+    if not match:
+        return dateutil.parser.parse(value, tzinfos={"UTC": pytz.utc})
+
+    (
+        year, month, day, hour, minute, second, fraction,
+        zulu, sign, offset_hours, offset_minutes
+    ) = match.groups()
+
+    tzinfo = None
+    if zulu:
+        tzinfo = dateutil.tz.tzutc()
+    elif sign:
+        offset = int(offset_hours) * 3600 + int(offset_minutes) * 60
+        if sign == "-":
+            offset = -offset
+        if offset:
+            tzinfo = dateutil.tz.tzoffset(None, offset)
+        else:
+            tzinfo = dateutil.tz.tzutc()
+
+    return datetime.datetime(
+        int(year), int(month), int(day),
+        int(hour), int(minute), int(second),
+        int((fraction or "0").ljust(6, "0")),
+        tzinfo
+    )
+
+
+def split_payload(message):
+    """
+    Splits a JSON-encoded job payload into a dict of its header fields and
+    a dict of the raw JSON text of its body fields (args and kwargs), which
+    are passed over without being converted or re-encoded.
+
+    A batch message's "batch" list is split item by item.  Anything other
+    than a JSON object (at the top or in a batch) comes back as None, and
+    malformed JSON raises a `ValueError`.
+    """
+    index = skip_whitespace(message, 0)
+    item, index = split_value(message, index, batch_allowed=True)
+
+    if skip_whitespace(message, index) != len(message):
+        raise ValueError("Extra data after payload")
+
+    return item
+
+
+def split_value(message, index, batch_allowed=False):
+    if message[index:index + 1] != "{":
+        _, index = plain_decoder.raw_decode(message, index)
+        return None, index
+
+    header = {}
+    body = {}
+
+    index = skip_whitespace(message, index + 1)
+    if message[index:index + 1] == "}":
+        return (header, body), index + 1
+
+    while True:
+        if message[index:index + 1] != '"':
+            raise ValueError("Expected a key at %d" % index)
+        key, index = json.decoder.scanstring(message, index + 1)
+
+        index = skip_whitespace(message, index)
+        if message[index:index + 1] != ":":
+            raise ValueError("Expected ':' at %d" % index)
+        index = skip_whitespace(message, index + 1)
+
+        start = index
+        if key in BODY_FIELDS:
+            _, index = plain_decoder.raw_decode(message, index)
+            body[key] = message[start:index]
+        elif key == "batch" and batch_allowed:
+            header[key], index = split_batch(message, index)
+        else:
+            header[key], index = plain_decoder.raw_decode(message, index)
+
+        index = skip_whitespace(message, index)
+        delimiter = message[index:index + 1]
+        if delimiter == "}":
+            return (header, body), index + 1
+        if delimiter != ",":
+            raise ValueError("Expected ',' or '}' at %d" % index)
+        index = skip_whitespace(message, index + 1)
+
+
+def split_batch(message, index):
+    if message[index:index + 1] != "[":
+        return plain_decoder.raw_decode(message, index)
+
+    items = []
+
+    index = skip_whitespace(message, index + 1)
+    if message[index:index + 1] == "]":
+        return items, index + 1
+
+    while True:
+        item, index = split_value(message, index)
+        items.append(item)
+
+        index = skip_whitespace(message, index)
+        delimiter = message[index:index + 1]
+        if delimiter == "]":
+            return items, index + 1
+        if delimiter != ",":
+            raise ValueError("Expected ',' or ']' at %d" % index)
+        index = skip_whitespace(message, index + 1)
+
+
+def skip_whitespace(message, index):
+    return WHITESPACE.match(message, index).end()
@@ -76,8 +76,23 @@ class Setting(object):
         return self.value
 
     def set(self, val):
+        if isinstance(val, basestring):
+            val = self.coerce(val)
+
         self.value = val
 
+    def coerce(self, val):
+        """
+        Converts a raw string value (e.g. from the config file) the same
+        way the command line parser would.
+        """
+        if self.action == "store_true":
+            return val.lower() in ("1", "yes", "true", "on")
+        if self.type:
+            return self.type(val)
+
+        return val
+
     def __str__(self):
         return str(self.value)
 
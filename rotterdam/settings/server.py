@@ -1,3 +1,5 @@
+import collections
+
 from .base import Setting
 from .common import ConfigFile, Debug  # noqa
 
@@ -8,16 +10,208 @@ def csv(_, value):
     return value.split(",")
 
 
+def weighted_csv(_, value):
+    """
+    Parses "name[:weight]" entries into an ordered dict of weights, the
+    weight defaulting to 1.
+    """
+    weights = collections.OrderedDict()
+    for entry in value.split(","):
+        name, _, weight = entry.strip().partition(":")
+        weights[name] = int(weight or 1)
+        if weights[name] < 1:
+            raise ValueError("Queue weights must be at least 1: %s" % entry)
+
+    return weights
+
+
+def octal(_, value):
+    return int(value, 8)
+
+
+def watermarks(_, value):
+    """
+    Parses "queue:high[:low]" entries into a dict of (high, low) tuples,
+    the low watermark defaulting to 80% of the high one.
+    """
+    limits = {}
+    for entry in value.split(","):
+        parts = entry.strip().split(":")
+        high = int(parts[1])
+        low = int(parts[2]) if len(parts) > 2 else int(high * 0.8)
+        limits[parts[0]] = (high, low)
+
+    return limits
+
+
+def mapping(_, value):
+    """
+    Parses "key:value" entries into a dict.
+    """
+    return dict(
+        entry.strip().split(":", 1) for entry in value.split(",")
+    )
+
+
 class Queues(Setting):
     """
-    Comma-delimited list of queues.
+    Comma-delimited list of queues, each optionally given as name:weight.
+
+    Every batch of jobs handed out is shared between the queues in
+    proportion to their weights (1 if not given), or with
+    `strict_priority` set, the queues are in priority order.  A name
+    ending in "*" takes in every queue starting with the rest of it.
     """
 
     name = "queues"
     cli = ["queues"]
+    type = weighted_csv
+
+
+class StrictPriority(Setting):
+    """
+    Hand out jobs from queues in the order listed, ignoring weights.
+
+    Later queues only get jobs when every queue before them has none ready.
+    """
+
+    name = "strict_priority"
+    cli = ["--strict-priority"]
+    action = "store_true"
+    default = False
+
+
+class PushDispatch(Setting):
+    """
+    Hand out jobs as soon as they're due instead of on the next heartbeat.
+
+    The arbiter listens for new jobs over redis pub/sub and times its
+    polls to the next scheduled job.
+    """
+
+    name = "push_dispatch"
+    cli = ["--push-dispatch"]
+    action = "store_true"
+    default = False
+
+
+class QueueWatermarks(Setting):
+    """
+    Comma-delimited queue:high[:low] limits on unfinished jobs per queue.
+
+    Jobs for a queue holding `high` or more unfinished jobs are turned away
+    with a "busy" reply until it drains down to `low` (80% of `high` if not
+    given).  A queue name of "*" sets the limits for every queue not named.
+    """
+
+    name = "queue_watermarks"
+    cli = ["--queue-watermarks"]
+    type = watermarks
+
+
+class WatermarkRefreshInterval(Setting):
+    """
+    Seconds between checks of how many jobs each queue holds.
+    """
+
+    name = "watermark_refresh_interval"
+    cli = ["--watermark-refresh-interval"]
+    type = float
+    default = 1.0
+
+
+class QueueCodecs(Setting):
+    """
+    Comma-delimited queue:codec list of how to store each queue's jobs.
+
+    Codecs are "json" (the default) or "msgpack", either one followed by
+    "+zlib" to compress payloads of `compress_threshold` bytes or more.  A
+    queue name of "*" sets the codec for every queue not named.  Jobs
+    declared with a codec of their own use that one instead.
+    """
+
+    name = "queue_codecs"
+    cli = ["--queue-codecs"]
+    type = mapping
+
+
+class CompressThreshold(Setting):
+    """
+    Size in bytes at which payloads of "+zlib" codecs are compressed.
+    """
+
+    name = "compress_threshold"
+    cli = ["--compress-threshold"]
+    type = int
+    default = 4096
+
+
+class OffloadThreshold(Setting):
+    """
+    Size in bytes at which stored payloads are kept apart from their queue's
+    job pool, 0 to never do so.
+    """
+
+    name = "offload_threshold"
+    cli = ["--offload-threshold"]
+    type = int
+    default = 1048576
+
+
+class JobModules(Setting):
+    """
+    Comma-delimited list of modules to load job functions from at startup.
+    """
+
+    name = "job_modules"
+    cli = ["--job-modules"]
     type = csv
 
 
+class MissingJobTTL(Setting):
+    """
+    Seconds to remember that a job name didn't resolve to a job function.
+    """
+
+    name = "missing_job_ttl"
+    cli = ["--missing-job-ttl"]
+    type = float
+    default = 30.0
+
+
+class DoneMaxAge(Setting):
+    """
+    Seconds to keep finished jobs in each queue's done set, 0 for no limit.
+    """
+
+    name = "done_max_age"
+    cli = ["--done-max-age"]
+    type = float
+    default = 86400.0
+
+
+class DoneMaxCount(Setting):
+    """
+    Most finished jobs to keep in each queue's done set, 0 for no limit.
+    """
+
+    name = "done_max_count"
+    cli = ["--done-max-count"]
+    type = int
+    default = 0
+
+
+class DoneCountersOnly(Setting):
+    """
+    Only count finished jobs, keeping no done set at all.
+    """
+
+    name = "done_counters_only"
+    cli = ["--done-counters-only"]
+    action = "store_true"
+    default = False
+
+
 class PIDFile(Setting):
     """
     Location of the PID file.
@@ -39,6 +233,84 @@ class ListenPort(Setting):
     default = 8765
 
 
+class ListenUnix(Setting):
+    """
+    Path of a Unix socket to also listen for incoming jobs on.
+    """
+
+    name = "listen_unix"
+    cli = ["--listen-unix"]
+
+
+class ListenUnixMode(Setting):
+    """
+    Permission bits (in octal) for the Unix socket.
+    """
+
+    name = "listen_unix_mode"
+    cli = ["--listen-unix-mode"]
+    type = octal
+    default = "0660"
+
+
+class ListenBacklog(Setting):
+    """
+    How many not-yet-accepted connections the listening socket can queue.
+    """
+
+    name = "listen_backlog"
+    cli = ["--listen-backlog"]
+    type = int
+    default = 128
+
+
+class ReusePort(Setting):
+    """
+    Give each injector its own listening socket via SO_REUSEPORT.
+
+    The kernel then spreads incoming connections evenly over the injectors
+    rather than having them all race to accept from the one shared socket.
+    """
+
+    name = "reuse_port"
+    cli = ["--reuse-port"]
+    action = "store_true"
+    default = False
+
+
+class ClientIdleTimeout(Setting):
+    """
+    Seconds a client connection can sit idle before it's closed.
+    """
+
+    name = "client_idle_timeout"
+    cli = ["--client-idle-timeout"]
+    type = int
+    default = 300
+
+
+class InjectorBatchSize(Setting):
+    """
+    Most jobs an injector stores in redis in one go.
+    """
+
+    name = "injector_batch_size"
+    cli = ["--injector-batch-size"]
+    type = int
+    default = 500
+
+
+class InjectorLinger(Setting):
+    """
+    Seconds an injector waits for more jobs before storing a partial batch.
+    """
+
+    name = "injector_linger"
+    cli = ["--injector-linger"]
+    type = float
+    default = 0.002
+
+
 class RedisHost(Setting):
     """
     Redis host to keep the queue state in.
@@ -54,6 +326,17 @@ class RedisHost(Setting):
     default = "localhost"
 
 
+class NumInjectors(Setting):
+    """
+    Number of injector processes to spawn.
+    """
+
+    name = "num_injectors"
+    cli = ["--num-injectors"]
+    type = int
+    default = 2
+
+
 class NumConsumers(Setting):
     """
     Number of consumer processes to spawn.
@@ -0,0 +1,53 @@
+from .base import Setting
+from .common import ConfigFile, Debug  # noqa
+
+
+class Command(Setting):
+    """
+    What to do with the spool file.
+    """
+
+    name = "command"
+    cli = ["command"]
+    choices = ["inspect", "drain"]
+
+
+class SpoolPath(Setting):
+    """
+    Location of the spool file.
+    """
+
+    name = "spool_path"
+    cli = ["spool_path"]
+
+
+class MasterHost(Setting):
+    """
+    Host of the master to drain the spool to.
+    """
+
+    name = "master_host"
+    cli = ["-H", "--master-host"]
+    default = "localhost"
+
+
+class MasterPort(Setting):
+    """
+    Port of the master to drain the spool to.
+    """
+
+    name = "master_port"
+    cli = ["-P", "--master-port"]
+    type = int
+    default = 8765
+
+
+class BatchSize(Setting):
+    """
+    Number of spooled jobs to send to the master at a time.
+    """
+
+    name = "batch_size"
+    cli = ["-b", "--batch-size"]
+    type = int
+    default = 500
@@ -0,0 +1,272 @@
+import collections
+import errno
+import fcntl
+import json
+import logging
+import os
+import threading
+
+from .client import build_payload
+from .serialization import DateAwareJSONEncoder, DateAwareJSONDecoder
+from .exceptions import SpoolBusy, QueueBusy
+
+
+logger = logging.getLogger(__name__)
+
+
+class Spool(object):
+    """
+    Append-only file of job payloads waiting to be sent to the master.
+
+    Each payload is written as a single line of JSON, appends are buffered
+    writes followed by a flush so spooling a job costs about as much as a
+    `write()` call (pass `fsync=True` to trade that for durability across
+    power loss).  Several processes on the same host can safely share a
+    spool file.
+
+    Draining renames the spool aside so new appends start a fresh file,
+    sends the payloads over in large batches and removes the drained file.
+    A drain that's cut short compacts the file down to just the payloads
+    that were never sent, so the next drain picks up where it left off.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+
+    @property
+    def draining_path(self):
+        return self.path + ".draining"
+
+    @property
+    def lock_path(self):
+        return self.path + ".lock"
+
+    def enqueue(self, func, *args, **kwargs):
+        self.append(build_payload(func, args, kwargs))
+
+    def append(self, payload):
+        self.append_many([payload])
+
+    def append_many(self, payloads):
+        data = "".join(
+            json.dumps(payload, cls=DateAwareJSONEncoder) + "\n"
+            for payload in payloads
+        )
+
+        with self.lock:
+            spool_file = self.open_locked()
+            try:
+                spool_file.write(data)
+                spool_file.flush()
+                if self.fsync:
+                    os.fsync(spool_file.fileno())
+            finally:
+                fcntl.flock(spool_file.fileno(), fcntl.LOCK_UN)
+
+    def open_locked(self):
+        """
+        Returns the spool file opened for appending and exclusively locked.
+
+        A drain may have renamed the file out from under an already open
+        handle, in which case the handle is swapped for a fresh file.
+        """
+        while True:
+            if self.file is None or self.pid != os.getpid():
+                self.file = open(self.path, "ab")
+                self.pid = os.getpid()
+
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+            if self.is_current():
+                return self.file
+
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+    def is_current(self):
+        try:
+            current = os.stat(self.path)
+        except OSError:
+            return False
+
+        return os.fstat(self.file.fileno()).st_ino == current.st_ino
+
+    def claim(self):
+        """
+        Moves the spool file aside for draining, unless a previous drain
+        left one behind in which case that one is drained first.
+        """
+        if os.path.exists(self.draining_path):
+            return True
+
+        try:
+            spool_file = open(self.path, "rb")
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return False
+            raise
+
+        with spool_file:
+            fcntl.flock(spool_file.fileno(), fcntl.LOCK_EX)
+            try:
+                os.rename(self.path, self.draining_path)
+            finally:
+                fcntl.flock(spool_file.fileno(), fcntl.LOCK_UN)
+
+        return True
+
+    def drain(self, client, batch_size=500):
+        """
+        Sends every spooled payload to the master via `client`.
+
+        Returns the number of payloads sent.  Payloads the master rejects
+        outright (e.g. for naming a job that doesn't exist) are logged and
+        dropped since retrying them would never succeed.  If the master
+        turns payloads away for their queue being busy they're kept in the
+        spool and `QueueBusy` is raised.
+        """
+        lock_file = open(self.lock_path, "a")
+        try:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno in [errno.EAGAIN, errno.EACCES]:
+                    raise SpoolBusy("%s is already being drained" % self.path)
+                raise
+
+            sent = 0
+            while self.claim():
+                sent += self.drain_claimed(client, batch_size)
+
+            return sent
+        finally:
+            lock_file.close()
+
+    def drain_claimed(self, client, batch_size):
+        sent = 0
+        offset = 0
+
+        with open(self.draining_path, "rb") as draining:
+            for batch, end in read_batches(draining, batch_size):
+                try:
+                    response = client.send({"batch": batch}).wait()
+                except Exception:
+                    self.compact(draining, offset)
+                    raise
+
+                busy = []
+                for payload, result in zip(batch, response["results"]):
+                    if result["status"] == "busy":
+                        busy.append((payload, result.get("retry_after")))
+                    elif result["status"] == "error":
+                        logger.warning(
+                            "Dropping spooled job %s:%s: %s",
+                            payload.get("module"), payload.get("func"),
+                            result.get("message")
+                        )
+
+                if busy:
+                    self.hold_back(draining, end, busy)
+
+                offset = end
+                sent += len(batch)
+
+        os.unlink(self.draining_path)
+
+        return sent
+
+    def hold_back(self, draining, end, busy):
+        """
+        Puts payloads turned away for a busy queue back in the spool and
+        stops the drain, leaving what's left of the drained file for next
+        time.
+        """
+        self.append_many([payload for payload, _ in busy])
+        self.compact(draining, end)
+
+        raise QueueBusy(max(retry_after for _, retry_after in busy))
+
+    def compact(self, draining, offset):
+        if offset == 0:
+            return
+
+        compacted_path = self.draining_path + ".tmp"
+
+        draining.seek(offset)
+        with open(compacted_path, "wb") as compacted:
+            while True:
+                chunk = draining.read(1024 * 1024)
+                if not chunk:
+                    break
+                compacted.write(chunk)
+            compacted.flush()
+            os.fsync(compacted.fileno())
+
+        os.rename(compacted_path, self.draining_path)
+
+    def inspect(self):
+        """
+        Returns a summary of what's sitting in the spool: the total number
+        of payloads and bytes along with a count per job function.
+        """
+        summary = {
+            "payloads": 0,
+            "bytes": 0,
+            "jobs": collections.Counter()
+        }
+
+        for path in (self.draining_path, self.path):
+            try:
+                spool_file = open(path, "rb")
+            except IOError as e:
+                if e.errno == errno.ENOENT:
+                    continue
+                raise
+
+            with spool_file:
+                summary["bytes"] += os.fstat(spool_file.fileno()).st_size
+                for batch, _ in read_batches(spool_file, 1000):
+                    summary["payloads"] += len(batch)
+                    summary["jobs"].update(
+                        "%s:%s" % (payload["module"], payload["func"])
+                        for payload in batch
+                    )
+
+        return summary
+
+
+def read_batches(spool_file, batch_size):
+    """
+    Yields lists of up to `batch_size` payloads read from `spool_file`
+    along with the offset just past the last one.
+
+    A trailing line with no newline is a write cut short and is skipped,
+    as are lines that aren't valid JSON.
+    """
+    batch = []
+    offset = spool_file.tell()
+
+    while True:
+        line = spool_file.readline()
+        if not line.endswith("\n"):
+            break
+
+        offset += len(line)
+
+        try:
+            batch.append(json.loads(line, cls=DateAwareJSONDecoder))
+        except ValueError:
+            logger.warning("Skipping corrupt spool entry: %r", line)
+
+        if len(batch) >= batch_size:
+            yield batch, offset
+            batch = []
+
+    if batch:
+        yield batch, offset
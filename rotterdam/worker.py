@@ -5,11 +5,13 @@ import select
 import sys
 
 from .proc import Proc
+from .registry import registry
 
 
 class Worker(Proc):
 
     signal_map = {
+        "hup": "clear_job_registry",
         "tstp": "toggle_active",
         "term": "wind_down_gracefully",
         "quit": "wind_down_immediately"
@@ -59,7 +61,7 @@ class Worker(Proc):
                         selectable_of(source)
                         for source in self.sources.values()
                     ], [], [],
-                    self.config.heartbeat_interval
+                    self.poll_timeout()
                 )
 
                 while self.active and len(sources_with_data) > 0:
@@ -94,6 +96,23 @@ class Worker(Proc):
                 self.logger.exception("Unhandled error during run loop")
                 sys.exit(-1)
 
+        self.teardown()
+
+    def poll_timeout(self):
+        """
+        How long to wait for input before heartbeating anyway.
+        """
+        return self.config.heartbeat_interval
+
+    def teardown(self):
+        """
+        Called once the run loop exits, for wrapping up any work in hand.
+        """
+        pass
+
+    def clear_job_registry(self, *_):
+        registry.clear()
+
     def toggle_active(self, *_):
         self.active = not self.active
 
@@ -41,6 +41,12 @@ setup(
         "server": [
             "setproctitle",
             "redis"
+        ],
+        "asyncio": [
+            "trollius"
+        ],
+        "msgpack": [
+            "msgpack-python"
         ]
     },
     tests_require=[
@@ -48,11 +54,14 @@ setup(
         "nose",
         "coverage",
         "flake8",
+        "trollius",
+        "msgpack-python",
     ],
     entry_points={
         "console_scripts": [
             "rotterdam = rotterdam.scripts.server:run [server]",
             "rotterdamctl = rotterdam.scripts.controller:run [server]",
+            "rotterdam-spool = rotterdam.scripts.spool:run",
         ]
     }
 )
@@ -0,0 +1,91 @@
+from unittest import TestCase
+from mock import patch, Mock
+from nose.tools import eq_
+
+from rotterdam.admission import Admission
+from rotterdam.settings.server import QueueWatermarks
+
+
+class AdmissionTests(TestCase):
+
+    def setUp(self):
+        self.redis = Mock()
+        self.admission = Admission(
+            self.redis, {"*": (100, 50), "emails": (10, 5)}
+        )
+
+    def test_queues_without_limits_are_always_admitted(self):
+        admission = Admission(self.redis, {})
+
+        assert admission.admits("foo")
+        admission.refresh_if_due()
+
+        assert not self.redis.queue_depths.called
+
+    def test_unknown_depths_are_looked_up_on_refresh(self):
+        assert self.admission.admits("emails")
+        self.redis.queue_depths.return_value = {"emails": 10}
+
+        self.admission.refresh_if_due()
+
+        self.redis.queue_depths.assert_called_once_with(["emails"])
+        assert not self.admission.admits("emails")
+
+    def test_busy_until_below_the_low_watermark(self):
+        self.admission.admits("foo")
+        self.admission.busy.add("foo")
+
+        self.redis.queue_depths.return_value = {"foo": 70}
+        self.admission.refresh()
+        assert not self.admission.admits("foo")
+
+        self.redis.queue_depths.return_value = {"foo": 50}
+        self.admission.refresh()
+        assert self.admission.admits("foo")
+
+    def test_added_jobs_are_counted_between_refreshes(self):
+        self.admission.admits("emails")
+        self.redis.queue_depths.return_value = {"emails": 4}
+        self.admission.refresh()
+
+        self.admission.record("emails", 5)
+        assert self.admission.admits("emails")
+
+        self.admission.record("emails", 1)
+        assert not self.admission.admits("emails")
+
+    @patch("rotterdam.admission.time")
+    def test_refreshes_at_most_once_per_interval(self, mock_time):
+        self.admission.admits("foo")
+        self.redis.queue_depths.return_value = {"foo": 1}
+
+        mock_time.time.return_value = 1000.0
+        self.admission.refresh_if_due()
+        mock_time.time.return_value = 1000.5
+        self.admission.refresh_if_due()
+
+        eq_(self.redis.queue_depths.call_count, 1)
+
+        mock_time.time.return_value = 1001.0
+        self.admission.refresh_if_due()
+
+        eq_(self.redis.queue_depths.call_count, 2)
+
+    def test_redis_errors_keep_the_last_known_state(self):
+        self.admission.admits("foo")
+        self.admission.busy.add("foo")
+        self.redis.queue_depths.side_effect = Exception("down")
+
+        self.admission.refresh()
+
+        assert not self.admission.admits("foo")
+
+
+class WatermarksSettingTests(TestCase):
+
+    def test_parses_high_and_low(self):
+        setting = QueueWatermarks()
+
+        setting.set("*:1000:500, emails:10")
+
+        eq_(setting.get(), {"*": (1000, 500), "emails": (10, 8)})
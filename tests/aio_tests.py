@@ -0,0 +1,136 @@
+from unittest import TestCase
+from mock import patch
+from nose.tools import eq_, assert_raises
+
+import json
+
+import trollius as asyncio
+from trollius import From
+
+from rotterdam import NoSuchJob, ConnectionError
+from rotterdam.aio import AsyncRotterdam, READ_LIMIT
+
+
+def test_func(*args):
+    pass
+
+
+class AsyncClientTests(TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.received = []
+
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(
+                self.handle_client, "127.0.0.1", 0, loop=self.loop,
+                limit=READ_LIMIT
+            )
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+        self.client = AsyncRotterdam(
+            "127.0.0.1", self.port, num_streams=2, loop=self.loop
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    @asyncio.coroutine
+    def handle_client(self, reader, writer):
+        while True:
+            line = yield From(reader.readline())
+            if not line:
+                break
+
+            payload = json.loads(line)
+            self.received.append(payload)
+
+            if "batch" in payload:
+                response = {
+                    "status": "ok",
+                    "results": [{"status": "ok"} for _ in payload["batch"]]
+                }
+            elif payload["func"] == "bogus":
+                response = {"status": "error", "message": "no such job"}
+            else:
+                response = {"status": "ok"}
+
+            writer.write(json.dumps(response) + "\n")
+
+        writer.close()
+
+    def test_concurrent_enqueues_share_the_streams(self):
+        self.loop.run_until_complete(asyncio.gather(
+            *[self.client.enqueue(test_func, i) for i in range(20)],
+            loop=self.loop
+        ))
+
+        eq_(
+            sorted(payload["args"][0] for payload in self.received),
+            range(20)
+        )
+        for stream in self.client.streams:
+            assert stream.connected
+            eq_(len(stream.pending), 0)
+
+    def test_payloads_match_the_sync_client(self):
+        self.loop.run_until_complete(
+            self.client.enqueue(test_func, "foo", bar="bazz")
+        )
+
+        eq_(
+            self.received,
+            [{
+                "func": "test_func",
+                "module": __name__,
+                "args": ["foo"],
+                "kwargs": {"bar": "bazz"}
+            }]
+        )
+
+    def test_enqueue_in_sets_when(self):
+        self.loop.run_until_complete(
+            self.client.enqueue_in(30, test_func)
+        )
+
+        assert "when" in self.received[0]
+
+    def test_enqueue_many_returns_per_item_results(self):
+        results = self.loop.run_until_complete(
+            self.client.enqueue_many(test_func, [1, 2, 3])
+        )
+
+        eq_(results, [{"status": "ok"}] * 3)
+        eq_(len(self.received), 1)
+
+    def test_error_responses_raise(self):
+        assert_raises(
+            NoSuchJob,
+            self.loop.run_until_complete,
+            self.client.enqueue("some.module:bogus")
+        )
+
+    def test_batch_replies_over_64kb(self):
+        results = self.loop.run_until_complete(asyncio.wait_for(
+            self.client.enqueue_many(test_func, range(5000)),
+            timeout=5, loop=self.loop
+        ))
+
+        eq_(len(results), 5000)
+
+    @patch("rotterdam.aio.READ_LIMIT", 1024)
+    def test_unreadable_replies_fail_the_pending_sends(self):
+        assert_raises(
+            ConnectionError,
+            self.loop.run_until_complete,
+            asyncio.wait_for(
+                self.client.enqueue_many(test_func, range(100)),
+                timeout=5, loop=self.loop
+            )
+        )
+        for stream in self.client.streams:
+            assert not stream.connected
@@ -0,0 +1,112 @@
+from unittest import TestCase
+from mock import Mock, patch
+from nose.tools import eq_
+
+from rotterdam.arbiter import Arbiter
+
+
+class ArbiterTests(TestCase):
+
+    def setUp(self):
+        self.arbiter = Arbiter(Mock())
+        self.arbiter.capacity = 0
+        self.arbiter.retention = {
+            "max_age": 60, "max_count": 0, "keep_done": True
+        }
+        self.arbiter.next_due = None
+        self.arbiter.wakeups = None
+        self.arbiter.shares = Mock(names=["foo"])
+        self.arbiter.shares.split.return_value = ([0], 0)
+        self.arbiter.config.heartbeat_interval = 1.0
+        self.arbiter.config.push_dispatch = False
+        self.redis = self.arbiter.redis
+        self.redis.qpop.return_value = []
+
+    def test_finished_jobs_are_finished_by_queue_and_key(self):
+        self.arbiter.handle_finished_job(
+            {"queue": "foo", "key": "abc", "time": 0.1}
+        )
+
+        self.redis.qfinish.assert_called_once_with(
+            "foo", "abc", max_age=60, max_count=0, keep_done=True
+        )
+        eq_(self.arbiter.capacity, 1)
+
+    def test_jobs_that_never_loaded_only_give_back_capacity(self):
+        self.arbiter.handle_finished_job(
+            {"queue": None, "key": None, "time": 0.1}
+        )
+
+        assert not self.redis.qfinish.called
+        eq_(self.arbiter.capacity, 1)
+
+    @patch("rotterdam.arbiter.time")
+    def test_cutoff_is_not_truncated_to_the_second(self, mock_time):
+        mock_time.time.return_value = 1000.75
+
+        self.arbiter.heartbeat()
+
+        eq_(self.redis.qpop.call_args[0][1], 1000.75)
+        assert not self.redis.next_due.called
+
+    @patch("rotterdam.arbiter.time")
+    def test_polls_every_heartbeat_without_push_dispatch(self, mock_time):
+        mock_time.time.return_value = 1000
+        self.arbiter.next_due = 1000.25
+
+        eq_(self.arbiter.poll_timeout(), 1.0)
+
+    @patch("rotterdam.arbiter.time")
+    def test_waits_until_the_next_job_is_due(self, mock_time):
+        mock_time.time.return_value = 1000
+        self.arbiter.wakeups = Mock()
+
+        eq_(self.arbiter.poll_timeout(), 1.0)
+
+        self.arbiter.next_due = 1000.25
+        eq_(self.arbiter.poll_timeout(), 0.25)
+
+        self.arbiter.next_due = 999.5
+        eq_(self.arbiter.poll_timeout(), 0)
+
+        self.arbiter.next_due = 1030
+        eq_(self.arbiter.poll_timeout(), 1.0)
+
+    @patch("rotterdam.arbiter.time")
+    def test_heartbeat_looks_up_the_next_due_job(self, mock_time):
+        mock_time.time.return_value = 1000.5
+        self.arbiter.wakeups = Mock()
+        self.redis.next_due.return_value = 1003.0
+
+        self.arbiter.heartbeat()
+
+        self.redis.next_due.assert_called_once_with(1000.5)
+        eq_(self.arbiter.next_due, 1003.0)
+
+    @patch("rotterdam.arbiter.Wakeups")
+    def test_broken_wakeups_are_resubscribed_on_heartbeat(self, Wakeups):
+        self.arbiter.config.push_dispatch = True
+        broken = Mock()
+        broken.drain.side_effect = Exception("connection lost")
+        self.arbiter.wakeups = broken
+        self.arbiter.sources["wakeups"] = broken
+
+        self.arbiter.handle_wakeups()
+
+        broken.close.assert_called_once_with()
+        eq_(self.arbiter.wakeups, None)
+
+        self.arbiter.heartbeat()
+
+        eq_(self.arbiter.wakeups, Wakeups.return_value)
+        eq_(self.arbiter.sources["wakeups"], Wakeups.return_value)
+
+    @patch("rotterdam.arbiter.Wakeups")
+    def test_falls_back_to_polling_if_subscribing_fails(self, Wakeups):
+        Wakeups.side_effect = Exception("no pubsub here")
+        self.arbiter.sources["wakeups"] = Mock()
+
+        self.arbiter.listen_for_wakeups()
+
+        eq_(self.arbiter.wakeups, None)
+        assert "wakeups" not in self.arbiter.sources
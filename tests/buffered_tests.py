@@ -0,0 +1,213 @@
+from unittest import TestCase
+from mock import Mock
+from nose.tools import eq_, assert_raises
+
+import json
+import os
+import threading
+import time
+
+from rotterdam import BufferedRotterdam
+from rotterdam.exceptions import BufferFull, ConnectionError, QueueBusy
+
+
+def test_func(*args):
+    pass
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+
+
+class MockClient(object):
+
+    def __init__(self, host, port):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.error = None
+        self.status = "ok"
+
+    def send(self, payload):
+        self.gate.wait()
+        if self.error:
+            raise self.error
+        self.batches.append(payload["batch"])
+
+        receipt = Mock()
+        receipt.wait.return_value = {
+            "results": [
+                {"status": self.status, "retry_after": 1.0}
+                for _ in payload["batch"]
+            ]
+        }
+        return receipt
+
+    def disconnect(self):
+        pass
+
+
+class BufferedClientTests(TestCase):
+
+    def test_unknown_overflow_policy(self):
+        assert_raises(
+            ValueError,
+            BufferedRotterdam, "localhost", overflow="explode"
+        )
+
+    def test_flush_sends_buffered_jobs_in_batches(self):
+        client = BufferedRotterdam(
+            "localhost", batch_size=3, flush_interval=60,
+            client_class=MockClient
+        )
+
+        for i in range(7):
+            client.enqueue(test_func, i)
+
+        client.flush()
+
+        batches = client.client.batches
+        eq_(
+            [payload["args"] for batch in batches for payload in batch],
+            [(i,) for i in range(7)]
+        )
+        assert all(len(batch) <= 3 for batch in batches)
+
+        client.close()
+
+    def test_interval_triggers_a_send(self):
+        client = BufferedRotterdam(
+            "localhost", batch_size=100, flush_interval=0.01,
+            client_class=MockClient
+        )
+
+        client.enqueue(test_func, "foo")
+        client.flusher.join(0.2)
+
+        eq_(len(client.client.batches), 1)
+
+        client.close()
+
+    def test_overflow_raise(self):
+        client = BufferedRotterdam(
+            "localhost", max_buffered=2, batch_size=1, flush_interval=60,
+            overflow="raise", client_class=MockClient
+        )
+        client.client.gate.clear()
+
+        client.enqueue(test_func, 1)
+        wait_for(lambda: client.in_flight == 1)
+        client.enqueue(test_func, 2)
+        client.enqueue(test_func, 3)
+
+        assert_raises(BufferFull, client.enqueue, test_func, 4)
+
+        client.client.gate.set()
+        client.close()
+
+    def test_overflow_drop_oldest(self):
+        client = BufferedRotterdam(
+            "localhost", max_buffered=2, batch_size=1, flush_interval=60,
+            overflow="drop_oldest", client_class=MockClient
+        )
+        client.client.gate.clear()
+
+        client.enqueue(test_func, "first")
+        wait_for(lambda: client.in_flight == 1)
+
+        for i in range(5):
+            client.enqueue(test_func, i)
+
+        eq_(client.dropped, 3)
+
+        client.client.gate.set()
+        client.close()
+
+        eq_(
+            [
+                payload["args"]
+                for batch in client.client.batches for payload in batch
+            ],
+            [("first",), (3,), (4,)]
+        )
+
+    def test_failed_batches_go_to_the_error_handler(self):
+        failures = []
+
+        client = BufferedRotterdam(
+            "localhost", flush_interval=60,
+            error_handler=lambda batch, e: failures.append((batch, e)),
+            client_class=MockClient
+        )
+        client.client.error = ConnectionError("boom")
+
+        client.enqueue(test_func, "foo")
+        client.close()
+
+        eq_(len(failures), 1)
+        eq_(failures[0][0][0]["args"], ("foo",))
+
+    def test_busy_jobs_go_to_the_error_handler(self):
+        failures = []
+
+        client = BufferedRotterdam(
+            "localhost", flush_interval=60,
+            error_handler=lambda batch, e: failures.append((batch, e)),
+            client_class=MockClient
+        )
+        client.client.status = "busy"
+
+        client.enqueue(test_func, "foo")
+        client.close()
+
+        eq_(len(failures), 1)
+        eq_(failures[0][0][0]["args"], ("foo",))
+        assert isinstance(failures[0][1], QueueBusy)
+        eq_(failures[0][1].retry_after, 1.0)
+
+    def test_enqueue_after_close_raises(self):
+        client = BufferedRotterdam("localhost", client_class=MockClient)
+
+        client.close()
+
+        assert_raises(Exception, client.enqueue, test_func)
+
+    def test_forked_children_start_afresh(self):
+        client = BufferedRotterdam(
+            "localhost", flush_interval=60, client_class=MockClient
+        )
+        client.enqueue(test_func, 1)
+        parent_client = client.client
+
+        reader, writer = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                client.enqueue(test_func, 2)
+                client.flush()
+                os.write(writer, json.dumps({
+                    "same_client": client.client is parent_client,
+                    "batches": [
+                        [payload["args"] for payload in batch]
+                        for batch in client.client.batches
+                    ]
+                }))
+            finally:
+                os._exit(0)
+
+        os.close(writer)
+        os.waitpid(pid, 0)
+        child = json.loads(os.read(reader, 4096))
+        os.close(reader)
+
+        eq_(child["same_client"], False)
+        eq_(child["batches"], [[[2]]])
+
+        client.close()
+        eq_(
+            [payload["args"] for batch in parent_client.batches
+             for payload in batch],
+            [(1,)]
+        )
@@ -1,28 +1,29 @@
 from unittest import TestCase
-from mock import patch
+from mock import patch, Mock
 from nose.tools import eq_, assert_raises
 
 import json
 import socket
 
-from rotterdam import Rotterdam, ConnectionError
+from rotterdam import Rotterdam, ConnectionError, NoSuchJob, QueueBusy
+from rotterdam.client import parse_endpoint
 
 
 class ClientTests(TestCase):
 
     def test_default_port(self):
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
 
         eq_(client.port, 8765)
 
     def test_socket_is_none_at_first(self):
-        client = Rotterdam("localhost", port=0)
+        client = Rotterdam("localhost", port=0, protocol=1)
 
         assert client.socket is None
 
     @patch("rotterdam.client.socket")
     def test_connect_connects_the_socket(self, socket):
-        client = Rotterdam("localhost", port=0)
+        client = Rotterdam("localhost", port=0, protocol=1)
 
         client.connect()
 
@@ -30,9 +31,21 @@ class ClientTests(TestCase):
 
         client.socket.connect.assert_called_once_with(("localhost", 0))
 
+    @patch("rotterdam.client.socket")
+    def test_connect_to_a_unix_socket(self, socket):
+        client = Rotterdam("unix:///tmp/rotterdam.sock", protocol=1)
+
+        client.connect()
+
+        socket.socket.assert_called_once_with(
+            socket.AF_UNIX, socket.SOCK_STREAM
+        )
+        client.socket.connect.assert_called_once_with("/tmp/rotterdam.sock")
+        eq_(client.endpoint, "unix:///tmp/rotterdam.sock")
+
     @patch("rotterdam.client.socket")
     def test_calling_connect_multiple_times_connects_once(self, socket):
-        client = Rotterdam("localhost", port=0)
+        client = Rotterdam("localhost", port=0, protocol=1)
 
         client.connect()
         client.connect()
@@ -42,7 +55,7 @@ class ClientTests(TestCase):
 
     @patch("rotterdam.client.socket")
     def test_disconnect_unsets_the_socket(self, socket):
-        client = Rotterdam("localhost", port=0)
+        client = Rotterdam("localhost", port=0, protocol=1)
 
         client.connect()
 
@@ -56,7 +69,7 @@ class ClientTests(TestCase):
 
     @patch.object(socket, "socket")
     def test_disconnect_gobbles_up_socket_errors(self, mock_socket):
-        client = Rotterdam("localhost", port=0)
+        client = Rotterdam("localhost", port=0, protocol=1)
 
         client.connect()
 
@@ -67,7 +80,7 @@ class ClientTests(TestCase):
     @patch.object(Rotterdam, "disconnect")
     @patch.object(Rotterdam, "connected")
     def test_deleting_client_calls_disconnect(self, connected, disconnect):
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
 
         client.connected.return_value = True
 
@@ -77,7 +90,7 @@ class ClientTests(TestCase):
 
     @patch.object(Rotterdam, "disconnect")
     def test_deleting_client_noop_if_not_connected(self, disconnect):
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
 
         del client
 
@@ -87,7 +100,7 @@ class ClientTests(TestCase):
     def test_enqueue_sends_a_simple_payload_over_the_socket(self, socket):
         socket.socket().recv.return_value = '{"status": "ok"}\n'
 
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
 
         def test_func(*args):
             pass
@@ -116,7 +129,7 @@ class ClientTests(TestCase):
     def test_enqueue_can_send_args_and_kwargs(self, socket):
         socket.socket().recv.return_value = '{"status": "ok"}\n'
 
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
 
         def test_func(*args):
             pass
@@ -144,7 +157,7 @@ class ClientTests(TestCase):
     def test_enqueue_calls_connect_before_sending(self, socket, connect):
         socket.socket().recv.return_value = '{"status": "ok"}\n'
 
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
 
         assert connect.called is False
 
@@ -166,31 +179,52 @@ class ClientTests(TestCase):
 
     @patch.object(Rotterdam, "disconnect")
     @patch("rotterdam.client.socket")
-    def test_enqueue_calls_disconnect_after_sending(self, socket, disconnect):
+    def test_enqueue_keeps_the_connection_open(self, socket, disconnect):
         socket.socket().recv.return_value = '{"status": "ok"}\n'
 
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
+
+        client.enqueue(lambda x: x)
+        client.enqueue(lambda x: x)
+
+        assert disconnect.called is False
+        eq_(socket.socket().connect.call_count, 1)
 
-        disconnect_called = False
+    @patch("rotterdam.client.socket")
+    def test_submitted_jobs_are_matched_to_replies_in_order(self, socket):
+        socket.socket().recv.side_effect = [
+            '{"status": "ok"}\n{"status": "error", ',
+            '"message": "no such job"}\n',
+        ]
 
-        def set_disconnect_called(*args):
-            global disconnect_called
-            disconnect_called = True
+        client = Rotterdam("localhost", protocol=1)
 
-        def error_if_disconnect_called(*args):
-            if disconnect_called:
-                raise Exception("client's disconnect() was called!!")
+        first = client.submit(lambda x: x)
+        second = client.submit(lambda x: x)
 
-        disconnect.side_effect = set_disconnect_called
-        socket.socket().sendall.side_effect = error_if_disconnect_called
+        eq_(socket.socket().sendall.call_count, 2)
+        assert first.done is False
+        assert second.done is False
 
-        client.enqueue(lambda x: x)
+        assert_raises(NoSuchJob, second.wait)
+
+        assert first.done is True
+        first.wait()
+
+    @patch("rotterdam.client.socket")
+    def test_closed_connection_fails_pending_jobs(self, socket):
+        socket.socket().recv.return_value = ''
+
+        client = Rotterdam("localhost", protocol=1)
+
+        receipt = client.submit(lambda x: x)
 
-        assert disconnect.called is True
+        assert_raises(ConnectionError, receipt.wait)
+        assert client.socket is None
 
     @patch("rotterdam.client.socket")
     def test_enqueue_raises_connection_error_on_ioerror(self, socket):
-        client = Rotterdam("localhost")
+        client = Rotterdam("localhost", protocol=1)
 
         socket.socket().sendall.side_effect = IOError(())
 
@@ -199,3 +233,155 @@ class ClientTests(TestCase):
             client.enqueue,
             lambda x: x
         )
+
+    @patch("rotterdam.client.socket")
+    def test_enqueue_many_sends_a_single_batch(self, socket):
+        socket.socket().recv.return_value = (
+            '{"status": "ok", "results": [' +
+            '{"status": "ok"}, {"status": "duplicate"}]}\n'
+        )
+
+        client = Rotterdam("localhost", protocol=1)
+
+        def test_func(*args):
+            pass
+
+        results = client.enqueue_many(test_func, [("foo", 1), "bar"])
+
+        sendall = socket.socket().sendall
+
+        eq_(sendall.call_count, 1)
+
+        eq_(
+            json.loads(sendall.call_args[0][0]),
+            {
+                "batch": [
+                    {
+                        "func": "test_func",
+                        "module": __name__,
+                        "args": ["foo", 1],
+                        "kwargs": {}
+                    },
+                    {
+                        "func": "test_func",
+                        "module": __name__,
+                        "args": ["bar"],
+                        "kwargs": {}
+                    },
+                ]
+            }
+        )
+        eq_(results, [{"status": "ok"}, {"status": "duplicate"}])
+
+
+def replies(*responses):
+    receipts = []
+    for response in responses:
+        receipt = Mock()
+        if isinstance(response, Exception):
+            receipt.wait.side_effect = response
+        else:
+            receipt.wait.return_value = response
+        receipts.append(receipt)
+
+    return receipts
+
+
+class BusyTests(TestCase):
+
+    def test_busy_reply_raises(self):
+        client = Rotterdam("localhost", protocol=1)
+        client.send = Mock(side_effect=replies(QueueBusy(1.5)))
+
+        with assert_raises(QueueBusy) as context:
+            client.enqueue("foo.bar:baz")
+
+        eq_(context.exception.retry_after, 1.5)
+
+    @patch("rotterdam.client.time")
+    def test_busy_jobs_are_retried_with_backoff(self, mock_time):
+        client = Rotterdam("localhost", protocol=1, busy_retries=3)
+        client.send = Mock(side_effect=replies(
+            QueueBusy(1.0), QueueBusy(1.0), {"status": "ok"}
+        ))
+
+        client.enqueue("foo.bar:baz")
+
+        eq_(client.send.call_count, 3)
+        delays = [call[0][0] for call in mock_time.sleep.call_args_list]
+        assert 1.0 <= delays[0] <= 1.5
+        assert 2.0 <= delays[1] <= 3.0
+
+    @patch("rotterdam.client.time")
+    def test_backoff_gives_up_after_the_retries(self, mock_time):
+        client = Rotterdam("localhost", protocol=1, busy_retries=1)
+        client.send = Mock(side_effect=replies(QueueBusy(1), QueueBusy(1)))
+
+        assert_raises(QueueBusy, client.enqueue, "foo.bar:baz")
+
+        eq_(client.send.call_count, 2)
+
+    @patch("rotterdam.client.time")
+    def test_only_busy_jobs_of_a_batch_are_retried(self, mock_time):
+        client = Rotterdam("localhost", protocol=1, busy_retries=1)
+        client.send = Mock(side_effect=replies(
+            {
+                "status": "ok",
+                "results": [
+                    {"status": "busy", "retry_after": 1},
+                    {"status": "ok"},
+                    {"status": "busy", "retry_after": 1},
+                ]
+            },
+            {
+                "status": "ok",
+                "results": [{"status": "ok"}, {"status": "duplicate"}]
+            }
+        ))
+
+        results = client.enqueue_many("foo.bar:baz", [1, 2, 3])
+
+        resent = client.send.call_args[0][0]["batch"]
+        eq_([payload["args"] for payload in resent], [(1,), (3,)])
+        eq_(
+            results,
+            [{"status": "ok"}, {"status": "ok"}, {"status": "duplicate"}]
+        )
+
+    @patch("rotterdam.client.time")
+    def test_only_unsent_jobs_are_spooled_if_a_retry_fails(self, mock_time):
+        spool = Mock()
+        client = Rotterdam(
+            "localhost", protocol=1, busy_retries=1, spool=spool
+        )
+        client.send = Mock(side_effect=replies(
+            {
+                "status": "ok",
+                "results": [
+                    {"status": "ok"},
+                    {"status": "busy", "retry_after": 1},
+                ]
+            },
+            ConnectionError("connection refused")
+        ))
+
+        results = client.enqueue_many("foo.bar:baz", [1, 2])
+
+        eq_(results, [{"status": "ok"}, {"status": "spooled"}])
+        [spooled] = spool.append_many.call_args[0]
+        eq_([payload["args"] for payload in spooled], [(2,)])
+
+
+class ParseEndpointTests(TestCase):
+
+    def test_host_and_port(self):
+        eq_(parse_endpoint("example.com:9000"), ("example.com", 9000))
+
+    def test_default_port(self):
+        eq_(parse_endpoint("example.com"), ("example.com", 8765))
+
+    def test_unix_socket(self):
+        eq_(
+            parse_endpoint("unix:///tmp/rotterdam.sock"),
+            ("unix:///tmp/rotterdam.sock", 8765)
+        )
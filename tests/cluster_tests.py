@@ -0,0 +1,108 @@
+from unittest import TestCase
+from mock import Mock, patch
+from nose.tools import eq_, assert_raises
+
+from rotterdam import MultiRotterdam, ConnectionError
+
+
+def test_func(*args):
+    pass
+
+
+class MultiClientTests(TestCase):
+
+    def setUp(self):
+        self.sent_to = []
+
+    def create_client(self, endpoints, failing=(), **kwargs):
+        client = MultiRotterdam(endpoints, **kwargs)
+
+        for master in client.clients:
+            master.send = Mock(
+                side_effect=self.sender(master, failing)
+            )
+
+        return client
+
+    def sender(self, master, failing):
+        def send(payload):
+            if master.host in failing:
+                raise ConnectionError("refused")
+            self.sent_to.append(master.host)
+            receipt = Mock()
+            receipt.wait.return_value = {"status": "ok"}
+            return receipt
+
+        return send
+
+    def test_endpoints_are_parsed(self):
+        client = MultiRotterdam(["alpha:1234", "bravo", ("charlie", 99)])
+
+        eq_(
+            [(master.host, master.port) for master in client.clients],
+            [("alpha", 1234), ("bravo", 8765), ("charlie", 99)]
+        )
+
+    def test_unknown_strategy(self):
+        assert_raises(
+            ValueError,
+            MultiRotterdam, ["alpha"], strategy="random"
+        )
+
+    def test_round_robin_spreads_jobs(self):
+        client = self.create_client(["alpha", "bravo", "charlie"])
+
+        for i in range(6):
+            client.enqueue(test_func, i)
+
+        eq_(self.sent_to, ["alpha", "bravo", "charlie"] * 2)
+
+    def test_least_outstanding_prefers_idle_masters(self):
+        client = self.create_client(
+            ["alpha", "bravo"], strategy="least_outstanding"
+        )
+        client.clients[0].pending[1] = Mock()
+
+        client.enqueue(test_func)
+        client.enqueue(test_func)
+
+        eq_(self.sent_to, ["bravo", "bravo"])
+
+    @patch("rotterdam.cluster.time")
+    def test_failing_masters_are_ejected(self, mock_time):
+        mock_time.time.return_value = 1000
+
+        client = self.create_client(
+            ["alpha", "bravo"], failing=["alpha"], eject_for=30
+        )
+
+        for i in range(4):
+            client.enqueue(test_func, i)
+
+        eq_(self.sent_to, ["bravo"] * 4)
+        eq_(client.clients[0].send.call_count, 1)
+
+        mock_time.time.return_value = 1031
+
+        client.enqueue(test_func)
+        client.enqueue(test_func)
+
+        eq_(client.clients[0].send.call_count, 2)
+
+    def test_all_masters_failing_raises(self):
+        client = self.create_client(
+            ["alpha", "bravo"], failing=["alpha", "bravo"]
+        )
+
+        assert_raises(ConnectionError, client.enqueue, test_func)
+
+    def test_all_masters_failing_spools(self):
+        spool = Mock()
+        client = self.create_client(
+            ["alpha", "bravo"], failing=["alpha", "bravo"], spool=spool
+        )
+
+        results = client.enqueue_many(test_func, [1, 2])
+
+        eq_(results, [{"status": "spooled"}] * 2)
+        eq_(len(spool.append_many.call_args[0][0]), 2)
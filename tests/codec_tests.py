@@ -0,0 +1,89 @@
+from unittest import TestCase
+from mock import patch
+from nose.tools import eq_, assert_raises
+
+from rotterdam import job
+
+import datetime
+import json
+import zlib
+
+from rotterdam.codec import Codec, decode
+from rotterdam.payload import Payload
+from rotterdam.serialization import split_payload
+
+
+@job("testqueue")
+def test_job_func(*args, **kwargs):
+    pass
+
+
+class CodecTests(TestCase):
+
+    def setUp(self):
+        self.job = Payload.load({
+            "module": __name__,
+            "func": "test_job_func",
+            "when": 1000,
+            "unique_key": "abc",
+            "args": [
+                "foo",
+                datetime.datetime(2015, 6, 1, 12, 30),
+            ],
+            "kwargs": {"every": datetime.timedelta(minutes=5)},
+        })
+
+    def assert_round_trip(self, stored):
+        loaded = Payload.deserialize(stored)
+
+        eq_(loaded.unique_key, "abc")
+        eq_(loaded.args, ["foo", datetime.datetime(2015, 6, 1, 12, 30)])
+        eq_(loaded.kwargs, {"every": datetime.timedelta(minutes=5)})
+
+    def test_json_is_stored_untagged(self):
+        stored = Codec("json").encode(self.job)
+
+        eq_(stored, self.job.serialize())
+        self.assert_round_trip(stored)
+
+    def test_msgpack_round_trip(self):
+        stored = Codec("msgpack").encode(self.job)
+
+        assert stored.startswith("m:")
+        self.assert_round_trip(stored)
+
+    def test_msgpack_keeps_raw_args_markers(self):
+        message = json.dumps({
+            "module": __name__, "func": "test_job_func", "unique_key": "abc",
+            "args": ["foo", "@T-2015-06-01T12:30:00"],
+            "kwargs": {"every": "@I-300.0"},
+        })
+        split_job = Payload.load_split(split_payload(message))
+
+        self.assert_round_trip(Codec("msgpack").encode(split_job))
+
+    def test_compression_only_above_the_threshold(self):
+        small = Codec("json+zlib", compress_threshold=10000).encode(self.job)
+        big = Codec("msgpack+zlib", compress_threshold=10).encode(self.job)
+
+        assert small.startswith("{")
+        assert big.startswith("z:")
+        assert zlib.decompress(big[2:]).startswith("m:")
+        self.assert_round_trip(small)
+        self.assert_round_trip(big)
+
+    def test_unknown_codecs(self):
+        assert_raises(ValueError, Codec, "pickle")
+        assert_raises(ValueError, Codec, "json+bz2")
+
+    @patch("rotterdam.codec.is_available")
+    def test_msgpack_needs_msgpack_installed(self, is_available):
+        is_available.return_value = False
+
+        assert_raises(ValueError, Codec, "msgpack")
+        assert_raises(ValueError, decode, "m:\x80")
+
+    def test_garbled_payloads(self):
+        assert_raises(ValueError, decode, "z:not compressed")
+        assert_raises(ValueError, decode, "m:\xc1")
+        assert_raises(ValueError, decode, "{not json")
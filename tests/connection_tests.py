@@ -0,0 +1,322 @@
+from unittest import TestCase
+from mock import patch, Mock
+from nose.tools import eq_, assert_raises
+
+import errno
+import json
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import time
+
+from rotterdam.connection import Connection, UnixConnection, Server
+from rotterdam.protocol import MessageBuffer, hello_frame, pack_frame
+
+
+class ConnectionTests(TestCase):
+
+    def test_listens_with_the_given_backlog(self):
+        conn = Connection(host="127.0.0.1", port=0, backlog=42)
+
+        with patch("rotterdam.connection.socket") as mock_socket:
+            conn.open(inherit=False)
+
+        mock_socket.socket.return_value.listen.assert_called_once_with(42)
+
+    def test_inherits_the_socket_fd_from_the_environment(self):
+        conn = Connection(host="127.0.0.1", port=0)
+
+        with patch("rotterdam.connection.socket") as mock_socket:
+            with patch.dict("os.environ", {"ROTTERDAM_SOCKET_FD": "7"}):
+                conn.open()
+
+        eq_(mock_socket.fromfd.call_args[0][0], 7)
+        assert not mock_socket.fromfd.return_value.bind.called
+
+    def test_shards_share_the_port(self):
+        conn = Connection(host="127.0.0.1", port=0, reuse_port=True)
+        conn.open(inherit=False)
+        conn.port = conn.socket.getsockname()[1]
+
+        shard = conn.shard()
+
+        eq_(shard.socket.getsockname(), conn.socket.getsockname())
+
+        shard.close()
+        conn.close()
+
+    def test_shards_require_reuse_port_on_the_original(self):
+        conn = Connection(host="127.0.0.1", port=0)
+        conn.open(inherit=False)
+        conn.port = conn.socket.getsockname()[1]
+
+        with assert_raises(socket.error):
+            conn.shard()
+
+        conn.close()
+
+
+class UnixConnectionTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rotterdam.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_listens_on_the_path_with_the_given_mode(self):
+        conn = UnixConnection(self.path, mode=0o600)
+        conn.open(inherit=False)
+
+        eq_(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(self.path)
+        client.close()
+
+        conn.close()
+
+    def test_close_removes_the_socket_file(self):
+        conn = UnixConnection(self.path)
+        conn.open(inherit=False)
+
+        conn.close()
+
+        assert not os.path.exists(self.path)
+
+    def test_close_keeps_the_file_for_a_relaunched_master(self):
+        conn = UnixConnection(self.path)
+        conn.open(inherit=False)
+
+        conn.close(unlink=False)
+
+        assert os.path.exists(self.path)
+
+    def test_stale_socket_files_are_replaced(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+
+        conn = UnixConnection(self.path)
+        conn.open(inherit=False)
+
+        conn.close()
+
+    def test_socket_files_in_use_are_left_alone(self):
+        first = UnixConnection(self.path)
+        first.open(inherit=False)
+
+        with assert_raises(RuntimeError):
+            UnixConnection(self.path).open(inherit=False)
+
+        first.close()
+
+    def test_inherits_from_its_own_environment_variable(self):
+        conn = UnixConnection(self.path)
+
+        env = {"ROTTERDAM_SOCKET_FD": "6", "ROTTERDAM_UNIX_SOCKET_FD": "7"}
+        with patch("rotterdam.connection.socket") as mock_socket:
+            with patch.dict("os.environ", env):
+                conn.open()
+
+                eq_(os.environ["ROTTERDAM_SOCKET_FD"], "6")
+
+        eq_(mock_socket.fromfd.call_args[0][0], 7)
+
+
+class ServerTests(TestCase):
+
+    def setUp(self):
+        self.listener = Connection(host="127.0.0.1", port=0)
+        self.listener.open()
+        self.server = Server([self.listener], idle_timeout=60)
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.server.close()
+        self.listener.close()
+
+    def connect(self):
+        sock = socket.create_connection(self.listener.socket.getsockname())
+        sock.settimeout(2)
+        self.sockets.append(sock)
+        return sock
+
+    def requests(self, expected, attempts=50):
+        requests = []
+        for _ in range(attempts):
+            requests.extend(self.server)
+            if len(requests) >= expected:
+                break
+            time.sleep(0.01)
+
+        return requests
+
+    def wait_for(self, condition, attempts=50):
+        for _ in range(attempts):
+            list(self.server)
+            if condition():
+                return
+            time.sleep(0.01)
+
+    def test_serves_many_clients_at_once(self):
+        first = self.connect()
+        second = self.connect()
+
+        first.sendall('{"module": "foo", "fu')
+        second.sendall('{"module": "bar"}\n')
+        requests = self.requests(1)
+
+        eq_(len(requests), 1)
+        eq_(len(self.server.clients), 2)
+
+        first.sendall('nc": "bar"}\n')
+        requests.extend(self.requests(1))
+
+        eq_(len(requests), 2)
+
+    def test_serves_every_listener(self):
+        other = Connection(host="127.0.0.1", port=0)
+        other.open(inherit=False)
+        server = Server([self.listener, other])
+
+        first = self.connect()
+        second = socket.create_connection(other.socket.getsockname())
+        self.sockets.append(second)
+        first.sendall("first\n")
+        second.sendall("second\n")
+
+        requests = []
+        for _ in range(50):
+            requests.extend(server)
+            if len(requests) == 2:
+                break
+            time.sleep(0.01)
+
+        eq_(len(requests), 2)
+        eq_(len(server.clients), 2)
+
+        server.close()
+        other.close()
+
+    def test_serves_unix_sockets_alongside_tcp(self):
+        directory = tempfile.mkdtemp()
+        unix_conn = UnixConnection(os.path.join(directory, "rotterdam.sock"))
+        unix_conn.open(inherit=False)
+        server = Server([self.listener, unix_conn])
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(unix_conn.path)
+        self.sockets.append(sock)
+        sock.sendall("first\n")
+
+        requests = []
+        for _ in range(50):
+            requests.extend(server)
+            if requests:
+                break
+            time.sleep(0.01)
+        requests[0].responder.send("reply")
+
+        eq_(sock.recv(100), "reply\n")
+        eq_(server.clients.values()[0].address, unix_conn.name)
+
+        server.close()
+        unix_conn.close()
+        shutil.rmtree(directory)
+
+    def test_replies_go_to_the_right_client(self):
+        first = self.connect()
+        second = self.connect()
+
+        first.sendall("first\n")
+        self.requests(1)[0].responder.send("reply one")
+        second.sendall("second\n")
+        self.requests(1)[0].responder.send("reply two")
+
+        eq_(first.recv(100), "reply one\n")
+        eq_(second.recv(100), "reply two\n")
+
+    def test_invalid_payload_gets_an_error(self):
+        sock = self.connect()
+
+        sock.sendall("not json\n")
+        request = self.requests(1)[0]
+
+        eq_(
+            request.responses,
+            [{"status": "error", "message": "invalid payload"}]
+        )
+
+    def test_hello_is_answered_with_a_hello(self):
+        sock = self.connect()
+
+        sock.sendall(hello_frame() + pack_frame("{}", request_id=3))
+        request = self.requests(1)[0]
+        request.responder.send("reply")
+
+        buff = MessageBuffer()
+        messages = []
+        while len(messages) < 2:
+            buff.feed(sock.recv(100))
+            messages.extend(buff.messages())
+
+        eq_(json.loads(messages[0][2]), {"version": 2})
+        eq_(messages[1][0], 3)
+        eq_(messages[1][2], "reply")
+
+    def test_hung_up_client_is_closed_once_replied_to(self):
+        sock = self.connect()
+
+        sock.sendall("first\n")
+        sock.shutdown(socket.SHUT_WR)
+        request = self.requests(1)[0]
+        self.wait_for(lambda: self.server.clients.values()[0].hung_up)
+
+        eq_(len(self.server.clients), 1)
+
+        request.responder.send("reply")
+
+        eq_(len(self.server.clients), 0)
+        eq_(sock.recv(100), "reply\n")
+
+    def test_bad_frame_drops_the_connection(self):
+        sock = self.connect()
+
+        sock.sendall("RD\x09" + "\x00" * 20)
+        self.wait_for(lambda: not self.server.clients)
+
+        eq_(self.server.clients, {})
+        eq_(sock.recv(100), "")
+
+    def test_idle_clients_are_expired(self):
+        idle = self.connect()
+        busy = self.connect()
+
+        busy.sendall("pending\n")
+        self.requests(1)
+        self.wait_for(lambda: len(self.server.clients) == 2)
+
+        with patch("rotterdam.connection.time") as mock_time:
+            mock_time.time.return_value = time.time() + 120
+            self.server.expire_idle()
+
+        eq_(len(self.server.clients), 1)
+        eq_(idle.recv(100), "")
+
+    def test_unread_replies_stop_reads(self):
+        sock = self.connect()
+
+        sock.sendall("first\n")
+        request = self.requests(1)[0]
+        client = self.server.clients.values()[0]
+        client.conn.send = Mock(side_effect=socket.error(errno.EAGAIN, ""))
+        client.outbox.extend("x" * (2 * 1024 * 1024))
+        request.responder.send("reply")
+
+        eq_(client.interest, (False, True))
@@ -0,0 +1,94 @@
+from unittest import TestCase
+from mock import Mock
+from nose.tools import eq_
+
+import redis
+
+from rotterdam import job
+from rotterdam.consumer import Consumer
+from rotterdam.payload import Payload
+
+
+calls = []
+
+
+@job("testqueue")
+def test_job_func(*args):
+    calls.append(args)
+
+
+class ConsumerTests(TestCase):
+
+    def setUp(self):
+        del calls[:]
+        self.consumer = Consumer(Mock())
+        self.results = self.consumer.outputs["results"]
+
+    def test_jobs_are_run_and_reported_by_queue_and_key(self):
+        payload = Payload.load({
+            "module": __name__, "func": "test_job_func",
+            "unique_key": "abc", "args": [1, 2],
+        }).serialize()
+
+        self.consumer.run_job(payload)
+
+        eq_(calls, [(1, 2)])
+        result = self.results.put.call_args[0][0]
+        eq_(sorted(result), ["key", "queue", "time"])
+        eq_((result["queue"], result["key"]), ("testqueue", "abc"))
+
+    def test_offloaded_jobs_fetch_their_body_first(self):
+        job = Payload.load({
+            "module": __name__, "func": "test_job_func",
+            "unique_key": "abc", "args": [3],
+        })
+        self.consumer.redis.qbody.return_value = job.serialize()
+
+        self.consumer.run_job(job.serialize_stub())
+
+        self.consumer.redis.qbody.assert_called_once_with("testqueue", "abc")
+        eq_(calls, [(3,)])
+
+    def test_offloaded_jobs_with_no_body_are_still_finished(self):
+        job = Payload.load({
+            "module": __name__, "func": "test_job_func", "unique_key": "abc",
+        })
+        self.consumer.redis.qbody.return_value = None
+
+        self.consumer.run_job(job.serialize_stub())
+
+        eq_(calls, [])
+        result = self.results.put.call_args[0][0]
+        eq_((result["queue"], result["key"]), ("testqueue", "abc"))
+
+    def test_offloaded_jobs_are_left_unfinished_if_redis_fails(self):
+        job = Payload.load({
+            "module": __name__, "func": "test_job_func", "unique_key": "abc",
+        })
+
+        for error in (redis.ConnectionError, redis.TimeoutError):
+            self.consumer.redis.qbody.side_effect = error("redis is down")
+
+            self.consumer.run_job(job.serialize_stub())
+
+            eq_(calls, [])
+            result = self.results.put.call_args[0][0]
+            eq_((result["queue"], result["key"]), (None, None))
+
+    def test_jobs_that_cant_be_imported_are_still_reported(self):
+        payload = Payload.load({
+            "module": __name__, "func": "test_job_func",
+            "unique_key": "abc", "args": [1],
+        }).serialize().replace(__name__, "no.such.module")
+
+        self.consumer.run_job(payload)
+
+        eq_(calls, [])
+        result = self.results.put.call_args[0][0]
+        eq_((result["queue"], result["key"]), ("testqueue", "abc"))
+
+    def test_jobs_stored_without_a_queue_are_reported_without_one(self):
+        self.consumer.run_job('{"module": "no.such", "func": "job"}')
+
+        result = self.results.put.call_args[0][0]
+        eq_((result["queue"], result["key"]), (None, None))
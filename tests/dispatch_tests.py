@@ -0,0 +1,80 @@
+from unittest import TestCase
+from mock import Mock
+from nose.tools import eq_
+
+import collections
+
+from rotterdam.dispatch import QueueShares, Wakeups
+
+
+class QueueSharesTests(TestCase):
+
+    def test_plain_lists_of_queues_are_weighted_equally(self):
+        shares = QueueShares(["foo", "bar"])
+
+        eq_(shares.names, ["foo", "bar"])
+        eq_(shares.split(4), ([2, 2], 0))
+
+    def test_batches_are_split_by_weight(self):
+        shares = QueueShares(
+            collections.OrderedDict([("big", 3), ("small", 1)])
+        )
+
+        eq_(shares.split(8)[0], [6, 2])
+
+    def test_fractions_are_carried_between_batches(self):
+        shares = QueueShares(["q%d" % i for i in range(10)])
+
+        totals = [0] * 10
+        for _ in range(10):
+            for index, quota in enumerate(shares.split(3)[0]):
+                totals[index] += quota
+
+        eq_(totals, [3] * 10)
+
+    def test_every_slot_of_a_batch_is_given_out(self):
+        shares = QueueShares(["q%d" % i for i in range(200)])
+
+        quotas, _ = shares.split(5)
+
+        eq_(sum(quotas), 5)
+        eq_(sorted(quotas)[-5:], [1] * 5)
+
+    def test_leftovers_start_from_a_different_queue_each_time(self):
+        shares = QueueShares(["a", "b", "c"])
+
+        eq_([shares.split(1)[1] for _ in range(4)], [0, 1, 2, 0])
+
+    def test_strict_priority(self):
+        shares = QueueShares(
+            collections.OrderedDict([("first", 1), ("second", 5)]),
+            strict=True
+        )
+
+        eq_(shares.split(4), ([4, 4], 0))
+
+
+class WakeupsTests(TestCase):
+
+    def test_subscribes_to_the_wakeup_channel(self):
+        redis = Mock()
+
+        Wakeups(redis)
+
+        redis.pubsub.return_value.subscribe.assert_called_once_with(
+            "rotterdam:wakeups"
+        )
+
+    def test_drain_reads_every_waiting_message(self):
+        redis = Mock()
+        pubsub = redis.pubsub.return_value
+        pubsub.get_message.side_effect = [
+            {"type": "subscribe", "data": 1},
+            {"type": "message", "data": "1000.5"},
+            None,
+            {"type": "message", "data": "1001.5"},
+        ]
+
+        Wakeups(redis).drain()
+
+        eq_(pubsub.get_message.call_count, 3)
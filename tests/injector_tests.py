@@ -0,0 +1,242 @@
+from unittest import TestCase
+from mock import patch, Mock
+from nose.tools import eq_
+
+import json
+
+from rotterdam.admission import Admission
+from rotterdam.connection import Request
+from rotterdam.injector import Injector
+
+
+def make_job(queue_name="default", unique_key="abc"):
+    job = Mock(
+        queue_name=queue_name, when=100, unique_key=unique_key, metadata={}
+    )
+    job.serialize.return_value = "payload-" + unique_key
+    job.serialize_stub.return_value = "stub-" + unique_key
+    return job
+
+
+def make_request(*jobs):
+    request = Request(Mock(), batch=len(jobs) > 1)
+    for job in jobs:
+        request.add(job)
+    return request
+
+
+class InjectorTests(TestCase):
+
+    def setUp(self):
+        master = Mock()
+        master.config.injector_batch_size = 3
+        master.config.injector_linger = 0.5
+        master.config.heartbeat_interval = 1.0
+        master.config.offload_threshold = 0
+
+        self.injector = Injector(master)
+        self.injector.server = Mock()
+        self.injector.batch = []
+        self.injector.batch_jobs = 0
+        self.injector.last_idle_check = 0
+        self.injector.queue_codecs = {}
+        self.injector.codecs = {}
+
+        self.redis = master.redis
+        self.injector.admission = Admission(
+            self.redis, {"busy": (10, 5)}, refresh_interval=2.0
+        )
+        self.redis.qadd_batch.side_effect = lambda jobs_by_queue: {
+            queue_name: [1] * len(jobs)
+            for queue_name, jobs in jobs_by_queue.iteritems()
+        }
+
+    def test_requests_are_held_until_the_batch_is_full(self):
+        first = make_request(make_job(unique_key="a"))
+        second = make_request(make_job(unique_key="b"))
+        third = make_request(make_job(unique_key="c"))
+
+        self.injector.server.__iter__ = Mock(return_value=iter([first]))
+        self.injector.handle_incoming_jobs()
+
+        assert not self.redis.qadd_batch.called
+        assert not first.responder.send.called
+
+        self.injector.server.__iter__ = Mock(
+            return_value=iter([second, third])
+        )
+        self.injector.handle_incoming_jobs()
+
+        self.redis.qadd_batch.assert_called_once_with({
+            "default": [
+                (100, "a", "payload-a", None),
+                (100, "b", "payload-b", None),
+                (100, "c", "payload-c", None),
+            ]
+        })
+        for request in (first, second, third):
+            request.responder.send.assert_called_once_with('{"status": "ok"}')
+
+    @patch("rotterdam.injector.time")
+    def test_partial_batches_are_flushed_after_lingering(self, mock_time):
+        mock_time.time.return_value = 1000.0
+        request = make_request(make_job())
+        self.injector.server.__iter__ = Mock(return_value=iter([request]))
+
+        self.injector.handle_incoming_jobs()
+
+        eq_(self.injector.poll_timeout(), 0.5)
+
+        mock_time.time.return_value = 1000.2
+        self.injector.heartbeat()
+
+        assert not self.redis.qadd_batch.called
+        eq_(round(self.injector.poll_timeout(), 3), 0.3)
+
+        mock_time.time.return_value = 1000.5
+        self.injector.heartbeat()
+
+        assert self.redis.qadd_batch.called
+        assert request.responder.send.called
+        eq_(self.injector.poll_timeout(), 1.0)
+
+    def test_jobs_for_several_queues_go_in_one_call(self):
+        request = make_request(
+            make_job("foo", "a"), make_job("bar", "b"), make_job("foo", "c")
+        )
+        self.redis.qadd_batch.side_effect = None
+        self.redis.qadd_batch.return_value = {"foo": [1, 0], "bar": [1]}
+
+        self.injector.add_to_batch(request)
+        self.injector.flush_batch()
+
+        eq_(self.redis.qadd_batch.call_count, 1)
+        eq_(
+            request.responses,
+            [{"status": "ok"}, {"status": "ok"}, {"status": "duplicate"}]
+        )
+
+    def test_failed_queues_only_fail_their_own_jobs(self):
+        request = make_request(make_job("foo", "a"), make_job("bar", "b"))
+        self.redis.qadd_batch.side_effect = None
+        self.redis.qadd_batch.return_value = {
+            "foo": [1], "bar": Exception("OOM")
+        }
+
+        self.injector.add_to_batch(request)
+        self.injector.flush_batch()
+
+        eq_(
+            request.responses,
+            [{"status": "ok"}, {"status": "error", "message": "OOM"}]
+        )
+
+    def test_redis_errors_fail_every_job(self):
+        first = make_request(make_job("foo", "a"))
+        second = make_request(make_job("bar", "b"))
+        self.redis.qadd_batch.side_effect = Exception("down")
+
+        self.injector.add_to_batch(first)
+        self.injector.add_to_batch(second)
+        self.injector.flush_batch()
+
+        first.responder.send.assert_called_once_with(
+            '{"status": "error", "message": "down"}'
+        )
+        second.responder.send.assert_called_once_with(
+            '{"status": "error", "message": "down"}'
+        )
+
+    def test_requests_with_nothing_to_store_are_still_replied_to(self):
+        request = Request(Mock())
+        request.add(None, {"status": "error", "message": "no such job"})
+
+        self.injector.add_to_batch(request)
+        self.injector.flush_batch()
+
+        assert not self.redis.qadd_batch.called
+        assert request.responder.send.called
+
+    def test_teardown_flushes_the_batch(self):
+        request = make_request(make_job())
+        self.injector.add_to_batch(request)
+
+        self.injector.teardown()
+
+        assert self.redis.qadd_batch.called
+        assert request.responder.send.called
+        self.injector.server.close.assert_called_once_with()
+
+    def test_jobs_for_busy_queues_are_turned_away(self):
+        request = make_request(make_job("busy", "a"), make_job("foo", "b"))
+        self.injector.admission.busy.add("busy")
+
+        self.injector.add_to_batch(request)
+        self.injector.flush_batch()
+
+        self.redis.qadd_batch.assert_called_once_with({
+            "foo": [(100, "b", "payload-b", None)]
+        })
+        eq_(
+            request.responses,
+            [
+                {
+                    "status": "busy", "message": "queue is busy",
+                    "retry_after": 2.0
+                },
+                {"status": "ok"}
+            ]
+        )
+
+    def test_busy_replies_carry_a_message_for_older_clients(self):
+        request = make_request(make_job("busy", "a"))
+        self.injector.admission.busy.add("busy")
+
+        self.injector.add_to_batch(request)
+        self.injector.flush_batch()
+
+        reply = json.loads(request.responder.send.call_args[0][0])
+        eq_(reply["status"], "busy")
+        eq_(reply["message"], "queue is busy")
+
+    def test_stored_jobs_count_towards_the_queue_depth(self):
+        self.injector.admission.depths["busy"] = 8
+        request = make_request(make_job("busy", "a"), make_job("busy", "b"))
+
+        self.injector.add_to_batch(request)
+        self.injector.flush_batch()
+
+        eq_(self.injector.admission.depths["busy"], 10)
+        assert not self.injector.admission.admits("busy")
+
+    def test_codecs_come_from_the_job_then_the_queue(self):
+        self.injector.queue_codecs = {"foo": "json+zlib", "*": "msgpack"}
+        job = make_job("foo")
+
+        eq_(self.injector.codec_for(job).spec, "json+zlib")
+        eq_(self.injector.codec_for(make_job("bar")).spec, "msgpack")
+
+        job.metadata["codec"] = "msgpack+zlib"
+
+        eq_(self.injector.codec_for(job).spec, "msgpack+zlib")
+
+    def test_unusable_codecs_fall_back_to_json(self):
+        self.injector.queue_codecs = {"foo": "pickle"}
+
+        eq_(self.injector.codec_for(make_job("foo")).spec, "json")
+
+    def test_big_payloads_are_offloaded(self):
+        self.injector.config.offload_threshold = 10
+        request = make_request(
+            make_job(unique_key="a"), make_job(unique_key="a-long-key")
+        )
+
+        self.injector.add_to_batch(request)
+        self.injector.flush_batch()
+
+        self.redis.qadd_batch.assert_called_once_with({
+            "default": [
+                (100, "a", "payload-a", None),
+                (100, "a-long-key", "stub-a-long-key", "payload-a-long-key"),
+            ]
+        })
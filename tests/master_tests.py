@@ -0,0 +1,87 @@
+from unittest import TestCase
+from mock import Mock
+from nose.tools import eq_
+
+from rotterdam.master import Master
+
+
+class ReloadConfigTests(TestCase):
+
+    def setUp(self):
+        self.master = Master(Mock())
+        self.master.logger = Mock()
+        self.master.load_config = Mock()
+        self.master.setup_connection = Mock()
+        self.master.setup_job_registry = Mock()
+        self.master.broadcast = Mock()
+        self.master.injectors = Mock()
+        self.master.arbiters = Mock()
+        self.master.consumers = Mock()
+
+        self.config = self.master.config
+        self.config.listen_port = 8765
+        self.config.reuse_port = False
+        self.config.listen_unix = None
+
+        self.conn = Mock(reuse_port=False)
+        self.master.conn = self.conn
+
+    def reload_with(self, **settings):
+        def load_config():
+            for name, value in settings.items():
+                setattr(self.config, name, value)
+        self.master.load_config.side_effect = load_config
+
+        self.master.reload_config()
+
+    def test_workers_are_signalled_and_resized(self):
+        self.config.num_injectors = 4
+        self.config.num_consumers = 6
+
+        self.reload_with()
+
+        self.master.setup_job_registry.assert_called_once_with()
+        self.master.injectors.set_size.assert_called_once_with(4)
+        self.master.consumers.set_size.assert_called_once_with(6)
+
+    def test_a_new_port_gets_a_new_socket(self):
+        self.reload_with(listen_port=9876)
+
+        self.conn.close.assert_called_once_with()
+        self.master.setup_connection.assert_called_once_with()
+
+    def test_reuse_port_changes_keep_the_socket(self):
+        self.reload_with(reuse_port=True)
+
+        assert not self.conn.close.called
+        assert not self.master.setup_connection.called
+        eq_(self.master.conn, self.conn)
+        assert self.master.logger.warning.called
+
+    def test_unix_socket_changes_keep_the_socket(self):
+        unix_conn = Mock(path="/var/run/rotterdam.sock")
+        self.master.unix_conn = unix_conn
+        self.config.listen_unix = "/var/run/rotterdam.sock"
+
+        self.reload_with(listen_unix="/tmp/elsewhere.sock")
+
+        assert not unix_conn.close.called
+        eq_(self.master.unix_conn, unix_conn)
+        assert self.master.logger.warning.called
+
+    def test_no_unix_socket_is_added_on_reload(self):
+        self.master.setup_unix_connection = Mock()
+
+        self.reload_with(listen_unix="/var/run/rotterdam.sock")
+
+        assert not self.master.setup_unix_connection.called
+        eq_(self.master.unix_conn, None)
+        assert self.master.logger.warning.called
+
+    def test_unchanged_unix_socket_is_no_warning(self):
+        self.master.unix_conn = Mock(path="/var/run/rotterdam.sock")
+        self.config.listen_unix = "/var/run/rotterdam.sock"
+
+        self.reload_with()
+
+        assert not self.master.logger.warning.called
@@ -1,5 +1,5 @@
 from unittest import TestCase
-from mock import Mock, patch, call
+from mock import Mock, patch
 from nose.tools import eq_, assert_raises
 
 from rotterdam import job, NoSuchJob, InvalidPayload
@@ -8,7 +8,8 @@ import datetime
 import json
 import time
 
-from rotterdam.payload import Payload
+from rotterdam.payload import Payload, canonical_json
+from rotterdam.serialization import split_payload
 
 
 @job("testqueue")
@@ -21,6 +22,11 @@ def test_unique_job_func(*args, **kwargs):
     pass
 
 
+@job("testqueue", unique=["user_id", "kind"])
+def send_user_report(user_id, kind, *args, **kwargs):
+    pass
+
+
 @job("testqueue", delay=datetime.timedelta(hours=2))
 def test_delayed_two_hours_job(*args):
     pass
@@ -137,6 +143,7 @@ class JobTests(TestCase):
                 "args": None,
                 "kwargs": None,
                 "unique_key": None,
+                "queue": None,
                 "when": None
             }
         )
@@ -152,6 +159,7 @@ class JobTests(TestCase):
         job.kwargs = {"derp": "hork"}
 
         job.unique_key = "adfe999"
+        job.queue_name = "testqueue"
 
         job.when = now
 
@@ -163,6 +171,7 @@ class JobTests(TestCase):
                 "args": ["foo", "bar"],
                 "kwargs": {"derp": "hork"},
                 "unique_key": "adfe999",
+                "queue": "testqueue",
                 "when": now
             }
         )
@@ -213,6 +222,7 @@ class JobTests(TestCase):
                 "args": ["foo", "bar"],
                 "kwargs": {"derp": "hork"},
                 "unique_key": "adfe999",
+                "queue": "testqueue",
                 "when": now
             }
         )
@@ -220,15 +230,13 @@ class JobTests(TestCase):
     @patch("rotterdam.payload.os")
     @patch("rotterdam.payload.time")
     @patch("rotterdam.payload.random")
-    @patch("rotterdam.payload.hashlib")
-    def test_non_unique_job_unique_key_includes_context(
-            self, hashlib, random, mock_time, os
+    @patch("rotterdam.payload.hash_key")
+    def test_non_unique_job_unique_key_is_context_only(
+            self, hash_key, random, mock_time, os
     ):
-        now = time.time()
-
         random.random.return_value = 1010
         os.getpid.return_value = 777
-        mock_time.time.return_value = now
+        mock_time.time.return_value = 1500.5
 
         message = json.dumps({
             "module": test_job_func.__module__,
@@ -239,40 +247,130 @@ class JobTests(TestCase):
 
         job = Payload.deserialize(message)
 
-        hashlib.md5().assert_has_calls([
-            call.update(test_job_func.__module__),
-            call.update(test_job_func.__name__),
-            call.update("testqueue"),
-            call.update('foo'),
-            call.update('bar'),
-            call.update("bar=1234"),
-            call.update(str(now)),
-            call.update('777'),
-            call.update('1010'),
-            call.hexdigest()
-        ])
-
-        eq_(job.unique_key, hashlib.md5().hexdigest.return_value)
-
-    @patch("rotterdam.payload.hashlib")
-    def test_unique_job_excludes_context_in_unique_key(self, hashlib):
+        hash_key.assert_called_once_with(
+            '["%s","test_job_func","testqueue",1500.5,777,1010]' % __name__
+        )
+        eq_(job.unique_key, hash_key.return_value)
+
+    @patch("rotterdam.payload.hash_key")
+    def test_unique_job_excludes_context_in_unique_key(self, hash_key):
         message = json.dumps({
             "module": test_unique_job_func.__module__,
             "func": test_unique_job_func.__name__,
             "args": ["foo", "bar"],
-            "kwargs": {"bar": 1234},
+            "kwargs": {"bar": 1234, "abc": None},
         })
 
         job = Payload.deserialize(message)
 
-        hashlib.md5().assert_has_calls([
-            call.update(test_unique_job_func.__module__),
-            call.update(test_unique_job_func.__name__),
-            call.update("testqueue"),
-            call.update('foo'),
-            call.update('bar'),
-            call.update("bar=1234"),
-            call.hexdigest()
-        ])
-
-        eq_(job.unique_key, hashlib.md5().hexdigest.return_value)
+        hash_key.assert_called_once_with(
+            '["%s","test_unique_job_func","testqueue",'
+            '[["foo","bar"],[["abc",null],["bar",1234]]]]' % __name__
+        )
+        eq_(job.unique_key, hash_key.return_value)
+
+    def test_unique_keys_are_stable_across_kwarg_order(self):
+        first = Payload.load({
+            "module": __name__, "func": "test_unique_job_func",
+            "args": [{"b": 2, "a": 1}], "kwargs": {"x": 1, "y": [1, 2]},
+        })
+        second = Payload.load({
+            "module": __name__, "func": "test_unique_job_func",
+            "args": [{"a": 1, "b": 2}], "kwargs": {"y": [1, 2], "x": 1},
+        })
+
+        eq_(first.unique_key, second.unique_key)
+        eq_(len(first.unique_key), 32)
+
+    def test_canonical_json_sorts_nested_dicts(self):
+        eq_(canonical_json([1, "a{"]), '[1,"a{"]')
+        eq_(
+            canonical_json([{"b": [{"d": 1, "c": 2}], "a": None}]),
+            '[{"":[["a",null],["b",[{"":[["c",2],["d",1]]}]]]}]'
+        )
+
+    def test_unique_fields_pick_out_the_named_arguments(self):
+        def key_for(args, kwargs):
+            return Payload.load({
+                "module": __name__, "func": "send_user_report",
+                "args": args, "kwargs": kwargs,
+            }).unique_key
+
+        by_position = key_for([5, "report"], {})
+
+        eq_(by_position, key_for([], {"user_id": 5, "kind": "report"}))
+        eq_(by_position, key_for([5, "report", "ignored"], {"note": "x"}))
+        assert by_position != key_for([6, "report"], {})
+
+    def test_offloaded_jobs_are_loaded_without_args(self):
+        job = Payload.load({
+            "module": __name__, "func": "test_job_func",
+            "unique_key": "abc", "when": 10, "args": ["foo"],
+        })
+
+        stub = Payload.deserialize(job.serialize_stub())
+
+        assert stub.offloaded
+        eq_((stub.unique_key, stub.when), ("abc", 10))
+        eq_(stub.args, None)
+
+        stub.load_body(job.serialize())
+
+        assert not stub.offloaded
+        eq_(stub.args, ["foo"])
+        assert_raises(InvalidPayload, stub.load_body, None)
+
+    def test_loading_a_non_object_raises_invalid_payload(self):
+        assert_raises(
+            InvalidPayload,
+            Payload.deserialize, json.dumps(["foo", "bar"])
+        )
+
+    def test_split_payloads_keep_the_raw_args(self):
+        message = (
+            '{"module": "%s", "func": "test_job_func", "when": 10, '
+            '"args": ["foo",   {"at": "@T-2015-06-01T12:00:00"}], '
+            '"kwargs": {"bar":  1}}' % __name__
+        )
+
+        job = Payload.load_split(split_payload(message))
+
+        eq_(job.raw_args, '["foo",   {"at": "@T-2015-06-01T12:00:00"}]')
+        assert job._args is None
+        assert '"args": ["foo",   {"at": ' in job.serialize()
+        eq_(json.loads(job.serialize())["kwargs"], {"bar": 1})
+
+        eq_(job.args[1]["at"], datetime.datetime(2015, 6, 1, 12))
+
+    def test_split_payloads_default_args(self):
+        message = json.dumps({"module": __name__, "func": "test_job_func"})
+
+        job = Payload.load_split(split_payload(message))
+
+        eq_(job.args, [])
+        eq_(job.kwargs, {})
+
+    def test_split_payloads_with_bad_args_are_invalid(self):
+        message = json.dumps({
+            "module": __name__, "func": "test_job_func", "args": "foo"
+        })
+
+        assert_raises(
+            InvalidPayload, Payload.load_split, split_payload(message)
+        )
+        assert_raises(InvalidPayload, Payload.load_split, None)
+
+    def test_split_unique_payloads_are_keyed_by_their_args(self):
+        def key_for(message):
+            return Payload.load_split(split_payload(message)).unique_key
+
+        eq_(
+            key_for(
+                '{"module": "%s", "func": "test_unique_job_func", '
+                '"args": ["foo", 1]}' % __name__
+            ),
+            key_for(
+                '{"func": "test_unique_job_func", "module": "%s", '
+                '"args": [ "foo",1 ]}' % __name__
+            )
+        )
@@ -0,0 +1,122 @@
+from unittest import TestCase
+from mock import Mock, patch
+from nose.tools import eq_, assert_raises
+
+import threading
+
+from rotterdam import ClientPool, ConnectionError, job
+from rotterdam.exceptions import PoolTimeout
+from rotterdam import pool
+
+
+@job("testqueue")
+def test_job_func(*args):
+    pass
+
+
+def mock_client_class(host, port):
+    client = Mock(host=host, port=port, pending=[])
+    return client
+
+
+class ClientPoolTests(TestCase):
+
+    def test_clients_are_reused(self):
+        client_pool = ClientPool("localhost", client_class=mock_client_class)
+
+        with client_pool.connection() as first:
+            pass
+        with client_pool.connection() as second:
+            pass
+
+        assert first is second
+        eq_(client_pool.size, 1)
+
+    def test_checkout_creates_up_to_max_size(self):
+        client_pool = ClientPool(
+            "localhost", max_size=2, timeout=0,
+            client_class=mock_client_class
+        )
+
+        first = client_pool.checkout()
+        second = client_pool.checkout()
+
+        assert first is not second
+        assert_raises(PoolTimeout, client_pool.checkout)
+
+    def test_checkout_waits_for_a_checkin(self):
+        client_pool = ClientPool(
+            "localhost", max_size=1, timeout=5,
+            client_class=mock_client_class
+        )
+
+        client = client_pool.checkout()
+
+        timer = threading.Timer(0.05, client_pool.checkin, [client])
+        timer.start()
+
+        assert client_pool.checkout() is client
+
+        timer.join()
+
+    def test_connection_errors_discard_the_client(self):
+        client_pool = ClientPool("localhost", client_class=mock_client_class)
+
+        with assert_raises(ConnectionError):
+            with client_pool.connection() as client:
+                raise ConnectionError
+
+        client.disconnect.assert_called_once_with()
+        eq_(client_pool.size, 0)
+        eq_(len(client_pool.idle), 0)
+
+    @patch("rotterdam.pool.time")
+    def test_idle_clients_are_evicted(self, mock_time):
+        client_pool = ClientPool(
+            "localhost", idle_timeout=60, client_class=mock_client_class
+        )
+
+        mock_time.time.return_value = 1000
+        with client_pool.connection() as stale:
+            pass
+
+        mock_time.time.return_value = 1061
+        with client_pool.connection() as fresh:
+            pass
+
+        assert stale is not fresh
+        stale.disconnect.assert_called_once_with()
+        eq_(client_pool.size, 1)
+
+    def test_enqueue_uses_a_pooled_client(self):
+        client_pool = ClientPool("localhost", client_class=mock_client_class)
+
+        client_pool.enqueue(test_job_func, "foo", bar=1)
+
+        client, _ = client_pool.idle[0]
+        client.enqueue.assert_called_once_with(test_job_func, "foo", bar=1)
+
+
+class DefaultPoolTests(TestCase):
+
+    def tearDown(self):
+        pool.default_pool = None
+
+    def test_delay_requires_a_configured_pool(self):
+        assert_raises(RuntimeError, test_job_func.delay, "foo")
+
+    def test_delay_enqueues_via_the_default_pool(self):
+        pool.configure("localhost", client_class=mock_client_class)
+
+        test_job_func.delay("foo")
+
+        client, _ = pool.default_pool.idle[0]
+        client.enqueue.assert_called_once_with(test_job_func, "foo")
+
+    def test_delay_in_enqueues_via_the_default_pool(self):
+        pool.configure("localhost", client_class=mock_client_class)
+
+        test_job_func.delay_in(30, "foo")
+
+        client, _ = pool.default_pool.idle[0]
+        client.enqueue_in.assert_called_once_with(30, test_job_func, "foo")
@@ -0,0 +1,165 @@
+from unittest import TestCase
+from mock import patch
+from nose.tools import eq_, assert_raises
+
+import json
+
+from rotterdam import Rotterdam, NoSuchJob
+from rotterdam.exceptions import ProtocolError
+from rotterdam.protocol import (
+    MessageBuffer, pack_frame, hello_frame, FLAG_HELLO, HEADER
+)
+
+
+class MessageBufferTests(TestCase):
+
+    def test_version_1_lines_across_chunks(self):
+        buff = MessageBuffer()
+
+        buff.feed('{"fo')
+        eq_(list(buff.messages()), [])
+        buff.feed('o": 1}\n{"bar": 2}\n{"ba')
+
+        eq_(
+            list(buff.messages()),
+            [(None, 0, '{"foo": 1}'), (None, 0, '{"bar": 2}')]
+        )
+        eq_(buff.version, 1)
+        eq_(len(buff), 4)
+
+    def test_version_2_frames_across_chunks(self):
+        buff = MessageBuffer()
+
+        data = pack_frame('{"foo": 1}', request_id=7) + pack_frame(
+            "second", request_id=8
+        )
+
+        messages = []
+        for i in range(len(data)):
+            buff.feed(data[i])
+            messages.extend(buff.messages())
+
+        eq_(messages, [(7, 0, '{"foo": 1}'), (8, 0, "second")])
+        eq_(buff.version, 2)
+
+    def test_many_lines_in_one_chunk(self):
+        buff = MessageBuffer()
+
+        lines = ['{"job": %d}' % i for i in range(20000)]
+        buff.feed("\n".join(lines) + "\n" + '{"jo')
+
+        eq_([line for _, _, line in buff.messages()], lines)
+        eq_(len(buff), 4)
+
+        buff.feed('b": "last"}\n')
+
+        eq_(list(buff.messages()), [(None, 0, '{"job": "last"}')])
+        eq_(len(buff), 0)
+
+    def test_many_frames_in_one_chunk(self):
+        buff = MessageBuffer()
+
+        messages = [(i, 0, "message %d" % i) for i in range(20000)]
+        data = "".join(
+            pack_frame(message, request_id=request_id)
+            for request_id, _, message in messages
+        )
+        buff.feed(data + data[:10])
+
+        eq_(list(buff.messages()), messages)
+
+        buff.feed(data[10:len(pack_frame("message 0"))])
+
+        eq_(list(buff.messages()), [(0, 0, "message 0")])
+        eq_(len(buff), 0)
+
+    def test_frames_may_contain_newlines(self):
+        buff = MessageBuffer()
+
+        buff.feed(pack_frame("foo\nbar", request_id=3))
+
+        eq_(list(buff.messages()), [(3, 0, "foo\nbar")])
+
+    def test_hello_frame(self):
+        buff = MessageBuffer()
+
+        buff.feed(hello_frame())
+
+        [(_, flags, _)] = list(buff.messages())
+
+        assert flags & FLAG_HELLO
+
+    def test_hello_frame_is_a_complete_version_1_line(self):
+        assert hello_frame().endswith("\n")
+        assert "\n" not in hello_frame()[:-1]
+
+    def test_bad_version_raises(self):
+        buff = MessageBuffer()
+
+        buff.feed(HEADER.pack("RD", 9, 0, 1, 0))
+
+        assert_raises(ProtocolError, list, buff.messages())
+
+    @patch("rotterdam.protocol.MAX_FRAME_SIZE", 10)
+    def test_oversized_frame_raises(self):
+        buff = MessageBuffer()
+
+        buff.feed(HEADER.pack("RD", 2, 0, 1, 11))
+
+        assert_raises(ProtocolError, list, buff.messages())
+
+
+class FramedClientTests(TestCase):
+
+    @patch("rotterdam.client.socket")
+    def test_client_falls_back_to_version_1(self, socket):
+        socket.socket().recv.side_effect = [
+            '{"status": "error", "message": "invalid payload"}\n',
+            '{"status": "ok"}\n',
+        ]
+
+        client = Rotterdam("localhost")
+        client.enqueue("some.module:func")
+
+        eq_(client.version, 1)
+
+        hello, payload = [
+            call[0][0] for call in socket.socket().sendall.call_args_list
+        ]
+        eq_(hello, hello_frame())
+        assert payload.endswith("\n")
+
+    @patch("rotterdam.client.socket")
+    def test_replies_are_matched_by_request_id(self, socket):
+        socket.socket().recv.side_effect = [
+            pack_frame('{"version": 2}', flags=FLAG_HELLO),
+            pack_frame('{"status": "ok"}', request_id=2) +
+            pack_frame(
+                '{"status": "error", "message": "no such job"}',
+                request_id=1
+            )
+        ]
+
+        client = Rotterdam("localhost")
+
+        first = client.submit("some.module:func")
+        second = client.submit("some.module:other_func")
+
+        eq_(client.version, 2)
+
+        second.wait()
+        assert not first.done
+        assert_raises(NoSuchJob, first.wait)
+
+        buff = MessageBuffer()
+        for call in socket.socket().sendall.call_args_list:
+            buff.feed(call[0][0])
+        messages = list(buff.messages())
+
+        eq_(
+            [
+                (request_id, json.loads(message)["func"])
+                for request_id, _, message in messages[1:]
+            ],
+            [(1, "func"), (2, "other_func")]
+        )
@@ -0,0 +1,193 @@
+from unittest import TestCase
+from mock import Mock, patch
+from nose.tools import eq_
+
+from rotterdam.redis_extensions import extend_redis
+
+
+class ScriptTestCase(TestCase):
+    """
+    Extends a mock redis client, with each script registered under its
+    name rather than its content.
+    """
+
+    def setUp(self):
+        patcher = patch(
+            "rotterdam.redis_extensions.get_script_content",
+            lambda command: command
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.scripts = {}
+        self.redis = Mock()
+        self.redis.register_script.side_effect = (
+            lambda content: self.scripts.setdefault(content, Mock())
+        )
+
+        extend_redis(self.redis)
+
+    def script_call(self, name):
+        _, kwargs = self.scripts[name].call_args
+
+        eq_(kwargs["client"], self.redis)
+
+        return kwargs["keys"], kwargs["args"]
+
+
+@patch("rotterdam.redis_extensions.time")
+class QAddTests(ScriptTestCase):
+
+    def test_keys_name_the_queues_sets_and_lists(self, mock_time):
+        self.redis.qadd_many("foo", [(1000, "abc", "{}")])
+
+        keys, _ = self.script_call("qadd")
+
+        eq_(keys, [
+            "rotterdam:foo:scheduled",
+            "rotterdam:foo:ready",
+            "rotterdam:foo:jobs:pool",
+            "rotterdam:foo:jobs:bodies",
+            "rotterdam:active",
+        ])
+
+    def test_each_job_takes_four_args(self, mock_time):
+        mock_time.time.return_value = 999.5
+
+        self.redis.qadd_many("foo", [
+            (1000, "abc", "{}"),
+            (1001.5, "def", "{stub}", "{body}"),
+        ])
+
+        _, args = self.script_call("qadd")
+
+        eq_(args[:3], ["foo", 999.5, "rotterdam:wakeups"])
+        eq_(args[3:], [
+            1000, "abc", "{}", "",
+            1001.5, "def", "{stub}", "{body}",
+        ])
+
+
+@patch("rotterdam.redis_extensions.time")
+class QPopTests(ScriptTestCase):
+
+    def test_args_lead_with_times_and_limits(self, mock_time):
+        mock_time.time.return_value = 1000.25
+
+        self.redis.qpop(["foo"], 1000.5, 10)
+
+        keys, args = self.script_call("qpop")
+
+        eq_(keys, ["rotterdam:active"])
+        eq_(args[:5], [1000.25, 1000.5, 10, 1000, 0])
+
+    def test_queues_get_an_even_share_by_default(self, mock_time):
+        self.redis.qpop(["foo", "bar", "baz"], 1000, 10)
+
+        _, args = self.script_call("qpop")
+
+        eq_(args[5:], ["foo", 4, "bar", 4, "baz", 4])
+
+    def test_quotas_and_fill_start_are_passed_along(self, mock_time):
+        self.redis.qpop(
+            ["foo", "bar*"], 1000, 10, quotas=[7, 3], fill_start=1
+        )
+
+        _, args = self.script_call("qpop")
+
+        eq_(args[4], 1)
+        eq_(args[5:], ["foo", 7, "bar*", 3])
+
+
+class ReindexQueuesTests(ScriptTestCase):
+
+    def setUp(self):
+        super(ReindexQueuesTests, self).setUp()
+
+        self.ready = {}
+        self.scheduled = {}
+        self.indexed = {}
+        self.redis.llen.side_effect = lambda key: self.ready.get(key, 0)
+        self.redis.zrange.side_effect = (
+            lambda key, start, end, withscores: self.scheduled.get(key, [])
+        )
+        self.redis.zscore.side_effect = (
+            lambda key, name: self.indexed.get(name)
+        )
+
+    def zadds(self):
+        return sorted(
+            call[0] for call in self.redis.zadd.call_args_list
+        )
+
+    def test_prefixes_are_scanned_for_and_names_taken_as_is(self):
+        self.redis.scan_iter.side_effect = lambda match, count: {
+            "rotterdam:tenant-*:scheduled": ["rotterdam:tenant-1:scheduled"],
+            "rotterdam:tenant-*:ready": [
+                "rotterdam:tenant-1:ready", "rotterdam:tenant-2:ready"
+            ],
+        }[match]
+        self.ready = {
+            "rotterdam:foo:ready": 1,
+            "rotterdam:tenant-1:ready": 2,
+            "rotterdam:tenant-2:ready": 3,
+        }
+
+        self.redis.reindex_queues(["foo", "tenant-*"])
+
+        eq_(
+            sorted(
+                call[1]["match"]
+                for call in self.redis.scan_iter.call_args_list
+            ),
+            ["rotterdam:tenant-*:ready", "rotterdam:tenant-*:scheduled"]
+        )
+        eq_(self.zadds(), [
+            ("rotterdam:active", {"foo": 0}),
+            ("rotterdam:active", {"tenant-1": 0}),
+            ("rotterdam:active", {"tenant-2": 0}),
+        ])
+
+    def test_queues_are_due_now_or_at_their_first_scheduled_job(self):
+        self.ready = {"rotterdam:foo:ready": 1}
+        self.scheduled = {
+            "rotterdam:foo:scheduled": [("abc", 900.0)],
+            "rotterdam:bar:scheduled": [("def", 1500.0)],
+        }
+
+        self.redis.reindex_queues(["foo", "bar"])
+
+        eq_(self.zadds(), [
+            ("rotterdam:active", {"bar": 1500.0}),
+            ("rotterdam:active", {"foo": 0}),
+        ])
+
+    def test_already_indexed_scheduled_queues_are_left_alone(self):
+        self.scheduled = {"rotterdam:bar:scheduled": [("def", 1500.0)]}
+        self.indexed = {"bar": 1200.0}
+
+        self.redis.reindex_queues(["bar"])
+
+        eq_(self.zadds(), [])
+
+    def test_empty_queues_are_left_out(self):
+        self.redis.reindex_queues(["foo", "bar"])
+
+        eq_(self.zadds(), [])
+
+
+class NextDueTests(ScriptTestCase):
+
+    def test_nothing_due(self):
+        self.redis.zrangebyscore.return_value = []
+
+        eq_(self.redis.next_due(1000.5), None)
+
+    def test_earliest_due_after_the_given_time(self):
+        self.redis.zrangebyscore.return_value = [("foo", 1002.25)]
+
+        eq_(self.redis.next_due(1000.5), 1002.25)
+        self.redis.zrangebyscore.assert_called_once_with(
+            "rotterdam:active", "(1000.5", "+inf",
+            start=0, num=1, withscores=True
+        )
@@ -0,0 +1,108 @@
+from unittest import TestCase
+from mock import patch
+from nose.tools import eq_, assert_raises
+
+from rotterdam import job, NoSuchJob
+from rotterdam.registry import JobRegistry
+
+
+@job("testqueue")
+def test_job_func(*args):
+    pass
+
+
+def not_a_job(*args):
+    pass
+
+
+class JobRegistryTests(TestCase):
+
+    def setUp(self):
+        self.registry = JobRegistry(missing_ttl=30)
+
+    def test_lookup_returns_the_function_and_metadata(self):
+        call, metadata = self.registry.lookup(__name__, "test_job_func")
+
+        eq_(call, test_job_func)
+        eq_(metadata["queue_name"], "testqueue")
+
+    @patch("rotterdam.registry.importlib")
+    def test_lookups_are_cached(self, importlib):
+        importlib.import_module.return_value.job = test_job_func
+
+        self.registry.lookup("some.module", "job")
+        self.registry.lookup("some.module", "job")
+
+        importlib.import_module.assert_called_once_with("some.module")
+
+    def test_unknown_modules_and_functions(self):
+        assert_raises(
+            NoSuchJob, self.registry.lookup, "no.such.module", "job"
+        )
+        assert_raises(
+            NoSuchJob, self.registry.lookup, __name__, "no_such_func"
+        )
+
+    def test_functions_that_are_not_jobs(self):
+        assert_raises(NoSuchJob, self.registry.lookup, __name__, "not_a_job")
+
+    @patch("rotterdam.registry.time")
+    @patch("rotterdam.registry.importlib")
+    def test_missing_jobs_are_remembered_for_a_while(self, importlib, time):
+        importlib.import_module.side_effect = ImportError
+        time.time.return_value = 1000
+
+        for _ in range(3):
+            assert_raises(NoSuchJob, self.registry.lookup, "bad.module", "x")
+
+        eq_(importlib.import_module.call_count, 1)
+
+        time.time.return_value = 1031
+
+        assert_raises(NoSuchJob, self.registry.lookup, "bad.module", "x")
+
+        eq_(importlib.import_module.call_count, 2)
+
+    @patch("rotterdam.registry.time")
+    @patch("rotterdam.registry.importlib")
+    def test_expired_missing_jobs_are_forgotten(self, importlib, time):
+        importlib.import_module.side_effect = ImportError
+        time.time.return_value = 1000
+
+        for name in ("a", "b", "c"):
+            assert_raises(NoSuchJob, self.registry.lookup, "bad.module", name)
+
+        time.time.return_value = 1031
+
+        assert_raises(NoSuchJob, self.registry.lookup, "bad.module", "d")
+
+        eq_(self.registry.missing.keys(), [("bad.module", "d")])
+
+    @patch("rotterdam.registry.MAX_MISSING", 2)
+    @patch("rotterdam.registry.importlib")
+    def test_missing_jobs_are_capped(self, importlib):
+        importlib.import_module.side_effect = ImportError
+
+        for name in ("a", "b", "c"):
+            assert_raises(NoSuchJob, self.registry.lookup, "bad.module", name)
+
+        eq_(
+            self.registry.missing.keys(),
+            [("bad.module", "b"), ("bad.module", "c")]
+        )
+
+    def test_preload_registers_every_job_in_the_modules(self):
+        self.registry.preload([__name__, "no.such.module"])
+
+        eq_(
+            self.registry.jobs.keys(), [(__name__, "test_job_func")]
+        )
+
+    def test_clear_forgets_everything(self):
+        self.registry.lookup(__name__, "test_job_func")
+        assert_raises(NoSuchJob, self.registry.lookup, __name__, "not_a_job")
+
+        self.registry.clear()
+
+        eq_(self.registry.jobs, {})
+        eq_(self.registry.missing, {})
@@ -0,0 +1,112 @@
+from unittest import TestCase
+from nose.tools import eq_, assert_raises
+
+import datetime
+import json
+
+import dateutil.tz
+import pytz
+
+from rotterdam.serialization import (
+    DateAwareJSONDecoder, DateAwareJSONEncoder, split_payload
+)
+
+
+def decode(text):
+    return json.loads(text, cls=DateAwareJSONDecoder)
+
+
+class DateAwareJSONTests(TestCase):
+
+    def test_round_trip(self):
+        value = {
+            "at": datetime.datetime(2015, 6, 1, 12, 30, 5, 120000),
+            "utc": datetime.datetime(2015, 6, 1, 12, tzinfo=pytz.utc),
+            "every": [datetime.timedelta(minutes=5)],
+            "keys": {"@T-not-converted": "@I-1.5"},
+        }
+
+        eq_(
+            decode(json.dumps(value, cls=DateAwareJSONEncoder)),
+            dict(value, keys={"@T-not-converted": datetime.timedelta(0, 1.5)})
+        )
+
+    def test_timestamps_with_offsets(self):
+        eq_(
+            decode('"@T-2015-06-01T12:00:00-05:30"').utcoffset(),
+            datetime.timedelta(hours=-5, minutes=-30)
+        )
+        eq_(
+            decode('["@T-2015-06-01T12:00:00Z"]')[0].tzinfo,
+            dateutil.tz.tzutc()
+        )
+
+    def test_other_timestamp_formats_still_parse(self):
+        eq_(decode('"@T-June 1 2015"'), datetime.datetime(2015, 6, 1))
+
+    def test_text_without_markers_is_plain_json(self):
+        eq_(decode('{"a": ["b", 1.5, null]}'), {"a": ["b", 1.5, None]})
+
+    def test_malformed_json_with_markers(self):
+        assert_raises(ValueError, decode, '["@T-2015-06-01T12:00:00"')
+        assert_raises(ValueError, decode, '"@I-1.0" junk')
+
+
+class SplitPayloadTests(TestCase):
+
+    def test_body_fields_are_left_as_raw_json(self):
+        message = (
+            '{"module": "foo", "args": [1, {"a": "@T-2015-01-01"}], '
+            '"func": "bar", "kwargs": {"x": [1, 2]}, "when": 12.5}'
+        )
+
+        header, body = split_payload(message)
+
+        eq_(header, {"module": "foo", "func": "bar", "when": 12.5})
+        eq_(body["args"], '[1, {"a": "@T-2015-01-01"}]')
+        eq_(body["kwargs"], '{"x": [1, 2]}')
+
+    def test_batches_are_split_item_by_item(self):
+        message = json.dumps({
+            "batch": [
+                {"module": "foo", "func": "bar", "args": [1]},
+                "junk",
+                {"module": "foo", "func": "baz"},
+            ]
+        })
+
+        header, body = split_payload(message)
+
+        eq_(
+            header["batch"],
+            [
+                ({"module": "foo", "func": "bar"}, {"args": "[1]"}),
+                None,
+                ({"module": "foo", "func": "baz"}, {}),
+            ]
+        )
+
+    def test_non_objects_split_to_none(self):
+        eq_(split_payload(' ["foo", "bar"] '), None)
+
+    def test_empty_object(self):
+        eq_(split_payload("{}"), ({}, {}))
+
+    def test_escaped_keys_and_whitespace(self):
+        header, body = split_payload(
+            '\n{ "mod\\u0075le" : "foo" ,\t"args":[ ] }\n'
+        )
+
+        eq_(header, {"module": "foo"})
+        eq_(body, {"args": "[ ]"})
+
+    def test_malformed_json_raises_value_error(self):
+        for message in (
+                '{"module": "foo"',
+                '{"module" "foo"}',
+                '{"args": [1, 2}',
+                '{"module": "foo"} extra',
+                '{module: "foo"}',
+                '',
+        ):
+            assert_raises(ValueError, split_payload, message)
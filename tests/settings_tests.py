@@ -0,0 +1,68 @@
+from unittest import TestCase
+from nose.tools import eq_, assert_raises
+
+from rotterdam.settings.server import (
+    Queues, ListenPort, HeartbeatInterval, ReusePort, PIDFile, QueueCodecs
+)
+
+
+class SettingTests(TestCase):
+
+    def test_string_values_are_coerced_to_the_type(self):
+        setting = ListenPort()
+
+        setting.set("9000")
+
+        eq_(setting.get(), 9000)
+
+    def test_float_values(self):
+        setting = HeartbeatInterval()
+
+        setting.set("0.25")
+
+        eq_(setting.get(), 0.25)
+
+    def test_already_converted_values_are_left_alone(self):
+        setting = Queues()
+
+        setting.set(["foo", "bar"])
+
+        eq_(setting.get(), ["foo", "bar"])
+
+    def test_custom_type_functions(self):
+        setting = Queues()
+
+        setting.set("foo,bar")
+
+        eq_(setting.get().items(), [("foo", 1), ("bar", 1)])
+
+    def test_queue_weights(self):
+        setting = Queues()
+
+        setting.set("foo:5, bar,baz:2")
+
+        eq_(setting.get().items(), [("foo", 5), ("bar", 1), ("baz", 2)])
+        assert_raises(ValueError, setting.set, "foo:0")
+
+    def test_mapping_values(self):
+        setting = QueueCodecs()
+
+        setting.set("big:msgpack+zlib, *:json")
+
+        eq_(setting.get(), {"big": "msgpack+zlib", "*": "json"})
+
+    def test_flags(self):
+        setting = ReusePort()
+
+        setting.set("yes")
+        eq_(setting.get(), True)
+
+        setting.set("false")
+        eq_(setting.get(), False)
+
+    def test_untyped_values_stay_strings(self):
+        setting = PIDFile()
+
+        setting.set("/var/run/rotterdam.pid")
+
+        eq_(setting.get(), "/var/run/rotterdam.pid")
@@ -0,0 +1,174 @@
+from unittest import TestCase
+from mock import Mock
+from nose.tools import eq_, assert_raises
+
+import datetime
+import os
+import shutil
+import tempfile
+
+from rotterdam import Rotterdam, ConnectionError, QueueBusy
+from rotterdam.spool import Spool
+
+
+def test_func(*args):
+    pass
+
+
+def mock_client(*failures):
+    client = Mock()
+    batches = []
+
+    def send(payload):
+        batches.append(payload["batch"])
+        receipt = Mock()
+        if len(batches) in failures:
+            receipt.wait.side_effect = ConnectionError
+        else:
+            receipt.wait.return_value = {
+                "status": "ok",
+                "results": [{"status": "ok"} for _ in payload["batch"]]
+            }
+        return receipt
+
+    client.send.side_effect = send
+    client.batches = batches
+
+    return client
+
+
+class SpoolTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "jobs.spool")
+        self.spool = Spool(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_appends_are_written_as_lines(self):
+        self.spool.enqueue(test_func, "foo")
+        self.spool.enqueue(test_func, "bar")
+
+        with open(self.path) as spool_file:
+            eq_(len(spool_file.readlines()), 2)
+
+    def test_inspect_summarizes_the_spool(self):
+        self.spool.enqueue(test_func, "foo")
+        self.spool.enqueue(test_func, "bar")
+        self.spool.enqueue("some.module:other_func")
+
+        summary = self.spool.inspect()
+
+        eq_(summary["payloads"], 3)
+        eq_(summary["bytes"], os.path.getsize(self.path))
+        eq_(summary["jobs"][__name__ + ":test_func"], 2)
+        eq_(summary["jobs"]["some.module:other_func"], 1)
+
+    def test_drain_sends_everything_in_batches(self):
+        for i in range(5):
+            self.spool.enqueue(test_func, i)
+
+        client = mock_client()
+
+        eq_(self.spool.drain(client, batch_size=2), 5)
+
+        eq_([len(batch) for batch in client.batches], [2, 2, 1])
+        eq_(
+            [payload["args"] for payload in client.batches[0]],
+            [[0], [1]]
+        )
+        assert not os.path.exists(self.path)
+        assert not os.path.exists(self.spool.draining_path)
+
+    def test_interrupted_drain_compacts_to_the_unsent_jobs(self):
+        for i in range(5):
+            self.spool.enqueue(test_func, i)
+
+        assert_raises(
+            ConnectionError,
+            self.spool.drain, mock_client(2), batch_size=2
+        )
+
+        self.spool.enqueue(test_func, "later")
+
+        eq_(self.spool.inspect()["payloads"], 4)
+
+        client = mock_client()
+        self.spool.drain(client, batch_size=10)
+
+        eq_(
+            [payload["args"] for payload in client.batches[0]],
+            [[2], [3], [4]]
+        )
+        eq_(
+            [payload["args"] for payload in client.batches[1]],
+            [["later"]]
+        )
+
+    def test_busy_jobs_stay_in_the_spool(self):
+        for i in range(4):
+            self.spool.enqueue(test_func, i)
+
+        client = Mock()
+        client.send.return_value.wait.return_value = {
+            "status": "ok",
+            "results": [
+                {"status": "ok"}, {"status": "busy", "retry_after": 2.0}
+            ]
+        }
+
+        with assert_raises(QueueBusy) as context:
+            self.spool.drain(client, batch_size=2)
+
+        eq_(context.exception.retry_after, 2.0)
+        eq_(client.send.call_count, 1)
+
+        client = mock_client()
+        self.spool.drain(client, batch_size=10)
+
+        eq_(
+            [payload["args"] for payload in client.batches[0]],
+            [[2], [3]]
+        )
+        eq_(
+            [payload["args"] for payload in client.batches[1]],
+            [[1]]
+        )
+
+    def test_appends_after_a_claim_go_to_a_fresh_file(self):
+        self.spool.enqueue(test_func, "before")
+        self.spool.claim()
+        self.spool.enqueue(test_func, "after")
+
+        with open(self.path) as spool_file:
+            eq_(len(spool_file.readlines()), 1)
+        with open(self.spool.draining_path) as spool_file:
+            eq_(len(spool_file.readlines()), 1)
+
+    def test_partial_trailing_line_is_skipped(self):
+        self.spool.enqueue(test_func, "foo")
+        with open(self.path, "a") as spool_file:
+            spool_file.write('{"module": "trunc')
+
+        eq_(self.spool.inspect()["payloads"], 1)
+
+    def test_datetimes_survive_the_spool(self):
+        when = datetime.datetime(2015, 3, 4, 5, 6, 7)
+
+        self.spool.enqueue(test_func, when)
+
+        client = mock_client()
+        self.spool.drain(client)
+
+        eq_(client.batches[0][0]["args"], [when])
+
+    def test_client_spools_when_master_unreachable(self):
+        client = Rotterdam("localhost", port=1, spool=self.spool)
+
+        client.enqueue(test_func, "foo")
+        results = client.enqueue_many(test_func, ["bar", "bazz"])
+
+        eq_(results, [{"status": "spooled"}] * 2)
+        eq_(self.spool.inspect()["payloads"], 3)